@@ -1,6 +1,51 @@
 from django.contrib import admin
+from django.contrib.postgres.search import SearchQuery
+from django.db.models import Q
+from .filters import SEARCH_CONFIG, product_search_vector, uses_postgres
 from .models import Product, Customer, Order
+from .pagination import EstimatedCountPaginator
 
-admin.site.register(Product)
-admin.site.register(Customer)
-admin.site.register(Order)
\ No newline at end of file
+
+class LargeTableAdmin(admin.ModelAdmin):
+    # Estimated counts (see pagination.estimated_count), and no second count of the
+    # whole table next to the filtered one.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'price', 'available', 'stock')
+    list_filter = ('available',)
+    search_fields = ('name',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # As the API's ?search=: the full-text and trigram indexes on the name on
+        # PostgreSQL, where icontains would scan the table.
+        term = search_term.strip()
+        if not term or not uses_postgres(queryset):
+            return super().get_search_results(request, queryset, search_term)
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.alias(search=product_search_vector()).filter(
+            Q(search=query) | Q(name__trigram_word_similar=term)
+        ), False
+
+
+@admin.register(Customer)
+class CustomerAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'address')
+    search_fields = ('=id',)
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'customer', 'status', 'date', 'total_price', 'item_count')
+    list_select_related = ('customer',)
+    # Both served by order_status_date_idx / order_date_id_idx. No date_hierarchy:
+    # its month links come from a DISTINCT over the whole table.
+    list_filter = ('status', 'date')
+    ordering = ('-date', '-id')
+    # Plain id inputs instead of selects listing every customer and product.
+    raw_id_fields = ('customer', 'products')
+    readonly_fields = ('total_price', 'item_count')
+    search_fields = ('=id',)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DjangoappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djangoapp'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
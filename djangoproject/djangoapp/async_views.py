@@ -0,0 +1,61 @@
+from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, PermissionDenied
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .authentication import ClaimsJWTAuthentication
+
+
+class AsyncReadView(View):
+    # List/retrieve for a viewset's queryset, serializer and pagination on the async
+    # ORM, so under an ASGI server a slow request does not hold a thread while it
+    # waits. Writes, filters and the response cache stay on the DRF viewsets.
+    viewset = None
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, pk=None):
+        self.request = request = Request(request)
+        authenticator = ClaimsJWTAuthentication()
+        try:
+            await self.authenticate(request, authenticator)
+            data = await (self.list(request) if pk is None else self.retrieve(request, pk))
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = self.render(detail, status=exc.status_code)
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+        return self.render(data)
+
+    async def authenticate(self, request, authenticator):
+        result = await authenticator.aauthenticate(request)
+        request.user, request.auth = result if result is not None else (None, None)
+        for permission in [permission() for permission in self.viewset.permission_classes]:
+            if not permission.has_permission(request, self):
+                raise NotAuthenticated() if request.user is None else PermissionDenied()
+
+    def get_queryset(self):
+        return self.viewset.queryset.all()
+
+    def get_serializer(self, *args, **kwargs):
+        return self.viewset.serializer_class(*args, context={'request': self.request, 'view': self}, **kwargs)
+
+    async def list(self, request):
+        queryset = self.get_queryset()
+        paginator = self.viewset.pagination_class() if self.viewset.pagination_class else None
+        page = await paginator.apaginate_queryset(queryset, request, view=self) if paginator else None
+        if page is None:
+            return self.get_serializer([obj async for obj in queryset], many=True).data
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data).data
+
+    async def retrieve(self, request, pk):
+        try:
+            instance = await self.get_queryset().aget(pk=pk)
+        except ObjectDoesNotExist:
+            raise NotFound()
+        return self.get_serializer(instance).data
+
+    def render(self, data, status=200):
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
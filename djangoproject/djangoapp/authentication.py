@@ -0,0 +1,128 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+USER_CLAIMS = ('is_staff', 'is_active')
+
+
+def add_user_claims(token, user):
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class UserCache:
+    # Per-process cache of full user rows for requests that need more than the claims.
+    # Entries live for AUTH_USER_CACHE_TTL seconds; saving or deleting a user drops
+    # it from this process right away (see signals.py).
+
+    def __init__(self, max_size=10000):
+        self.lock = threading.Lock()
+        self.max_size = max_size
+        self.users = {}
+
+    def get(self, pk):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.users.get(pk)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        user = get_user_model().objects.filter(pk=pk).first()
+        with self.lock:
+            if len(self.users) >= self.max_size:
+                self.users.pop(next(iter(self.users)))
+            self.users[pk] = (now + getattr(settings, 'AUTH_USER_CACHE_TTL', 30), user)
+        return user
+
+    def discard(self, pk):
+        with self.lock:
+            self.users.pop(pk, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = UserCache()
+
+
+def get_active_user(pk):
+    user = user_cache.get(pk)
+    if user is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+class ClaimsUser(TokenUser):
+    # Built from the access token alone; the database row is only loaded (through
+    # the user cache) when something asks for `user`.
+
+    @cached_property
+    def is_active(self):
+        return self.token['is_active']
+
+    @cached_property
+    def user(self):
+        return get_active_user(self.id)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    # Trusts the signed is_staff/is_active claims instead of loading the user for
+    # every request. A change to either flag takes effect when the access token is
+    # next refreshed, i.e. within ACCESS_TOKEN_LIFETIME.
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        if any(claim not in validated_token for claim in USER_CLAIMS):
+            # Issued before the claims existed.
+            return get_active_user(validated_token[api_settings.USER_ID_CLAIM])
+        if not validated_token['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return ClaimsUser(validated_token)
+
+    async def aauthenticate(self, request):
+        # For async views: claim tokens are handled without I/O, tokens that need
+        # the user row are looked up in a worker thread.
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if all(claim in validated_token for claim in (api_settings.USER_ID_CLAIM,) + USER_CLAIMS):
+            return self.get_user(validated_token), validated_token
+        return await sync_to_async(self.get_user)(validated_token), validated_token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    # Re-reads the user so refreshed access tokens carry current claims and deleted
+    # or deactivated users cannot refresh.
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = get_user_model().objects.filter(pk=access[api_settings.USER_ID_CLAIM]).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        data['access'] = str(add_user_claims(access, user))
+        return data
@@ -0,0 +1,152 @@
+import math
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import ClaimsJWTAuthentication, add_user_claims, user_cache
+
+from .models import Product, Customer, Order
+from .serializers import OrderSerializer, ValuesRepresentation
+from .views import OrderViewSet
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+    return {'seconds': round(elapsed, 6), 'queries': len(queries)}, result
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list.
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def latency_summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+    }
+
+
+def seed_orders(size, seed=0):
+    rng = random.Random(seed)
+    products = Product.objects.bulk_create(
+        Product(name=f'Benchmark product {i}', price=Decimal('9.99'), available=rng.random() > 0.1)
+        for i in range(max(size // 10, 10))
+    )
+    customer = Customer.objects.create(name='Benchmark customer', address='Benchmark 1')
+    orders = Order.objects.bulk_create(
+        Order(customer=customer, status=rng.choice(Order.STATUS_CHOICES)[0]) for _ in range(size)
+    )
+    Order.products.through.objects.bulk_create(
+        Order.products.through(order_id=order.id, product_id=product.id)
+        for order in orders
+        for product in rng.sample(products, 3)
+    )
+    return orders
+
+
+@benchmark('fulfillable')
+def bench_fulfillable(size):
+    seed_orders(size)
+
+    def per_instance():
+        return sorted(order.id for order in Order.objects.open() if order.can_be_fulfilled())
+
+    def set_based():
+        return list(Order.objects.open().fulfillable().order_by('id').values_list('id', flat=True))
+
+    per_instance_stats, expected = measure(per_instance)
+    set_based_stats, actual = measure(set_based)
+    if expected != actual:
+        raise CommandError('The set-based query found other fulfillable orders than can_be_fulfilled().')
+    return {
+        'orders': size,
+        'fulfillable': len(actual),
+        'per_instance': per_instance_stats,
+        'set_based': set_based_stats,
+    }
+
+
+@benchmark('jwt-auth')
+def bench_jwt_auth(size):
+    user = User.objects.create(username='benchmark', is_staff=True)
+    legacy_token = str(AccessToken.for_user(user))
+    claims_token = str(add_user_claims(AccessToken.for_user(user), user))
+    factory = APIRequestFactory()
+
+    def authenticate(authentication, token):
+        def run():
+            for _ in range(size):
+                request = Request(factory.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                user, _ = authentication.authenticate(request)
+                if not user.is_staff:
+                    raise CommandError(f'{type(authentication).__name__} lost the is_staff flag.')
+        return run
+
+    user_cache.clear()
+    user_lookup_stats, _ = measure(authenticate(JWTAuthentication(), legacy_token))
+    claims_stats, _ = measure(authenticate(ClaimsJWTAuthentication(), claims_token))
+    cached_user_stats, _ = measure(authenticate(ClaimsJWTAuthentication(), legacy_token))
+    return {
+        'requests': size,
+        'user_lookup': user_lookup_stats,
+        'claims': claims_stats,
+        'cached_user': cached_user_stats,
+    }
+
+
+@benchmark('serialization')
+def bench_serialization(size):
+    seed_orders(size)
+    queryset = OrderViewSet.queryset.order_by('id')
+    per_10k = 10000 / size
+
+    def serializer():
+        return JSONRenderer().render(OrderSerializer(queryset.all(), many=True).data)
+
+    def values():
+        representation = ValuesRepresentation.for_serializer(OrderSerializer())
+        rows = queryset.prefetch_related(None).values(*representation.values)
+        return JSONRenderer().render(representation.represent(list(rows)))
+
+    serializer_stats, expected = measure(serializer)
+    values_stats, actual = measure(values)
+    if expected != actual:
+        raise CommandError('The values() representation differs from the serializer output.')
+    for stats in (serializer_stats, values_stats):
+        stats['seconds_per_10k'] = round(stats['seconds'] * per_10k, 6)
+    return {
+        'orders': size,
+        'serializer': serializer_stats,
+        'values': values_stats,
+        'speedup': round(serializer_stats['seconds'] / values_stats['seconds'], 2),
+    }
@@ -0,0 +1,72 @@
+import csv
+import io
+
+from django.core.management.color import no_style
+from django.db import connections
+
+
+def supports_copy(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def copy_rows(model, columns, rows, using='default'):
+    # COPY ... FROM STDIN streams the whole batch in one round trip and skips
+    # per-row INSERT parsing and planning.
+    connection = connections[using]
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = ', '.join(connection.ops.quote_name(model._meta.get_field(column).column) for column in columns)
+    # copy_expert is the driver's own method: wrap it so that its errors are raised
+    # as Django's IntegrityError, DataError and so on, like any other query's.
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        cursor.copy_expert(f'COPY {table} ({names}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def insert_rows(model, columns, rows, batch_size=5000, using='default'):
+    if supports_copy(using):
+        copy_rows(model, columns, rows, using)
+        return
+
+    objects = model.objects.using(using).bulk_create(
+        [model(**dict(zip(columns, row))) for row in rows], batch_size=batch_size
+    )
+    # bulk_create lets auto_now/auto_now_add overwrite the given values, so put them back.
+    auto_fields = [
+        column for column in columns
+        if getattr(model._meta.get_field(column), 'auto_now_add', False)
+        or getattr(model._meta.get_field(column), 'auto_now', False)
+    ]
+    if auto_fields:
+        for obj, row in zip(objects, rows):
+            for column in auto_fields:
+                setattr(obj, column, row[columns.index(column)])
+        model.objects.using(using).bulk_update(objects, auto_fields, batch_size=batch_size)
+
+
+def reset_sequences(models, using='default'):
+    connection = connections[using]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def truncate(models, using='default'):
+    # Empties the tables without loading rows into Python or sending delete signals.
+    connection = connections[using]
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            names = ', '.join(connection.ops.quote_name(table) for table in tables)
+            # TRUNCATE refuses tables with deferred foreign key checks still pending
+            # from earlier writes in the same transaction; run those checks first.
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute(f'TRUNCATE {names} RESTART IDENTITY CASCADE')
+            cursor.execute('SET CONSTRAINTS ALL DEFERRED')
+        else:
+            for table in tables:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(table)}')
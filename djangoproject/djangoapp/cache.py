@@ -0,0 +1,105 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .routers import current_routing
+
+# Which cached resources go stale when a model changes; order totals depend on
+# product prices and orders are deleted together with their customer. Reports
+# only change when refresh_rollups runs.
+DEPENDENT_RESOURCES = {
+    'product': ['product', 'order'],
+    'customer': ['customer', 'order'],
+    'order': ['order'],
+    'report': ['report'],
+}
+
+
+def get_version(resource):
+    # The version is the time of the last change, so it doubles as Last-Modified.
+    key = f'api-version:{resource}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(model_name):
+    # Bumping the version orphans every cached page of the resource at once;
+    # the old entries simply expire.
+    version = time.time_ns()
+    cache.set_many({f'api-version:{resource}': version for resource in DEPENDENT_RESOURCES[model_name]}, timeout=None)
+
+
+def invalidate_now_and_on_commit(model_name):
+    # The second bump stops readers that saw the first one from caching data that
+    # was read before the writing transaction committed.
+    invalidate(model_name)
+    transaction.on_commit(lambda: invalidate(model_name))
+
+
+class CachedResponseMixin:
+    # Caches serialized response data per URL and answers If-None-Match /
+    # If-Modified-Since with 304 before touching the database or the serializer.
+    # With read replicas, clients that just wrote skip the cached copy, and data
+    # read from a replica that may not have the latest change is neither cached nor
+    # given validators.
+    cache_resource = None
+    cache_timeout = getattr(settings, 'API_CACHE_TIMEOUT', 300)
+
+    def cached_response(self, request, handler, *args, resource=None, **kwargs):
+        # `resource` overrides cache_resource for actions that return other data.
+        resource = resource or self.cache_resource
+        version = get_version(resource)
+        url = request.build_absolute_uri()
+        digest = hashlib.md5(f'{url}|{request.accepted_media_type}'.encode()).hexdigest()
+        etag = f'"{version:x}-{digest[:16]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if time.time_ns() // 10 ** 9 > version // 10 ** 9:
+            # Last-Modified only has whole seconds. It is sent once the version's second
+            # is over, so no later change can share it and If-Modified-Since cannot
+            # hide one; the ETag carries the full version.
+            headers['Last-Modified'] = http_date(version // 10 ** 9)
+
+        if self.not_modified(request, etag, version):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        routing = current_routing.get()
+        key = f'api:{resource}:{version}:{digest}'
+        # Read-your-writes: the copy may have been cached before the client's write
+        # reached every replica, so the primary answers.
+        data = None if routing is not None and routing.pinned_to_primary() else cache.get(key)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            if routing is not None and not routing.current_since(version / 10 ** 9):
+                return Response(data, headers={'Cache-Control': headers['Cache-Control']})
+            cache.set(key, data, timeout=self.cache_timeout)
+        return Response(data, headers=headers)
+
+    def not_modified(self, request, etag, version):
+        # If-None-Match wins over If-Modified-Since (RFC 9110), and compares the full version.
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        # A date in the current second may predate a change made later in it.
+        return if_modified_since is not None and version // 10 ** 9 <= if_modified_since < int(time.time())
+
+
+class CachedReadMixin(CachedResponseMixin):
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
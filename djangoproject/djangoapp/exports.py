@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from rest_framework.renderers import BaseRenderer
+
+CSV_HEADER = ['id', 'date', 'status', 'customer_id', 'customer_name', 'customer_address', 'product_ids', 'total_price']
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data) + '\n').encode(self.charset)
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for key, value in (data or {}).items():
+            writer.writerow([key, value])
+        return buffer.getvalue().encode(self.charset)
+
+
+def order_total(order):
+    return str(order.total_price.quantize(Decimal('0.01')))
+
+
+def order_record(order):
+    return {
+        'id': order.id,
+        'date': order.date.isoformat(),
+        'status': order.status,
+        'customer': {
+            'id': order.customer.id,
+            'name': order.customer.name,
+            'address': order.customer.address,
+        },
+        'products': [
+            {'id': product.id, 'name': product.name, 'price': str(product.price)}
+            for product in order.products.all()
+        ],
+        'total_price': order_total(order),
+    }
+
+
+def ndjson_lines(orders):
+    for order in orders:
+        yield json.dumps(order_record(order)) + '\n'
+
+
+def csv_lines(orders):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(CSV_HEADER)
+    yield flush()
+    for order in orders:
+        writer.writerow([
+            order.id,
+            order.date.isoformat(),
+            order.status,
+            order.customer.id,
+            order.customer.name,
+            order.customer.address,
+            ';'.join(str(product.id) for product in order.products.all()),
+            order_total(order),
+        ])
+        yield flush()
+
+
+async def async_chunks(lines, size):
+    # Under ASGI Django reads a synchronous iterator to the end before sending any of
+    # it. This pulls `size` lines at a time in the sync thread, where the server-side
+    # cursor lives, so only one chunk is held in memory.
+    def take():
+        return ''.join(islice(lines, size))
+
+    while chunk := await sync_to_async(take)():
+        yield chunk
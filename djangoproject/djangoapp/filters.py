@@ -0,0 +1,190 @@
+import re
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connections
+from django.db.models import IntegerField, Q
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, SearchFilter
+
+from .models import Order
+
+# Product names are short and often brand names, so we skip stemming; this must match
+# the expression indexed by migration 0006_product_search_indexes.
+SEARCH_CONFIG = 'simple'
+
+
+def uses_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def parse_date_param(request, name, end_of_day=False):
+    # Accepts an ISO 8601 datetime or date; a date means the start of that day, or
+    # the start of the next one for exclusive upper bounds.
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+        else:
+            parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_day_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: 'Expected an ISO 8601 date.'})
+    return day
+
+
+def product_search_vector():
+    return SearchVector('name', config=SEARCH_CONFIG)
+
+
+def prefix_search_query(term):
+    words = re.findall(r'\w+', term)
+    if not words:
+        return None
+    return SearchQuery(' & '.join(f'{word}:*' for word in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+class ProductSearchFilter(SearchFilter):
+    # On PostgreSQL, ?search= matches the full-text and trigram GIN indexes on
+    # Product.name and orders by relevance; elsewhere it falls back to icontains.
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term:
+            return queryset
+        if not uses_postgres(queryset):
+            return super().filter_queryset(request, queryset, view)
+
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset
+            .alias(search=product_search_vector())
+            .filter(Q(search=query) | Q(name__trigram_word_similar=term))
+            .annotate(rank=Cast(
+                (SearchRank(product_search_vector(), query) + TrigramWordSimilarity(term, 'name')) * 1000000,
+                IntegerField(),
+            ))
+        )
+
+    def get_ordering(self, request, queryset, view):
+        # Used by the cursor pagination; the integer rank keeps cursor comparisons exact.
+        if 'rank' in queryset.query.annotations:
+            return ('-rank', 'id')
+        return None
+
+
+class ProductAutocompleteFilter(BaseFilterBackend):
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            return queryset.none()
+        if not uses_postgres(queryset):
+            return queryset.filter(Q(name__istartswith=term) | Q(name__icontains=f' {term}')).order_by('name', 'id')
+
+        query = prefix_search_query(term)
+        if query is None:
+            return queryset.none()
+        return (
+            queryset
+            .alias(search=product_search_vector())
+            .filter(search=query)
+            .annotate(rank=SearchRank(product_search_vector(), query))
+            .order_by('-rank', 'name', 'id')
+        )
+
+
+class OrderFilter(BaseFilterBackend):
+    # ?status=NEW,IN_PROCESS&customer=7&date_after=...&date_before=...&ordering=date
+    # Each combination is served by an index ending in (date, id): order_date_id_idx,
+    # order_status_date_idx or order_customer_history_idx; total price ranges and
+    # ordering use order_total_price_idx. On PostgreSQL the date range also limits the
+    # scan to the monthly partitions of the order table that it covers.
+    orderings = {
+        'date': ('date', 'id'),
+        '-date': ('-date', '-id'),
+        'total_price': ('total_price', 'id'),
+        '-total_price': ('-total_price', '-id'),
+    }
+    statuses = {choice for choice, _ in Order.STATUS_CHOICES}
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get('status'):
+            statuses = params['status'].split(',')
+            if not self.statuses.issuperset(statuses):
+                raise ValidationError({'status': f"Expected any of {', '.join(sorted(self.statuses))}."})
+            queryset = queryset.filter(status__in=statuses)
+        if params.get('customer'):
+            try:
+                queryset = queryset.filter(customer_id=int(params['customer']))
+            except ValueError:
+                raise ValidationError({'customer': 'Expected a customer id.'})
+
+        for name, lookup in (('total_min', 'gte'), ('total_max', 'lte')):
+            if params.get(name):
+                try:
+                    value = Decimal(params[name])
+                except InvalidOperation:
+                    value = None
+                if value is None or not value.is_finite():
+                    raise ValidationError({name: 'Expected a decimal number.'})
+                queryset = queryset.filter(**{f'total_price__{lookup}': value})
+
+        date_after = parse_date_param(request, 'date_after')
+        if date_after is not None:
+            queryset = queryset.filter(date__gte=date_after)
+        date_before = parse_date_param(request, 'date_before', end_of_day=True)
+        if date_before is not None:
+            queryset = queryset.filter(date__lt=date_before)
+        return queryset
+
+    def get_ordering(self, request, queryset, view):
+        # Used by the cursor pagination, which needs the full (date, id) ordering.
+        ordering = request.query_params.get('ordering')
+        if not ordering:
+            return None
+        if ordering not in self.orderings:
+            raise ValidationError({'ordering': f"Expected one of {', '.join(self.orderings)}."})
+        return self.orderings[ordering]
+
+
+class RollupFilter(BaseFilterBackend):
+    # ?date_after=2024-06-01&date_before=2024-06-30 (both days included) and, for
+    # rollups kept per status, ?status= as on the order list.
+    def filter_queryset(self, request, queryset, view):
+        date_after = parse_day_param(request, 'date_after')
+        if date_after is not None:
+            queryset = queryset.filter(day__gte=date_after)
+        date_before = parse_day_param(request, 'date_before')
+        if date_before is not None:
+            queryset = queryset.filter(day__lte=date_before)
+
+        status = request.query_params.get('status')
+        if status and any(field.name == 'status' for field in queryset.model._meta.fields):
+            statuses = status.split(',')
+            if not OrderFilter.statuses.issuperset(statuses):
+                raise ValidationError({'status': f"Expected any of {', '.join(sorted(OrderFilter.statuses))}."})
+            queryset = queryset.filter(status__in=statuses)
+        return queryset
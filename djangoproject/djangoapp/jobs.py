@@ -0,0 +1,126 @@
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class ClaimLost(Exception):
+    pass
+
+
+def task(name):
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, delay=None, **payload):
+    # Call inside the transaction of the change the job follows up on: the job only
+    # becomes visible to workers if that change commits.
+    if name not in TASKS:
+        raise ValueError(f'Unknown task {name!r}.')
+    return Job.objects.create(task=name, payload=payload, run_at=timezone.now() + (delay or timedelta()))
+
+
+def enqueue_many(name, payloads, batch_size=None):
+    if name not in TASKS:
+        raise ValueError(f'Unknown task {name!r}.')
+    now = timezone.now()
+    return Job.objects.bulk_create([Job(task=name, payload=payload, run_at=now) for payload in payloads],
+                                   batch_size=batch_size)
+
+
+def claim(worker, batch_size=1, visibility_timeout=None):
+    # SKIP LOCKED lets any number of workers poll the same table: each one gets the
+    # oldest due jobs nobody else is claiming right now, without waiting on them.
+    if visibility_timeout is None:
+        visibility_timeout = getattr(settings, 'JOB_VISIBILITY_TIMEOUT', 300)
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects
+            .filter(status__in=Job.PENDING_STATUSES, run_at__lte=now)
+            .order_by('run_at', 'id')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not jobs:
+            return []
+        run_at = now + timedelta(seconds=visibility_timeout)
+        # Still due: without row locks (SQLite) another worker may have won the race.
+        claimed = Job.objects.filter(pk__in=[job.pk for job in jobs], run_at__lte=now)
+        if claimed.update(status=Job.RUNNING, run_at=run_at, attempts=F('attempts') + 1, locked_by=worker) < len(jobs):
+            return list(Job.objects.filter(pk__in=[job.pk for job in jobs], locked_by=worker, run_at=run_at))
+    for job in jobs:
+        job.status, job.run_at, job.attempts, job.locked_by = Job.RUNNING, run_at, job.attempts + 1, worker
+    return jobs
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 2)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def run(job):
+    # The task and marking the job done commit together, so the task's own writes
+    # happen once; a failure rolls them back and schedules a retry with backoff.
+    # The updates only match while this worker still holds the claim.
+    claimed = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by, attempts=job.attempts)
+    try:
+        with transaction.atomic():
+            if job.task not in TASKS:
+                raise LookupError(f'Unknown task {job.task!r}.')
+            if job.attempts > job.max_attempts:
+                raise RuntimeError('Gave up after the worker stopped during every attempt.')
+            TASKS[job.task](**job.payload)
+            if not claimed.update(status=Job.DONE, finished_at=timezone.now(), last_error=''):
+                raise ClaimLost()
+    except ClaimLost:
+        # Ran past the visibility timeout and another worker took the job over.
+        logger.warning('Job %s (%s) was claimed again before it finished; rolled back.', job.pk, job.task)
+        return None
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) failed on attempt %s.', job.pk, job.task, job.attempts, exc_info=True)
+        if job.attempts >= job.max_attempts:
+            claimed.update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+            return Job.FAILED
+        claimed.update(status=Job.QUEUED, run_at=timezone.now() + retry_delay(job.attempts), last_error=error)
+        return Job.QUEUED
+    return Job.DONE
+
+
+def work(worker, stop, stats, batch_size=1, visibility_timeout=None, poll_interval=1.0, burst=False):
+    # Worker loop shared by the threads and processes of run_worker. `stop` is a
+    # threading or multiprocessing Event; `stats` counts the outcomes.
+    try:
+        while not stop.is_set():
+            jobs = claim(worker, batch_size, visibility_timeout)
+            if not jobs:
+                if burst:
+                    return
+                stop.wait(poll_interval)
+                continue
+            for job in jobs:
+                start = time.perf_counter()
+                outcome = run(job)
+                stats.record(outcome, time.perf_counter() - start)
+    finally:
+        connections.close_all()
+
+
+def purge_finished(older_than):
+    # Finished jobs are kept for a while for inspection; the failed ones too.
+    cutoff = timezone.now() - older_than
+    return Job.objects.filter(status__in=[Job.DONE, Job.FAILED], finished_at__lt=cutoff).delete()[0]
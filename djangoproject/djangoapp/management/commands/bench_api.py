@@ -0,0 +1,264 @@
+import asyncio
+import json
+import random
+import secrets
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils import timezone
+from djangoapp.benchmarks import latency_summary
+from djangoapp.middleware import QueryCounter, current_query_counter
+from djangoapp.models import Product, Customer, Order
+
+BENCH_USERNAME = 'bench_api'
+BENCH_PRODUCT_NAME = 'bench_api product'
+
+
+class HostAsyncClient(AsyncClient):
+    # AsyncClient always sends Host: testserver; swap in the requested host.
+
+    def __init__(self, host, **defaults):
+        super().__init__(**defaults)
+        self.host = host.encode()
+
+    def _base_scope(self, **request):
+        scope = super()._base_scope(**request)
+        scope['headers'] = [(name, self.host if name == b'host' else value) for name, value in scope['headers']]
+        return scope
+
+
+class Command(BaseCommand):
+    help = 'Drives the API endpoints concurrently and reports latency percentiles, throughput and SQL queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Concurrent clients: threads, or coroutines with --asgi.')
+        parser.add_argument('--asgi', action='store_true',
+                            help='Go through the ASGI handler with all clients on one event loop thread.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+        parser.add_argument('--endpoints', help=f'Comma-separated subset of: {", ".join(self.scenarios())}.')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--compare', help='Previous JSON report to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative p95/throughput change reported as a regression.')
+
+    def scenarios(self):
+        return {
+            'product-list': self.product_list,
+            'product-detail': self.product_detail,
+            'product-create': self.product_create,
+            'customer-list': self.customer_list,
+            'order-list': self.order_list,
+            'order-detail': self.order_detail,
+            'token-obtain': self.token_obtain,
+            'token-refresh': self.token_refresh,
+            'async-product-list': self.async_product_list,
+            'async-product-detail': self.async_product_detail,
+            'async-customer-list': self.async_customer_list,
+            'async-order-list': self.async_order_list,
+            'async-order-detail': self.async_order_detail,
+        }
+
+    def handle(self, *args, **kwargs):
+        scenarios = self.scenarios()
+        names = kwargs['endpoints'].split(',') if kwargs['endpoints'] else list(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+
+        self.rng = random.Random(kwargs['seed'])
+        self.host = kwargs['host']
+        self.product_ids = list(Product.objects.values_list('id', flat=True)[:1000])
+        self.order_ids = list(Order.objects.values_list('id', flat=True)[:1000])
+        if not self.product_ids or not self.order_ids or not Customer.objects.exists():
+            raise CommandError('The database is empty; seed it first, e.g. with manage.py generate_data.')
+
+        self.password = secrets.token_urlsafe(16)
+        user, _ = User.objects.get_or_create(username=BENCH_USERNAME, defaults={'is_staff': True})
+        user.is_staff = True
+        user.set_password(self.password)
+        user.save()
+        response = self.token_obtain(self.client())
+        if response.status_code != 200:
+            user.delete()
+            raise CommandError(f'Could not obtain a token (HTTP {response.status_code}); is --host in ALLOWED_HOSTS?')
+        self.access, self.refresh = response.json()['access'], response.json()['refresh']
+
+        try:
+            report = {
+                'meta': {
+                    'commit': self.git_commit(),
+                    'timestamp': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'interface': 'asgi' if kwargs['asgi'] else 'wsgi',
+                    'workers': kwargs['workers'],
+                    'requests_per_endpoint': kwargs['requests'],
+                },
+                'endpoints': {
+                    name: self.run(scenarios[name], kwargs['workers'], kwargs['requests'], kwargs['asgi'])
+                    for name in names
+                },
+            }
+        finally:
+            Product.objects.filter(name=BENCH_PRODUCT_NAME).delete()
+            user.delete()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if kwargs['output']:
+            with open(kwargs['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if kwargs['compare']:
+            with open(kwargs['compare']) as file:
+                regressions = self.compare(json.load(file), report, kwargs['threshold'])
+            for line in regressions:
+                self.stderr.write(line)
+            if regressions:
+                raise CommandError(f'{len(regressions)} regressions found.')
+
+    def run(self, scenario, workers, requests, asgi=False):
+        latencies, statuses, queries = [], {}, []
+        lock = threading.Lock()
+
+        def record(response, elapsed, counter):
+            with lock:
+                latencies.append(elapsed)
+                queries.append(counter.count)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        def worker(count):
+            client = self.client()
+            try:
+                for _ in range(count):
+                    counter = QueryCounter()
+                    token = current_query_counter.set(counter)
+                    start = time.perf_counter()
+                    try:
+                        response = scenario(client)
+                    finally:
+                        current_query_counter.reset(token)
+                    record(response, time.perf_counter() - start, counter)
+            finally:
+                connections.close_all()
+
+        async def async_worker(client, count):
+            for _ in range(count):
+                counter = QueryCounter()
+                token = current_query_counter.set(counter)
+                start = time.perf_counter()
+                try:
+                    response = await scenario(client)
+                finally:
+                    current_query_counter.reset(token)
+                record(response, time.perf_counter() - start, counter)
+
+        async def run_async(shares):
+            client = HostAsyncClient(self.host)
+            try:
+                await asyncio.gather(*[async_worker(client, share) for share in shares if share])
+            finally:
+                # Sync views ran in asgiref's shared thread; its connections stay open
+                # otherwise, as the test client does not close them per request.
+                await sync_to_async(connections.close_all)()
+
+        shares = [requests // workers + (1 if i < requests % workers else 0) for i in range(workers)]
+        start = time.perf_counter()
+        if asgi:
+            asyncio.run(run_async(shares))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(worker, share) for share in shares if share]:
+                    future.result()
+        elapsed = time.perf_counter() - start
+
+        result = latency_summary(latencies, elapsed)
+        result['queries_mean'] = round(sum(queries) / len(queries), 2) if queries else None
+        result['queries_max'] = max(queries, default=None)
+        result['status_codes'] = {str(code): count for code, count in sorted(statuses.items())}
+        result['errors'] = sum(count for code, count in statuses.items() if code >= 400)
+        return result
+
+    def compare(self, previous, current, threshold):
+        regressions = []
+        for name, now in current['endpoints'].items():
+            before = previous.get('endpoints', {}).get(name)
+            if not before:
+                continue
+            if before.get('p95_ms') and now['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {now['p95_ms']}ms")
+            if before.get('throughput') and now['throughput'] < before['throughput'] * (1 - threshold):
+                regressions.append(f"{name}: throughput {before['throughput']}/s -> {now['throughput']}/s")
+            if before.get('queries_max') is not None and now['queries_max'] > before['queries_max']:
+                regressions.append(f"{name}: queries {before['queries_max']} -> {now['queries_max']}")
+        return regressions
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def client(self):
+        return Client(SERVER_NAME=self.host)
+
+    def authorized(self):
+        return {'headers': {'Authorization': f'Bearer {self.access}'}}
+
+    def product_list(self, client):
+        return client.get(reverse('product-list'), **self.authorized())
+
+    def product_detail(self, client):
+        pk = self.rng.choice(self.product_ids)
+        return client.get(reverse('product-detail', kwargs={'pk': pk}), **self.authorized())
+
+    def product_create(self, client):
+        data = {'name': BENCH_PRODUCT_NAME, 'price': '9.99', 'available': True}
+        return client.post(reverse('product-list'), data, content_type='application/json', **self.authorized())
+
+    def customer_list(self, client):
+        return client.get(reverse('customer-list'), **self.authorized())
+
+    def order_list(self, client):
+        return client.get(reverse('order-list'), **self.authorized())
+
+    def order_detail(self, client):
+        pk = self.rng.choice(self.order_ids)
+        return client.get(reverse('order-detail', kwargs={'pk': pk}), **self.authorized())
+
+    def token_obtain(self, client):
+        data = {'username': BENCH_USERNAME, 'password': self.password}
+        return client.post(reverse('token_obtain_pair'), data, content_type='application/json')
+
+    def token_refresh(self, client):
+        return client.post(reverse('token_refresh'), {'refresh': self.refresh}, content_type='application/json')
+
+    def async_product_list(self, client):
+        return client.get(reverse('async-product-list'), **self.authorized())
+
+    def async_product_detail(self, client):
+        pk = self.rng.choice(self.product_ids)
+        return client.get(reverse('async-product-detail', kwargs={'pk': pk}), **self.authorized())
+
+    def async_customer_list(self, client):
+        return client.get(reverse('async-customer-list'), **self.authorized())
+
+    def async_order_list(self, client):
+        return client.get(reverse('async-order-list'), **self.authorized())
+
+    def async_order_detail(self, client):
+        pk = self.rng.choice(self.order_ids)
+        return client.get(reverse('async-order-detail', kwargs={'pk': pk}), **self.authorized())
@@ -0,0 +1,20 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from djangoapp.benchmarks import BENCHMARKS
+
+
+class Command(BaseCommand):
+    help = 'Runs a query benchmark against throwaway data that is rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(BENCHMARKS))
+        parser.add_argument('--size', type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            results = BENCHMARKS[kwargs['name']](kwargs['size'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,181 @@
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from djangoapp.bulk_load import insert_rows, reset_sequences, supports_copy, truncate
+from djangoapp.cache import invalidate
+from djangoapp.models import Product, Customer, Order, DailyProductRollup, DailyStatusRollup, RollupState, StaleRollupDay
+from djangoapp.models import ArchivedOrder, ArchivedOrderProduct
+from djangoapp.partitions import create_partitions
+from djangoapp.reports import refresh_rollups
+
+FIRST_NAMES = ['Anna', 'Jan', 'Maria', 'Piotr', 'Katarzyna', 'Tomasz', 'Agnieszka', 'Pawel', 'Ewa', 'Michal']
+LAST_NAMES = ['Nowak', 'Kowalski', 'Wisniewski', 'Wojcik', 'Kaminski', 'Lewandowski', 'Zielinski', 'Szymanski']
+STREETS = ['Dluga', 'Krotka', 'Polna', 'Lesna', 'Sloneczna', 'Ogrodowa', 'Lipowa', 'Brzozowa']
+ADJECTIVES = ['Classic', 'Compact', 'Deluxe', 'Eco', 'Pro', 'Smart', 'Ultra', 'Vintage']
+NOUNS = ['Backpack', 'Blender', 'Chair', 'Headphones', 'Jacket', 'Kettle', 'Lamp', 'Shoes', 'Watch']
+
+# Orders get older the further they are in their lifecycle: (max age in days, weights).
+STATUS_BY_AGE = [
+    (1, {'NEW': 70, 'IN_PROCESS': 25, 'SENT': 5, 'COMPLETED': 0}),
+    (7, {'NEW': 10, 'IN_PROCESS': 30, 'SENT': 40, 'COMPLETED': 20}),
+    (None, {'NEW': 1, 'IN_PROCESS': 2, 'SENT': 7, 'COMPLETED': 90}),
+]
+
+
+def parse_range(value):
+    low, _, high = value.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError(f'Invalid range: {value}')
+    if low < 0 or high < low:
+        raise CommandError(f'Invalid range: {value}')
+    return low, high
+
+
+def zipf_cum_weights(size, exponent):
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+class Command(BaseCommand):
+    help = 'Replaces all data with a reproducible synthetic dataset of the given size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--products-per-order', default='1-5', help='Range such as 1-5, or a single number.')
+        parser.add_argument('--days', type=int, default=365, help='Spread order dates over this many days.')
+        parser.add_argument('--end-date', help='Latest order date (YYYY-MM-DD); defaults to today.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **kwargs):
+        if kwargs['orders'] and not (kwargs['products'] and kwargs['customers']):
+            raise CommandError('Orders need at least one product and one customer.')
+
+        self.rng = random.Random(kwargs['seed'])
+        self.batch_size = kwargs['batch_size']
+        end_date = datetime.strptime(kwargs['end_date'], '%Y-%m-%d').date() if kwargs['end_date'] else timezone.now().date()
+        self.end = timezone.make_aware(datetime.combine(end_date, dt_time.max))
+        self.stdout.write(f"Loading with {'COPY FROM STDIN' if supports_copy() else 'bulk_create'}.")
+
+        with transaction.atomic():
+            truncate([
+                DailyProductRollup, DailyStatusRollup, RollupState, StaleRollupDay, ArchivedOrderProduct, ArchivedOrder,
+                Order.products.through, Order, Customer, Product,
+            ])
+            create_partitions(self.end - timedelta(days=kwargs['days']), self.end)
+            self.timed('products', self.generate_products, kwargs['products'])
+            self.timed('customers', self.generate_customers, kwargs['customers'])
+            self.timed(
+                'orders and product links', self.generate_orders, kwargs['orders'], kwargs['customers'],
+                kwargs['products'], parse_range(kwargs['products_per_order']), kwargs['days'],
+            )
+            reset_sequences([Product, Customer, Order])
+            self.timed('sales rollups (days)', refresh_rollups, True)
+
+        # COPY and TRUNCATE bypass model signals, so drop cached API responses explicitly.
+        for model in (Product, Customer, Order):
+            invalidate(model._meta.model_name)
+
+        self.stdout.write('Data created successfully.')
+
+    def timed(self, label, generate, *args):
+        start = time.perf_counter()
+        rows = generate(*args)
+        elapsed = time.perf_counter() - start
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f'{label}: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)')
+
+    def batches(self, count):
+        for start in range(1, count + 1, self.batch_size):
+            yield range(start, min(start + self.batch_size, count + 1))
+
+    def generate_products(self, count):
+        rng = self.rng
+        # Kept to fill in the order totals as the orders are generated.
+        self.prices = {}
+        for ids in self.batches(count):
+            rows = [
+                [
+                    pk,
+                    f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {pk}',
+                    # Log-normal prices: mostly cheap items with a long tail.
+                    Decimal(str(round(min(max(rng.lognormvariate(3, 1), 0.5), 99999), 2))),
+                    rng.random() < 0.9,
+                ]
+                for pk in ids
+            ]
+            insert_rows(Product, ['id', 'name', 'price', 'available'], rows, batch_size=self.batch_size)
+            self.prices.update((row[0], row[2]) for row in rows)
+        return count
+
+    def generate_customers(self, count):
+        rng = self.rng
+        for ids in self.batches(count):
+            rows = [
+                [
+                    pk,
+                    f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                    f'{rng.choice(STREETS)} {rng.randint(1, 200)}',
+                ]
+                for pk in ids
+            ]
+            insert_rows(Customer, ['id', 'name', 'address'], rows, batch_size=self.batch_size)
+        return count
+
+    def generate_orders(self, count, customers, products, products_per_order, days):
+        rng = self.rng
+        low, high = products_per_order
+        # Popularity follows a Zipf-like curve over a shuffled catalogue, and a minority
+        # of customers places most of the orders.
+        product_ids = list(range(1, products + 1))
+        rng.shuffle(product_ids)
+        product_weights = zipf_cum_weights(products, 1.1)
+        customer_ids = list(range(1, customers + 1))
+        rng.shuffle(customer_ids)
+        customer_weights = zipf_cum_weights(customers, 0.8)
+        statuses = [
+            (max_age, list(weights), list(weights.values()))
+            for max_age, weights in STATUS_BY_AGE
+        ]
+
+        links = 0
+        for ids in self.batches(count):
+            orders, order_products = [], []
+            for pk in ids:
+                age = timedelta(seconds=rng.random() * days * 86400)
+                age_days = age.total_seconds() / 86400
+                _, choices, weights = next(
+                    status for status in statuses if status[0] is None or age_days <= status[0]
+                )
+                order = [
+                    pk,
+                    rng.choices(customer_ids, cum_weights=customer_weights)[0],
+                    rng.choices(choices, weights=weights)[0],
+                    self.end - age,
+                ]
+                # Weighted draws repeat popular products; draw until enough are distinct.
+                wanted, picked = min(rng.randint(low, high), products), {}
+                while len(picked) < wanted:
+                    picked.update(dict.fromkeys(
+                        rng.choices(product_ids, cum_weights=product_weights, k=wanted - len(picked))
+                    ))
+                order_products += [[pk, product_id] for product_id in picked]
+                # The denormalized totals are known here: no UPDATE over the loaded orders.
+                orders.append(order + [sum((self.prices[product_id] for product_id in picked), Decimal('0.00')), len(picked)])
+
+            insert_rows(
+                Order, ['id', 'customer_id', 'status', 'date', 'total_price', 'item_count'], orders,
+                batch_size=self.batch_size,
+            )
+            insert_rows(Order.products.through, ['order_id', 'product_id'], order_products, batch_size=self.batch_size)
+            links += len(order_products)
+        return count + links
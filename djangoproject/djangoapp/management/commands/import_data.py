@@ -0,0 +1,243 @@
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from djangoapp.bulk_load import insert_rows, reset_sequences, supports_copy
+from djangoapp.cache import invalidate
+from djangoapp.models import ArchivedOrder, Product, Customer, Order
+
+TRUE_VALUES = {'true', 't', '1', 'yes', 'y'}
+FALSE_VALUES = {'false', 'f', '0', 'no', 'n'}
+STATUSES = {choice for choice, _ in Order.STATUS_CHOICES}
+
+
+def read_rows(path):
+    path = Path(path)
+    with path.open(newline='', encoding='utf-8') as file:
+        if path.suffix == '.csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def to_id(value):
+    if isinstance(value, dict):
+        value = value.get('id')
+    value = int(value)
+    if value <= 0:
+        raise ValueError
+    return value
+
+
+def to_text(max_length=None):
+    def convert(value):
+        value = str(value if value is not None else '').strip()
+        if not value or (max_length and len(value) > max_length):
+            raise ValueError
+        return value
+    return convert
+
+
+def to_price(value):
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError
+    if value <= 0 or value >= Decimal('1e8') or value.as_tuple().exponent < -2:
+        raise ValueError
+    return value
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError
+
+
+def to_status(value):
+    if value not in STATUSES:
+        raise ValueError
+    return value
+
+
+def to_date(value):
+    if not value:
+        return timezone.now()
+    value = parse_datetime(value) if isinstance(value, str) else None
+    if value is None:
+        raise ValueError
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def to_id_list(value):
+    if isinstance(value, str):
+        value = [part for part in value.split(';') if part]
+    return [to_id(item) for item in value or []]
+
+
+class Command(BaseCommand):
+    help = 'Imports products, customers and orders from CSV or NDJSON files.'
+
+    # Source column (first match wins), destination column, converter.
+    schemas = {
+        Product: [
+            (('id',), 'id', to_id),
+            (('name',), 'name', to_text(255)),
+            (('price',), 'price', to_price),
+            (('available',), 'available', to_bool),
+        ],
+        Customer: [
+            (('id',), 'id', to_id),
+            (('name',), 'name', to_text(100)),
+            (('address',), 'address', to_text()),
+        ],
+        Order: [
+            (('id',), 'id', to_id),
+            (('customer_id', 'customer'), 'customer_id', to_id),
+            (('status',), 'status', to_status),
+            (('date',), 'date', to_date),
+            (('product_ids', 'products'), 'products', to_id_list),
+        ],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', help='CSV or NDJSON file with id, name, price, available.')
+        parser.add_argument('--customers', help='CSV or NDJSON file with id, name, address.')
+        parser.add_argument('--orders', help='CSV or NDJSON file with id, customer_id, status, date, product_ids.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--skip-invalid', action='store_true', help='Skip invalid rows instead of aborting.')
+
+    def handle(self, *args, **kwargs):
+        self.batch_size = kwargs['batch_size']
+        self.skip_invalid = kwargs['skip_invalid']
+        self.known_ids = {
+            Product: set(Product.objects.values_list('id', flat=True)),
+            Customer: set(Customer.objects.values_list('id', flat=True)),
+        }
+        # Product prices, to fill in the order totals as the orders are written.
+        self.prices = dict(Product.objects.values_list('id', 'price'))
+        self.stdout.write(f"Loading with {'COPY FROM STDIN' if supports_copy() else 'bulk_create'}.")
+
+        with transaction.atomic():
+            for model, option in ((Product, 'products'), (Customer, 'customers'), (Order, 'orders')):
+                if kwargs[option]:
+                    self.import_file(model, kwargs[option])
+            reset_sequences([Product, Customer, Order])
+
+        # COPY and TRUNCATE bypass model signals, so drop cached API responses explicitly.
+        for model in (Product, Customer, Order):
+            invalidate(model._meta.model_name)
+
+        self.stdout.write('Data imported successfully.')
+
+    def import_file(self, model, path):
+        start = time.perf_counter()
+        imported = skipped = links = 0
+        for batch in batched(read_rows(path), self.batch_size):
+            columns, errors = self.validate(model, batch, first_row=imported + skipped + 1)
+            valid = [index for index in range(len(batch)) if index not in errors]
+            skipped += len(errors)
+            imported += len(valid)
+            links += self.write(model, columns, valid)
+
+        elapsed = time.perf_counter() - start
+        rate = (imported + links) / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {imported} imported, {skipped} skipped'
+            + (f', {links} product links' if model is Order else '')
+            + f' in {elapsed:.2f}s ({rate:,.0f} rows/s)'
+        )
+
+    def validate(self, model, batch, first_row):
+        # Column-wise pass: each converter runs over a whole column of the batch.
+        columns, errors = {}, {}
+        for sources, column, convert in self.schemas[model]:
+            values = []
+            for index, row in enumerate(batch):
+                raw = next((row[source] for source in sources if source in row), None)
+                try:
+                    values.append(convert(raw))
+                except (TypeError, ValueError):
+                    values.append(None)
+                    errors.setdefault(index, []).append(column)
+            columns[column] = values
+
+        self.check_new_ids(model, columns['id'], errors)
+        if model is Order:
+            self.check_references(columns['customer_id'], Customer, errors, 'customer_id')
+            for index, product_ids in enumerate(columns['products']):
+                if product_ids is not None and not self.known_ids[Product].issuperset(product_ids):
+                    errors.setdefault(index, []).append('products')
+
+        if errors and not self.skip_invalid:
+            details = '; '.join(
+                f"row {first_row + index}: invalid {', '.join(names)}" for index, names in list(errors.items())[:10]
+            )
+            raise CommandError(f'Invalid {model._meta.verbose_name_plural} ({len(errors)} rows): {details}')
+        return columns, errors
+
+    def check_new_ids(self, model, values, errors):
+        # Ids already in the database, from an earlier batch, or repeated within this
+        # one. Order ids are looked up per batch rather than all loaded up front;
+        # archived orders keep their ids.
+        if model in self.known_ids:
+            taken = self.known_ids[model]
+        else:
+            candidates = {value for value in values if value is not None}
+            taken = set(Order.objects.filter(id__in=candidates).values_list('id', flat=True))
+            taken.update(ArchivedOrder.objects.filter(id__in=candidates).values_list('id', flat=True))
+        seen = set()
+        for index, value in enumerate(values):
+            if value is not None and (value in taken or value in seen):
+                errors.setdefault(index, []).append('id (duplicate)')
+            seen.add(value)
+
+    def check_references(self, values, model, errors, column):
+        for index, value in enumerate(values):
+            if value is not None and value not in self.known_ids[model]:
+                errors.setdefault(index, []).append(column)
+
+    def write(self, model, columns, valid):
+        names = [column for _, column, _ in self.schemas[model] if column != 'products']
+        rows = [[columns[name][index] for name in names] for index in valid]
+        if model is Order:
+            # COPY sends no m2m_changed, so the denormalized totals are written with
+            # the rows instead of by an UPDATE over every imported order.
+            names += ['total_price', 'item_count']
+            for row, index in zip(rows, valid):
+                product_ids = dict.fromkeys(columns['products'][index])
+                row += [sum((self.prices[pk] for pk in product_ids), Decimal('0.00')), len(product_ids)]
+        insert_rows(model, names, rows, batch_size=self.batch_size)
+        if model is Product:
+            self.prices.update((columns['id'][index], columns['price'][index]) for index in valid)
+        if model in self.known_ids:
+            self.known_ids[model].update(columns['id'][index] for index in valid)
+            return 0
+
+        links = [
+            [columns['id'][index], product_id]
+            for index in valid
+            for product_id in dict.fromkeys(columns['products'][index])
+        ]
+        insert_rows(Order.products.through, ['order_id', 'product_id'], links, batch_size=self.batch_size)
+        return len(links)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from djangoapp.partitions import add_months, archivable_months, archive_month, create_partitions, is_partitioned, month_start
+
+
+class Command(BaseCommand):
+    help = 'Creates the coming monthly partitions of the order table and archives the old months.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Months after the current one to create partitions for.')
+        parser.add_argument('--retain', type=int, default=None,
+                            help='Months before the current one to keep live; older ones are archived. '
+                                 'Nothing is archived without it.')
+        parser.add_argument('--include-open', action='store_true',
+                            help='Archive months that still have orders that are not completed.')
+
+    def handle(self, *args, **kwargs):
+        current = month_start(timezone.now())
+        if is_partitioned():
+            for name in create_partitions(current, add_months(current, kwargs['ahead'])):
+                self.stdout.write(f'Created partition {name}.')
+        else:
+            self.stdout.write('The order table is not partitioned on this database; archiving copies rows.')
+
+        if kwargs['retain'] is not None:
+            for month in archivable_months(add_months(current, -kwargs['retain'])):
+                count = archive_month(month, include_open=kwargs['include_open'])
+                if count is None:
+                    self.stdout.write(f'Kept {month:%Y-%m}: it has orders that are not completed.')
+                else:
+                    self.stdout.write(f'Archived {month:%Y-%m}: {count} orders.')
+
+        self.stdout.write('Partitions managed successfully.')
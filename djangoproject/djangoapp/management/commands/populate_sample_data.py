@@ -1,13 +1,12 @@
 from django.core.management.base import BaseCommand
 from djangoapp.models import Product, Customer, Order
+from djangoapp.bulk_load import truncate
 from decimal import Decimal
 
 class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
-        Product.objects.all().delete()
-        Customer.objects.all().delete()
-        Order.objects.all().delete()
+        truncate([Order.products.through, Order, Customer, Product])
 
         product1 = Product(name='Test product 1', price=Decimal('9.99'), available=True)
         product1.full_clean()
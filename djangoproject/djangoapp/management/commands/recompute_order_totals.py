@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max, Min
+from djangoapp.cache import invalidate
+from djangoapp.models import Order, products_count, products_total
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized Order.total_price and item_count columns in id-range batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **kwargs):
+        batch_size = kwargs['batch_size']
+        bounds = Order.objects.aggregate(first=Min('id'), last=Max('id'))
+        start_time = time.perf_counter()
+        checked = updated = 0
+
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+                batch = Order.objects.filter(id__gte=start, id__lt=start + batch_size)
+                # Only rewrite rows that are actually stale, to keep the write volume low.
+                stale = batch.alias(computed_total=products_total(), computed_count=products_count()).exclude(
+                    total_price=F('computed_total'), item_count=F('computed_count'),
+                )
+                with transaction.atomic():
+                    updated += Order.objects.filter(pk__in=stale.values('pk')).recompute_totals()
+                checked += batch.count()
+
+        if updated:
+            invalidate('order')
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(f'{checked} orders checked, {updated} updated in {elapsed:.2f}s.')
+        self.stdout.write('Order totals recomputed successfully.')
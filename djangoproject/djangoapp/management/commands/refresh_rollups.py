@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+from djangoapp.reports import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the daily sales rollups from the orders changed since the last refresh.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every day instead of only the changed ones.')
+
+    def handle(self, *args, **kwargs):
+        start_time = time.perf_counter()
+        days = refresh_rollups(full=kwargs['full'])
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(f'{days} days rebuilt in {elapsed:.2f}s.')
+        self.stdout.write('Rollups refreshed successfully.')
@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from djangoapp.jobs import purge_finished, work
+from djangoapp.models import Job
+
+
+class WorkerStats:
+    # Outcome counters shared by all workers; multiprocessing values, so forked
+    # worker processes report into the same numbers as threads do.
+
+    def __init__(self, context):
+        self.lock = context.Lock()
+        self.counts = {outcome: context.Value('q', 0, lock=False) for outcome in (Job.DONE, Job.QUEUED, Job.FAILED, None)}
+        self.busy = context.Value('d', 0.0, lock=False)
+
+    def record(self, outcome, duration):
+        with self.lock:
+            self.counts[outcome].value += 1
+            self.busy.value += duration
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'done': self.counts[Job.DONE].value,
+                'retried': self.counts[Job.QUEUED].value,
+                'failed': self.counts[Job.FAILED].value,
+                'lost': self.counts[None].value,
+                'busy': self.busy.value,
+            }
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the database queue with a pool of worker threads or processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of workers.')
+        parser.add_argument('--processes', action='store_true', help='Fork worker processes instead of threads.')
+        parser.add_argument('--batch-size', type=int, default=1, help='Jobs claimed per query.')
+        parser.add_argument('--visibility-timeout', type=int, default=None,
+                            help='Seconds before a claimed job is handed out again (JOB_VISIBILITY_TIMEOUT).')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due.')
+        parser.add_argument('--report-interval', type=float, default=60.0, help='Seconds between throughput reports.')
+        parser.add_argument('--purge-after', type=float, default=24.0,
+                            help='Hours finished jobs are kept; purged at each report.')
+
+    def handle(self, *args, **kwargs):
+        context = multiprocessing.get_context('fork') if kwargs['processes'] else None
+        stop = context.Event() if context else threading.Event()
+        stats = WorkerStats(context or multiprocessing.get_context())
+        options = {
+            'stop': stop,
+            'stats': stats,
+            'batch_size': kwargs['batch_size'],
+            'visibility_timeout': kwargs['visibility_timeout'],
+            'poll_interval': kwargs['poll_interval'],
+            'burst': kwargs['burst'],
+        }
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+        if context:
+            # Forked children must not share the parent's database connections.
+            connections.close_all()
+            workers = [context.Process(target=work, args=(f'{prefix}:{i}',), kwargs=options, daemon=True)
+                       for i in range(kwargs['concurrency'])]
+        else:
+            workers = [threading.Thread(target=work, args=(f'{prefix}:{i}',), kwargs=options, daemon=True)
+                       for i in range(kwargs['concurrency'])]
+
+        def shutdown(signum, frame):
+            # Workers finish the job in hand and exit.
+            stop.set()
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            handlers = {signum: signal.signal(signum, shutdown) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+        start = time.perf_counter()
+        try:
+            for worker in workers:
+                worker.start()
+            self.stdout.write(f"{len(workers)} {'processes' if context else 'threads'} working.")
+
+            last_report, last_done = start, 0
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(min(kwargs['report_interval'], 0.2))
+                now = time.perf_counter()
+                if now - last_report >= kwargs['report_interval']:
+                    snapshot = stats.snapshot()
+                    rate = (snapshot['done'] - last_done) / (now - last_report)
+                    self.stdout.write(self.format(snapshot, rate))
+                    purge_finished(timedelta(hours=kwargs['purge_after']))
+                    last_report, last_done = now, snapshot['done']
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+        elapsed = time.perf_counter() - start
+        snapshot = stats.snapshot()
+        self.stdout.write(self.format(snapshot, snapshot['done'] / elapsed if elapsed else 0) + f' in {elapsed:.2f}s.')
+        self.stdout.write('Worker stopped successfully.')
+
+    def format(self, snapshot, rate):
+        finished = snapshot['done'] + snapshot['retried'] + snapshot['failed']
+        mean = snapshot['busy'] / finished * 1000 if finished else 0
+        return (
+            f"{snapshot['done']} jobs done, {snapshot['retried']} retried, {snapshot['failed']} failed, "
+            f"{snapshot['lost']} lost; {rate:.1f} jobs/s, {mean:.1f}ms mean"
+        )
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from djangoapp.authentication import add_user_claims
+from djangoapp.benchmarks import latency_summary
+from djangoapp.models import Product, Customer
+from rest_framework_simplejwt.tokens import AccessToken
+
+STRESS_NAME = 'stress_stock'
+
+
+class Command(BaseCommand):
+    help = 'Places orders for one product from many threads at once and checks that its stock is never oversold.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--orders', type=int, default=300, help='Orders attempted in total.')
+        parser.add_argument('--host', default='localhost', help='Host header; must be in ALLOWED_HOSTS.')
+
+    def handle(self, *args, **kwargs):
+        user = User.objects.create(username=STRESS_NAME, is_staff=True)
+        customer = Customer.objects.create(name=STRESS_NAME, address=STRESS_NAME)
+        product = Product.objects.create(name=STRESS_NAME, price=Decimal('1.00'), stock=kwargs['stock'])
+        token = add_user_claims(AccessToken.for_user(user), user)
+        data = {'customer': customer.id, 'products': [product.id], 'status': 'NEW'}
+
+        latencies, statuses = [], {}
+        lock = threading.Lock()
+        remaining = iter(range(kwargs['orders']))
+
+        def worker():
+            client = Client(SERVER_NAME=kwargs['host'], raise_request_exception=False)
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    start = time.perf_counter()
+                    response = client.post(reverse('order-list'), data, content_type='application/json',
+                                           headers={'Authorization': f'Bearer {token}'})
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+                for future in [executor.submit(worker) for _ in range(kwargs['workers'])]:
+                    future.result()
+            elapsed = time.perf_counter() - start
+
+            product.refresh_from_db()
+            placed = customer.order_set.count()
+            report = {
+                'database': connection.vendor,
+                'workers': kwargs['workers'],
+                'stock': kwargs['stock'],
+                'placed': placed,
+                'remaining_stock': product.stock,
+                'oversold': max(placed - kwargs['stock'], 0),
+                'consistent': placed + product.stock == kwargs['stock'],
+                'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+                **latency_summary(latencies, elapsed),
+            }
+        finally:
+            customer.delete()
+            product.delete()
+            user.delete()
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,167 @@
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def empty_stats():
+    return {
+        'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+        'count': 0, 'sum': 0.0, 'queries': 0, 'query_time': 0.0, 'bytes': 0,
+    }
+
+
+class MetricsRegistry:
+    # Per-process counters keyed by (route, method). Each process periodically dumps a
+    # snapshot to METRICS_DIR/<pid>.json and the /metrics view sums all snapshots, so
+    # every worker is reported no matter which one serves the scrape.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.last_flush = time.monotonic()
+        self.routes = {}
+        self.statuses = {}
+
+    def observe(self, route, method, status, duration, queries, query_time, size):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked worker: do not report the parent's numbers twice.
+                self.reset()
+            stats = self.routes.get((route, method))
+            if stats is None:
+                stats = self.routes[(route, method)] = empty_stats()
+            stats['buckets'][bisect_left(LATENCY_BUCKETS, duration)] += 1
+            stats['count'] += 1
+            stats['sum'] += duration
+            stats['queries'] += queries
+            stats['query_time'] += query_time
+            stats['bytes'] += size
+            key = (route, method, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+            directory = getattr(settings, 'METRICS_DIR', None)
+            if directory and time.monotonic() - self.last_flush >= getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+                self._flush(directory)
+
+    def snapshot(self):
+        with self.lock:
+            return self._data()
+
+    def _data(self):
+        return {
+            'routes': [[route, method, {**stats, 'buckets': list(stats['buckets'])}]
+                       for (route, method), stats in self.routes.items()],
+            'statuses': [[route, method, status, count] for (route, method, status), count in self.statuses.items()],
+        }
+
+    def flush(self):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory:
+            with self.lock:
+                self._flush(directory)
+
+    def _flush(self, directory):
+        self.last_flush = time.monotonic()
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        temporary = path / f'.{self.pid}.json.tmp'
+        temporary.write_text(json.dumps(self._data()))
+        temporary.replace(path / f'{self.pid}.json')
+
+    def collect(self):
+        # Sum the snapshots of all processes; our own numbers are taken live.
+        snapshots = [self.snapshot()]
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory and Path(directory).is_dir():
+            for file in Path(directory).glob('*.json'):
+                if file.stem == str(os.getpid()):
+                    continue
+                if not file.stem.isdigit() or not process_alive(int(file.stem)):
+                    # Left by a worker that exited; a restarted one starts from zero.
+                    file.unlink(missing_ok=True)
+                    continue
+                try:
+                    snapshots.append(json.loads(file.read_text()))
+                except (OSError, ValueError):
+                    continue
+
+        routes, statuses = {}, {}
+        for snapshot in snapshots:
+            for route, method, stats in snapshot['routes']:
+                total = routes.setdefault((route, method), empty_stats())
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+                for name in ('count', 'sum', 'queries', 'query_time', 'bytes'):
+                    total[name] += stats[name]
+            for route, method, status, count in snapshot['statuses']:
+                statuses[(route, method, status)] = statuses.get((route, method, status), 0) + count
+        return routes, statuses
+
+
+registry = MetricsRegistry()
+
+
+def process_alive(pid):
+    # METRICS_DIR is shared by the processes of one host, so pids are comparable.
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def scrape_allowed(request):
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_prometheus(routes, statuses):
+    lines = [
+        '# HELP http_request_duration_seconds Request latency by route and method.',
+        '# TYPE http_request_duration_seconds histogram',
+    ]
+    for (route, method), stats in sorted(routes.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'http_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} {cumulative}')
+        lines.append(f"http_request_duration_seconds_sum{_labels(route=route, method=method)} {stats['sum']}")
+        lines.append(f"http_request_duration_seconds_count{_labels(route=route, method=method)} {stats['count']}")
+
+    counters = [
+        ('db_queries_total', 'Database queries executed while handling requests.', 'queries'),
+        ('db_query_duration_seconds_total', 'Time spent in database queries.', 'query_time'),
+        ('http_response_size_bytes_total', 'Response body bytes (streaming responses excluded).', 'bytes'),
+    ]
+    for name, description, key in counters:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+        for (route, method), stats in sorted(routes.items()):
+            lines.append(f'{name}{_labels(route=route, method=method)} {stats[key]}')
+
+    lines += ['# HELP http_requests_total Responses by route, method and status code.',
+              '# TYPE http_requests_total counter']
+    for (route, method, status), count in sorted(statuses.items()):
+        lines.append(f'http_requests_total{_labels(route=route, method=method, status=status)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,136 @@
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import OperationalError
+from rest_framework.permissions import SAFE_METHODS
+
+from .metrics import registry
+from .routers import RequestRouting, current_routing
+
+# Counter of the request being handled. A context variable rather than a
+# connection wrapper, because async views run their queries in worker threads
+# with connections of their own; sync_to_async copies the context along.
+current_query_counter = ContextVar('current_query_counter', default=None)
+
+
+class QueryCounter:
+
+    def __init__(self, parent=None):
+        self.count = 0
+        self.duration = 0.0
+        self.parent = parent
+
+    def record(self, duration):
+        self.count += 1
+        self.duration += duration
+        if self.parent is not None:
+            self.parent.record(duration)
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = current_query_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        counter.record(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    # Records latency, DB queries and response size per resolved URL name and method.
+    # For streaming responses only the time to the first byte is measured.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter(parent=current_query_counter.get())
+        token = current_query_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_counter.reset(token)
+        self.observe(request, response, counter, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter(parent=current_query_counter.get())
+        token = current_query_counter.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_counter.reset(token)
+        self.observe(request, response, counter, time.perf_counter() - start)
+        return response
+
+    def observe(self, request, response, counter, duration):
+        match = request.resolver_match
+        route = (match.view_name if match else None) or 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(route, request.method, response.status_code, duration, counter.count, counter.duration, size)
+
+
+class ReplicaRoutingMiddleware:
+    # Routes the reads of GET and HEAD requests to the replicas; see routers.py.
+    # After any other request the client reads from the primary for
+    # REPLICA_STICKY_SECONDS. A read request whose replica fails with a connection
+    # error is run once more on the primary.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        routing = RequestRouting(request)
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+            if routing.failed:
+                response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.after_response(request, routing)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+        routing = RequestRouting(request)
+        token = current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+            if routing.failed:
+                response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        self.after_response(request, routing)
+        return response
+
+    def process_exception(self, request, exception):
+        routing = current_routing.get()
+        if routing is not None and not routing.failed and routing.on_replica() and isinstance(exception, OperationalError):
+            routing.fail_over()
+        return None
+
+    def after_response(self, request, routing):
+        if request.method not in SAFE_METHODS:
+            routing.stick_to_primary()
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0004_alter_customer_name_alter_product_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['date', 'id'], name='order_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS product_name_trgm_idx '
+        'ON djangoapp_product USING gin (name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS product_name_search_idx '
+        "ON djangoapp_product USING gin (to_tsvector('simple'::regconfig, COALESCE(name, '')))"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS product_name_search_idx')
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS product_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+    # Raw SQL instead of Meta.indexes: the indexes are built CONCURRENTLY, and the
+    # full-text one is on an expression over the name.
+    atomic = False
+
+    dependencies = [
+        ('djangoapp', '0005_order_date_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+INDEXES = [
+    models.Index(fields=['status', 'date', 'id'], name='order_status_date_idx'),
+    models.Index(fields=['customer', 'date', 'id'], name='order_customer_date_idx'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    Order = apps.get_model('djangoapp', 'Order')
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    for index in INDEXES:
+        schema_editor.add_index(Order, index, **concurrently)
+
+
+def drop_indexes(apps, schema_editor):
+    Order = apps.get_model('djangoapp', 'Order')
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    for index in INDEXES:
+        schema_editor.remove_index(Order, index, **concurrently)
+
+
+class Migration(migrations.Migration):
+    # Built CONCURRENTLY on PostgreSQL so the orders table stays writable meanwhile.
+    atomic = False
+
+    dependencies = [
+        ('djangoapp', '0006_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='order', index=index) for index in INDEXES],
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+        ),
+    ]
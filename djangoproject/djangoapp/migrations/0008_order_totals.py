@@ -0,0 +1,64 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:45
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 10000
+
+TOTAL_PRICE_INDEX = models.Index(fields=['total_price', 'id'], name='order_total_price_idx')
+
+
+def backfill_totals(apps, schema_editor):
+    Order = apps.get_model('djangoapp', 'Order')
+    OrderProduct = Order.products.through
+    lines = OrderProduct.objects.filter(order_id=OuterRef('pk')).values('order_id')
+    total = lines.annotate(total=Sum('product__price')).values('total')
+    count = lines.annotate(count=Count('id')).values('count')
+    decimal = models.DecimalField(max_digits=12, decimal_places=2)
+
+    last_id = Order.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        Order.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+            total_price=Coalesce(Subquery(total, output_field=decimal), Value(Decimal('0.00')), output_field=decimal),
+            item_count=Coalesce(Subquery(count, output_field=models.IntegerField()), Value(0)),
+        )
+
+
+def create_index(apps, schema_editor):
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    schema_editor.add_index(apps.get_model('djangoapp', 'Order'), TOTAL_PRICE_INDEX, **concurrently)
+
+
+def drop_index(apps, schema_editor):
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    schema_editor.remove_index(apps.get_model('djangoapp', 'Order'), TOTAL_PRICE_INDEX, **concurrently)
+
+
+class Migration(migrations.Migration):
+    # Not atomic: the backfill commits batch by batch and the index is built
+    # CONCURRENTLY on PostgreSQL.
+    atomic = False
+
+    dependencies = [
+        ('djangoapp', '0007_order_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='order', index=TOTAL_PRICE_INDEX)],
+            database_operations=[migrations.RunPython(create_index, drop_index)],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+OLD_INDEX = models.Index(fields=['customer', 'date', 'id'], name='order_customer_date_idx')
+NEW_INDEX = models.Index(
+    fields=['customer', 'date', 'id'], include=('status', 'total_price'), name='order_customer_history_idx',
+)
+
+
+def swap_index(apps, schema_editor, add, remove):
+    # The new index is built before the old one is dropped, so customer lookups
+    # never lose their index.
+    Order = apps.get_model('djangoapp', 'Order')
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    schema_editor.add_index(Order, add, **concurrently)
+    schema_editor.remove_index(Order, remove, **concurrently)
+
+
+def forwards(apps, schema_editor):
+    swap_index(apps, schema_editor, add=NEW_INDEX, remove=OLD_INDEX)
+
+
+def backwards(apps, schema_editor):
+    swap_index(apps, schema_editor, add=OLD_INDEX, remove=NEW_INDEX)
+
+
+class Migration(migrations.Migration):
+    # The covering columns let the customer stats run as an index-only scan on
+    # PostgreSQL; other backends get the plain (customer, date, id) index.
+    atomic = False
+
+    dependencies = [
+        ('djangoapp', '0008_order_totals'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveIndex(model_name='order', name='order_customer_date_idx'),
+                migrations.AddIndex(model_name='order', index=NEW_INDEX),
+            ],
+            database_operations=[migrations.RunPython(forwards, backwards)],
+        ),
+    ]
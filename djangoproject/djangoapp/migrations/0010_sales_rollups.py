@@ -0,0 +1,90 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:52
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+UPDATED_AT_INDEX = models.Index(fields=['updated_at'], name='order_updated_at_idx')
+
+
+def create_index(apps, schema_editor):
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    schema_editor.add_index(apps.get_model('djangoapp', 'Order'), UPDATED_AT_INDEX, **concurrently)
+
+
+def drop_index(apps, schema_editor):
+    concurrently = {'concurrently': True} if schema_editor.connection.vendor == 'postgresql' else {}
+    schema_editor.remove_index(apps.get_model('djangoapp', 'Order'), UPDATED_AT_INDEX, **concurrently)
+
+
+class Migration(migrations.Migration):
+    # Not atomic: the updated_at index is built CONCURRENTLY on PostgreSQL. Existing
+    # orders get now() from the database default, so the first refresh sees them all.
+    atomic = False
+
+    dependencies = [
+        ('djangoapp', '0009_order_customer_history_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('order_count', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('NEW', 'New'), ('IN_PROCESS', 'In Process'), ('SENT', 'Sent'), ('COMPLETED', 'Completed')])),
+                ('order_count', models.PositiveIntegerField()),
+                ('item_count', models.PositiveIntegerField()),
+                ('revenue', models.DecimalField(decimal_places=2, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('watermark', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StaleRollupDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_default=django.db.models.functions.datetime.Now()),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='order', index=UPDATED_AT_INDEX)],
+            database_operations=[migrations.RunPython(create_index, drop_index)],
+        ),
+        migrations.AddField(
+            model_name='dailyproductrollup',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='djangoapp.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailystatusrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'status'), name='daily_status_rollup_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductrollup',
+            index=models.Index(fields=['product', 'day'], name='daily_product_rollup_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='daily_product_rollup_uniq'),
+        ),
+    ]
@@ -0,0 +1,159 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:18
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+MONTHS_AHEAD = 3
+
+
+def months(first, last):
+    # First instants of the months from first's to last's, in the current time zone.
+    first, last = timezone.localtime(first), timezone.localtime(last)
+    index, end = first.year * 12 + first.month - 1, last.year * 12 + last.month - 1
+    return [timezone.make_aware(datetime(i // 12, i % 12 + 1, 1)) for i in range(index, end + 2)]
+
+
+def rebuild_table(cursor, table, like=None, bounds=(), default=False, partitioned=True):
+    # Recreates `table` from its own definition (or from `like`), partitioned by
+    # range of date or plain, keeping its rows, indexes, foreign keys and id
+    # sequence. Foreign keys pointing at it are dropped: a partitioned table can
+    # only be referenced by its whole primary key (id, date).
+    old = f'{table}_rebuilt'
+    cursor.execute(
+        "SELECT replace(indexdef, ' ON ONLY ', ' ON ') FROM pg_indexes "
+        "WHERE schemaname = current_schema() AND tablename = %s AND indexname NOT IN "
+        "(SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p')",
+        [table, table],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute(
+        "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    referencing = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+    sequence = cursor.fetchone()[0]
+
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+    partition_by = ' PARTITION BY RANGE (date)' if partitioned else ''
+    cursor.execute(f'CREATE TABLE "{table}" (LIKE "{like or old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}')
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id DROP DEFAULT')
+    for start, end in zip(bounds, bounds[1:]):
+        cursor.execute(
+            f'CREATE TABLE "{table}_{start:%Y_%m}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', [start, end],
+        )
+    if default:
+        cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    cursor.execute(
+        'SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped '
+        'ORDER BY attnum',
+        [old],
+    )
+    columns = ', '.join(f'"{row[0]}"' for row in cursor.fetchall())
+    cursor.execute(f'INSERT INTO "{table}" ({columns}) SELECT {columns} FROM "{old}"')
+    for referencing_table, name in referencing:
+        cursor.execute(f'ALTER TABLE {referencing_table} DROP CONSTRAINT "{name}"')
+    cursor.execute(f'DROP TABLE "{old}"')
+
+    cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY ({"id, date" if partitioned else "id"})')
+    for sql in indexes:
+        cursor.execute(sql)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+    if sequence:
+        # Partitioned tables cannot have identity columns before PostgreSQL 17.
+        if partitioned:
+            cursor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+            cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(%s)', [f'"{table}_id_seq"'])
+        else:
+            cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(max(id), 0) + 1, false) FROM \"{table}\"",
+            [table],
+        )
+
+
+def partition_orders(apps, schema_editor):
+    # Monthly partitions cover the existing orders and the next MONTHS_AHEAD months;
+    # manage.py manage_partitions adds the following ones. Orders outside them land
+    # in djangoapp_order_default. The archive is partitioned the same way, without
+    # partitions of its own, so that old months can be moved there by attaching them.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT min(date), max(date) FROM djangoapp_order')
+        first, last = cursor.fetchone()
+        now = timezone.now()
+        bounds = months(first or now, max(last or now, now + timedelta(days=31 * MONTHS_AHEAD)))
+        rebuild_table(cursor, 'djangoapp_order', bounds=bounds, default=True)
+        rebuild_table(cursor, 'djangoapp_archivedorder', like='djangoapp_order')
+
+
+def unpartition_orders(apps, schema_editor):
+    # Archived orders go back to the order table before the archive is dropped.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('INSERT INTO djangoapp_order SELECT * FROM djangoapp_archivedorder')
+        cursor.execute(
+            'INSERT INTO djangoapp_order_products (order_id, product_id) '
+            'SELECT order_id, product_id FROM djangoapp_archivedorderproduct'
+        )
+        rebuild_table(cursor, 'djangoapp_order', partitioned=False)
+        cursor.execute(
+            'ALTER TABLE djangoapp_order_products ADD CONSTRAINT djangoapp_order_products_order_id_fk '
+            'FOREIGN KEY (order_id) REFERENCES djangoapp_order (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+
+class Migration(migrations.Migration):
+    # Rewrites the order table on PostgreSQL while holding an exclusive lock on it:
+    # run it in a maintenance window. Indexes added to Order from now on cannot be
+    # built CONCURRENTLY, as partitioned tables do not support that.
+
+    dependencies = [
+        ('djangoapp', '0012_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('NEW', 'New'), ('IN_PROCESS', 'In Process'), ('SENT', 'Sent'), ('COMPLETED', 'Completed')])),
+                ('total_price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='djangoapp.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='djangoapp.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='djangoapp.product')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedorder',
+            name='products',
+            field=models.ManyToManyField(related_name='archived_orders', through='djangoapp.ArchivedOrderProduct', to='djangoapp.product'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedorderproduct',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='archived_order_product_uniq'),
+        ),
+        migrations.RunPython(partition_orders, unpartition_orders),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+INDEX = 'djangoapp_order_customer_id_3b98269b'
+
+
+class Migration(migrations.Migration):
+    # order_customer_history_idx (customer, date, id) serves every customer lookup,
+    # so the foreign key's own index only slows down writes. Only the index is
+    # dropped: AlterField would also drop and re-add the constraint, re-checking
+    # every order.
+
+    dependencies = [
+        ('djangoapp', '0013_order_partitions'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='order',
+                    name='customer',
+                    field=models.ForeignKey(
+                        db_index=False, on_delete=django.db.models.deletion.CASCADE, to='djangoapp.customer',
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    f'DROP INDEX IF EXISTS "{INDEX}"',
+                    f'CREATE INDEX "{INDEX}" ON "djangoapp_order" ("customer_id")',
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:52
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0014_order_customer_without_fk_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(db_default=Decimal('0.00'), decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=12),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.3 on 2026-10-18 20:05
+
+from django.db import migrations
+
+# The partitioned order table's primary key is (id, date), which leaves the id
+# itself unique only within a month. djangoapp_order_ids holds every order id,
+# live or archived, under a primary key of its own; triggers on the order table
+# keep it current, so an insert that reuses an id fails with an IntegrityError
+# whatever its date. Archiving detaches partitions without firing them, so the
+# ids of archived orders stay taken.
+REGISTRY = 'djangoapp_order_ids'
+
+CREATE_SQL = [
+    f'CREATE TABLE {REGISTRY} (id bigint PRIMARY KEY)',
+    f'INSERT INTO {REGISTRY} (id) SELECT id FROM djangoapp_order UNION ALL SELECT id FROM djangoapp_archivedorder',
+    f"""
+    CREATE FUNCTION djangoapp_order_ids_track() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO {REGISTRY} (id) SELECT id FROM inserted;
+        ELSIF TG_OP = 'DELETE' THEN
+            DELETE FROM {REGISTRY} WHERE id IN (SELECT id FROM deleted);
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE {REGISTRY} SET id = NEW.id WHERE id = OLD.id;
+            RETURN NEW;
+        ELSE
+            TRUNCATE {REGISTRY};
+        END IF;
+        RETURN NULL;
+    END
+    $$
+    """,
+    # Statement triggers read the rows from transition tables, so COPY and bulk
+    # writes update the registry in one statement rather than one per row.
+    'CREATE TRIGGER order_ids_insert AFTER INSERT ON djangoapp_order REFERENCING NEW TABLE AS inserted '
+    'FOR EACH STATEMENT EXECUTE FUNCTION djangoapp_order_ids_track()',
+    'CREATE TRIGGER order_ids_delete AFTER DELETE ON djangoapp_order REFERENCING OLD TABLE AS deleted '
+    'FOR EACH STATEMENT EXECUTE FUNCTION djangoapp_order_ids_track()',
+    'CREATE TRIGGER order_ids_truncate AFTER TRUNCATE ON djangoapp_order '
+    'FOR EACH STATEMENT EXECUTE FUNCTION djangoapp_order_ids_track()',
+    # A row trigger, as a date change that moves the row to another partition fires
+    # no UPDATE statement trigger; BEFORE row triggers still fire for it.
+    'CREATE TRIGGER order_ids_update BEFORE UPDATE OF id ON djangoapp_order '
+    'FOR EACH ROW WHEN (OLD.id IS DISTINCT FROM NEW.id) EXECUTE FUNCTION djangoapp_order_ids_track()',
+]
+
+DROP_SQL = [
+    'DROP TRIGGER order_ids_insert ON djangoapp_order',
+    'DROP TRIGGER order_ids_delete ON djangoapp_order',
+    'DROP TRIGGER order_ids_truncate ON djangoapp_order',
+    'DROP TRIGGER order_ids_update ON djangoapp_order',
+    'DROP FUNCTION djangoapp_order_ids_track()',
+    f'DROP TABLE {REGISTRY}',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        # Only PostgreSQL partitions the order table (0013); elsewhere the id is the primary key.
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql, params=None)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('djangoapp', '0015_order_totals_db_default'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
@@ -0,0 +1,142 @@
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import empty
+from rest_framework.response import Response
+
+from .cache import invalidate_now_and_on_commit
+from .serializers import ValuesRepresentation
+
+
+class BulkItemsMixin:
+    # Request body checks shared by the bulk endpoints.
+    bulk_batch_size = 1000
+    bulk_max_items = 10000
+
+    def get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'detail': 'Expected a list of items.'})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError({'detail': f'At most {self.bulk_max_items} items are allowed per request.'})
+        return items
+
+
+class BulkMutationMixin(BulkItemsMixin):
+    # Adds POST/PATCH/DELETE /<resource>/bulk/ taking a list of items. The whole batch
+    # is validated first and written with bulk_create/bulk_update in one transaction;
+    # if any item is invalid nothing is written and the errors are reported per item.
+    id_field = serializers.IntegerField()
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        items = self.get_bulk_items(request)
+        if request.method == 'POST':
+            return self.bulk_create(items)
+        if request.method == 'PATCH':
+            return self.bulk_update(items)
+        return self.bulk_destroy(items)
+
+    def bulk_invalidate(self):
+        # bulk_create/bulk_update send no model signals, so drop cached responses here.
+        invalidate_now_and_on_commit(self.get_queryset().model._meta.model_name)
+
+    def after_bulk_update(self, objects, fields):
+        # bulk_update sends no signals either; override to refresh data derived from
+        # the updated fields.
+        self.bulk_invalidate()
+
+    def validate_ids(self, values):
+        # Ids go through an IntegerField like any other input: "5" is taken as 5, and
+        # values that are not integers are reported instead of looked up.
+        ids, errors = [], []
+        for value in values:
+            try:
+                ids.append(self.id_field.run_validation(value))
+                errors.append({})
+            except ValidationError as error:
+                ids.append(None)
+                errors.append({'id': error.detail})
+        return ids, errors
+
+    def bulk_create(self, items):
+        serializer = self.get_serializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        model = self.get_queryset().model
+        with transaction.atomic():
+            objects = model.objects.bulk_create(
+                [model(**data) for data in serializer.validated_data],
+                batch_size=self.bulk_batch_size,
+            )
+            self.bulk_invalidate()
+        return Response(self.get_serializer(objects, many=True).data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, items):
+        model = self.get_queryset().model
+        ids, id_errors = self.validate_ids(item.get('id', empty) if isinstance(item, dict) else empty for item in items)
+        existing = model.objects.in_bulk([pk for pk in ids if pk is not None])
+
+        errors, objects, fields = [], [], set()
+        for pk, item, id_error in zip(ids, items, id_errors):
+            instance = existing.get(pk)
+            if id_error or instance is None:
+                errors.append(id_error or {'id': ['Object with this id does not exist.']})
+                continue
+            serializer = self.get_serializer(instance, data=item, partial=True)
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
+            for name, value in serializer.validated_data.items():
+                setattr(instance, name, value)
+            fields.update(serializer.validated_data)
+            objects.append(instance)
+            errors.append({})
+
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            if fields:
+                model.objects.bulk_update(objects, sorted(fields), batch_size=self.bulk_batch_size)
+                self.after_bulk_update(objects, fields)
+        return Response(self.get_serializer(objects, many=True).data)
+
+    def bulk_destroy(self, items):
+        model = self.get_queryset().model
+        ids, errors = self.validate_ids(items)
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            existing = set(model.objects.filter(pk__in=ids).select_for_update().values_list('pk', flat=True))
+            errors = [{} if pk in existing else {'id': ['Object with this id does not exist.']} for pk in ids]
+            if any(errors):
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+            model.objects.filter(pk__in=existing).delete()
+            self.bulk_invalidate()
+        return Response({'deleted': len(existing)})
+
+
+class ValuesListMixin:
+    # Lists through values() rows instead of model instances and per-field
+    # serializer calls; the response data is identical to the regular list().
+    # Serializers with fields it cannot build (e.g. ?expand=) use the regular path.
+
+    def list(self, request, *args, **kwargs):
+        representation = ValuesRepresentation.for_serializer(self.get_serializer())
+        if representation is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        columns = representation.values
+        if hasattr(self.paginator, 'get_ordering'):
+            # The cursor of the next page is read from the row's ordering columns.
+            columns += [order.lstrip('-') for order in self.paginator.get_ordering(request, queryset, self)]
+        rows = queryset.values(*dict.fromkeys(columns))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(representation.represent(page))
+        return Response(representation.represent(list(rows)))
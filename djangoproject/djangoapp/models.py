@@ -1,5 +1,9 @@
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+from decimal import Decimal
 
 
 def validate_price_positive(value):
@@ -11,6 +15,23 @@ class Product(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[validate_price_positive])
     available = models.BooleanField()
+    # Units on hand, reserved by orders as they are placed (see stock.py); None means
+    # the stock is not tracked. For tracked products `available` follows the stock.
+    stock = models.PositiveIntegerField(null=True, blank=True)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the loaded price so a save can tell whether order totals changed.
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_price = instance.__dict__.get('price')
+        return instance
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if self.stock is not None:
+            self.available = self.stock > 0
+            if update_fields is not None and 'stock' in update_fields:
+                update_fields = {*update_fields, 'available'}
+        super().save(*args, update_fields=update_fields, **kwargs)
 
 
 class Customer(models.Model):
@@ -19,6 +40,63 @@ class Customer(models.Model):
     address = models.CharField()
 
 
+def products_total():
+    # Correlated SUM of the order's product prices over the order_products join table.
+    totals = (
+        Order.products.through.objects
+        .filter(order_id=OuterRef('pk'))
+        .values('order_id')
+        .annotate(total=Sum('product__price'))
+        .values('total')
+    )
+    return Coalesce(
+        Subquery(totals, output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+        Value(Decimal('0.00')),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def products_count():
+    counts = (
+        Order.products.through.objects
+        .filter(order_id=OuterRef('pk'))
+        .values('order_id')
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=models.IntegerField()), Value(0))
+
+
+def unavailable_lines():
+    # Tracked products had their units reserved when the order was placed, so only
+    # untracked ones that are unavailable hold an order up.
+    return Order.products.through.objects.filter(
+        order_id=OuterRef('pk'), product__available=False, product__stock__isnull=True,
+    )
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        # Computes the total in the same query that fetches the page; the persisted
+        # Order.total_price should always equal it.
+        return self.annotate(computed_total_price=products_total())
+
+    def recompute_totals(self):
+        # One UPDATE for the whole queryset, whatever its size. Bumps updated_at, as
+        # update() skips auto_now, so the sales rollups pick up the new totals.
+        return self.update(total_price=products_total(), item_count=products_count(), updated_at=Now())
+
+    def with_fulfillable(self):
+        return self.annotate(fulfillable=~Exists(unavailable_lines()))
+
+    def fulfillable(self):
+        return self.filter(~Exists(unavailable_lines()))
+
+    def open(self):
+        return self.filter(status__in=Order.OPEN_STATUSES)
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('NEW', 'New'),
@@ -26,15 +104,133 @@ class Order(models.Model):
         ('SENT', 'Sent'),
         ('COMPLETED', 'Completed'),
     ]
+    OPEN_STATUSES = ['NEW', 'IN_PROCESS']
 
     id = models.AutoField(primary_key=True)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
+    # No index of its own: order_customer_history_idx starts with the customer.
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, db_index=False)
     products = models.ManyToManyField(Product)
     date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(choices=STATUS_CHOICES)
+    # Denormalized from the products; kept current by the signals in signals.py, by
+    # the orders.recompute_totals job after price changes, and rebuilt by manage.py
+    # recompute_order_totals. The database defaults cover COPY loads, which leave
+    # both columns out.
+    total_price = models.DecimalField(
+        max_digits=12, decimal_places=2, default=Decimal('0.00'), db_default=Decimal('0.00'), editable=False,
+    )
+    item_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    # Watermark column for refresh_rollups; the database default covers COPY loads.
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now())
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='order_date_id_idx'),
+            models.Index(fields=['status', 'date', 'id'], name='order_status_date_idx'),
+            # Covers the customer history page and stats (status and total included).
+            models.Index(
+                fields=['customer', 'date', 'id'], include=['status', 'total_price'], name='order_customer_history_idx',
+            ),
+            models.Index(fields=['total_price', 'id'], name='order_total_price_idx'),
+            models.Index(fields=['updated_at'], name='order_updated_at_idx'),
+        ]
 
     def calculate_total_price(self):
-        return sum(product.price for product in self.products.all())
+        # Prefer the value annotated by OrderQuerySet.with_totals() when present.
+        if 'computed_total_price' in self.__dict__:
+            return self.computed_total_price
+        return self.products.aggregate(total=Sum('price'))['total'] or Decimal('0.00')
 
     def can_be_fulfilled(self):
-        return all(product.available for product in self.products.all())
\ No newline at end of file
+        if 'fulfillable' in self.__dict__:
+            return self.fulfillable
+        return not self.products.filter(available=False, stock__isnull=True).exists()
+
+
+class ArchivedOrder(models.Model):
+    # Orders moved out of the live table by manage.py manage_partitions; see
+    # partitions.py. Keep the columns the same as Order's: on PostgreSQL whole
+    # monthly partitions of the order table are attached here as they are.
+    id = models.IntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_orders')
+    products = models.ManyToManyField(Product, through='ArchivedOrderProduct', related_name='archived_orders')
+    date = models.DateTimeField()
+    status = models.CharField(choices=Order.STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    item_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(db_default=Now())
+
+
+class ArchivedOrderProduct(models.Model):
+    # Product links of archived orders. No database constraint on the order: a
+    # partitioned table can only be referenced by its whole key (id, date).
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, db_constraint=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['order', 'product'], name='archived_order_product_uniq')]
+
+
+# Sales rollups, rebuilt per day by reports.refresh_rollups() from the orders
+# changed since the last refresh. Reports read these instead of the orders.
+class DailyStatusRollup(models.Model):
+    day = models.DateField()
+    status = models.CharField(choices=Order.STATUS_CHOICES)
+    order_count = models.PositiveIntegerField()
+    item_count = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'status'], name='daily_status_rollup_uniq')]
+
+
+class DailyProductRollup(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    order_count = models.PositiveIntegerField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'product'], name='daily_product_rollup_uniq')]
+        indexes = [models.Index(fields=['product', 'day'], name='daily_product_rollup_idx')]
+
+
+class RollupState(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    watermark = models.DateTimeField(null=True)
+
+
+class StaleRollupDay(models.Model):
+    # Days that lost an order; deleted orders leave no updated_at to find them by.
+    day = models.DateField()
+
+
+class Job(models.Model):
+    # Background work claimed by manage.py run_worker; see jobs.py.
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+    PENDING_STATUSES = [QUEUED, RUNNING]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # When the job may be claimed next: its due time while queued and the end of
+    # the visibility timeout while running, after which a crashed worker's job is
+    # picked up again.
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], condition=Q(status__in=['QUEUED', 'RUNNING']), name='job_claim_idx'),
+        ]
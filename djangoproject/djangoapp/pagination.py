@@ -0,0 +1,201 @@
+import json
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+from rest_framework.utils.urls import remove_query_param
+
+
+def estimated_count(queryset, threshold=None):
+    # COUNT(*) reads every matching row. On PostgreSQL the planner's estimate is
+    # used instead once it reaches the threshold (ESTIMATED_COUNT_THRESHOLD):
+    # reltuples for a whole table, the EXPLAIN row estimate for a filtered queryset.
+    # Smaller counts, and counts on other databases, stay exact.
+    if threshold is None:
+        threshold = settings.ESTIMATED_COUNT_THRESHOLD
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    if queryset.query.where or queryset.query.distinct or queryset.query.is_sliced:
+        plan = json.loads(queryset.order_by().explain(format='json'))
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+    else:
+        estimate = table_estimate(queryset.model, queryset.db)
+    return estimate if estimate >= threshold else queryset.count()
+
+
+def table_estimate(model, using):
+    # Rows of the table as of its last ANALYZE; a partitioned table (the orders)
+    # keeps no figure of its own, so its partitions' are summed. -1 means never analyzed.
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0) FROM pg_class c '
+            'WHERE c.oid = to_regclass(%s) '
+            'OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))',
+            [model._meta.db_table] * 2,
+        )
+        return int(cursor.fetchone()[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    # Page-number paginator for the admin changelists. With an estimated count the
+    # last page may come out empty or a few rows short of the end.
+
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class KeysetPagination(CursorPagination):
+    # Cursor pagination keyed on the whole ordering tuple (always ending in the pk),
+    # so every page is an index range scan: deep pages cost the same as the first.
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'MAX_PAGE_SIZE', 1000)
+    # ?count=true adds the (estimated) number of matching rows to the response.
+    count_query_param = 'count'
+    count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        if self.count_requested(request):
+            self.count = estimated_count(queryset)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        if self.count_requested(request):
+            self.count = await sync_to_async(estimated_count)(queryset)
+        return self.set_page([obj async for obj in page_queryset])
+
+    def count_requested(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = {'count': self.count, **response.data}
+        return response
+
+    def page_queryset(self, queryset, request, view=None):
+        # The unevaluated slice holding the requested page plus one look-ahead row.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        ordering = _reverse_ordering(self.ordering) if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+
+        if self.cursor is not None and self.cursor.position is not None:
+            position = self._parse_position(queryset, ordering, self.cursor.position)
+            queryset = queryset.filter(self._after(ordering, position))
+
+        return queryset[:self.page_size + 1]
+
+    @property
+    def reverse(self):
+        return self.cursor is not None and self.cursor.reverse
+
+    def set_page(self, results):
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[-1].startswith('-') else 'id',)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(self.page[-1], self.ordering)
+        return self.encode_cursor(self._cursor(reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        position = self._get_position_from_instance(self.page[0], self.ordering)
+        return self.encode_cursor(self._cursor(reverse=True, position=position))
+
+    def _cursor(self, reverse, position):
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            value = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            values.append(value.isoformat() if isinstance(value, (date, datetime)) else str(value))
+        return json.dumps(values)
+
+    def _parse_position(self, queryset, ordering, position):
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise ValueError
+            return [
+                self._ordering_field(queryset, order.lstrip('-')).to_python(value)
+                for order, value in zip(ordering, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _ordering_field(self, queryset, name):
+        # Orderings may also use annotations, e.g. the search rank.
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def _after(self, ordering, position):
+        # (a, b) > (x, y)  ==  a >= x AND (a > x OR (a = x AND b > y))
+        # The leading range predicate lets the planner use an index range scan.
+        condition = Q()
+        equal = Q()
+        for order, value in zip(ordering, position):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field_name}__{lookup}': value})
+            equal &= Q(**{field_name: value})
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
+
+
+class IdCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class OrderCursorPagination(KeysetPagination):
+    ordering = ('-date', '-id')
@@ -0,0 +1,164 @@
+import re
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import invalidate_now_and_on_commit
+from .models import ArchivedOrder, ArchivedOrderProduct, Order
+
+# On PostgreSQL the order table is range partitioned by month of `date`
+# (migration 0013): <table>_YYYY_MM per month, plus <table>_default for orders
+# outside them. Date filters on the order list prune the scan to the months they
+# cover. Old months move to the archive table as a whole; elsewhere their rows are
+# copied there, so the archive behaves the same on every database. The primary
+# key is (id, date); djangoapp_order_ids (migration 0016) keeps ids unique across
+# months, archived ones included.
+ARCHIVED_STATUSES = ['COMPLETED']
+PARTITION_NAME = re.compile(r'_(\d{4})_(\d{2})$')
+
+
+def month_start(value):
+    if isinstance(value, datetime):
+        value = timezone.localtime(value)
+    return timezone.make_aware(datetime(value.year, value.month, 1))
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return timezone.make_aware(datetime(index // 12, index % 12 + 1, 1))
+
+
+def partition_name(model, month):
+    return f'{model._meta.db_table}_{month:%Y_%m}'
+
+
+def default_partition():
+    return f'{Order._meta.db_table}_default'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [Order._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def partition_months(model=Order):
+    # Months of the monthly partitions attached to the model's table.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s)',
+            [model._meta.db_table],
+        )
+        names = [PARTITION_NAME.search(name) for name, in cursor.fetchall()]
+    return sorted(timezone.make_aware(datetime(int(m[1]), int(m[2]), 1)) for m in names if m)
+
+
+def create_partitions(first, last):
+    # Adds the missing monthly partitions from first's month to last's and returns
+    # their names. Orders already in the default partition for one of those months
+    # are moved into it, as the new partition could not be attached otherwise.
+    if not is_partitioned():
+        return []
+    existing = set(partition_months())
+    month, last, created = month_start(first), month_start(last), []
+    while month <= last:
+        if month not in existing:
+            create_partition(month)
+            created.append(partition_name(Order, month))
+        month = add_months(month, 1)
+    return created
+
+
+def create_partition(month):
+    quote = connection.ops.quote_name
+    table = quote(Order._meta.db_table)
+    default = quote(default_partition())
+    name = quote(partition_name(Order, month))
+    bounds = [month, add_months(month, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} WHERE date >= %s AND date < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            bounds,
+        )
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', bounds)
+
+
+def archivable_months(before):
+    # Months that end on or before `before`.
+    if is_partitioned():
+        # The monthly partitions, and the months of orders left in the default one.
+        months = set(partition_months())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', date AT TIME ZONE %s) "
+                f"FROM {connection.ops.quote_name(default_partition())} WHERE date < %s",
+                [timezone.get_current_timezone_name(), before],
+            )
+            months.update(timezone.make_aware(month) for month, in cursor.fetchall())
+    else:
+        months = {month_start(day) for day in Order.objects.filter(date__lt=before).dates('date', 'month')}
+    return sorted(month for month in months if add_months(month, 1) <= before)
+
+
+def archive_month(month, include_open=False):
+    # Moves one month of orders and their product links to the archive and returns
+    # the number of orders moved, or None when the month still has orders that are
+    # not completed and include_open is not set. Archived orders are left out of
+    # the order endpoints and of rebuilt sales rollups; /api/archived-orders/ reads them.
+    bounds = [month, add_months(month, 1)]
+    orders = Order.objects.filter(date__gte=bounds[0], date__lt=bounds[1])
+    lines = Order.products.through.objects.filter(order__date__gte=bounds[0], order__date__lt=bounds[1])
+
+    with transaction.atomic():
+        if not include_open and orders.exclude(status__in=ARCHIVED_STATUSES).exists():
+            return None
+        count = orders.count()
+        insert_select(ArchivedOrderProduct, lines, ['order_id', 'product_id'])
+        lines.delete()
+        if is_partitioned():
+            if month not in partition_months():
+                create_partition(month)
+            attach_to_archive(month)
+        else:
+            columns = [field.attname for field in ArchivedOrder._meta.concrete_fields]
+            insert_select(ArchivedOrder, orders, columns)
+            ids, params = orders.values('id').query.sql_with_params()
+            with connection.cursor() as cursor:
+                # Not orders.delete(): archiving must not mark rollup days stale.
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(Order._meta.db_table)} WHERE id IN ({ids})', params)
+        invalidate_now_and_on_commit('order')
+    return count
+
+
+def insert_select(model, queryset, columns):
+    # INSERT ... SELECT: the rows are copied by the database, not through Python.
+    quote = connection.ops.quote_name
+    select, params = queryset.values(*columns).query.sql_with_params()
+    names = ', '.join(quote(model._meta.get_field(column).column) for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {quote(model._meta.db_table)} ({names}) {select}', params)
+
+
+def attach_to_archive(month):
+    # Detaching and attaching only update the catalog: no order row is copied.
+    quote = connection.ops.quote_name
+    live, archived = partition_name(Order, month), partition_name(ArchivedOrder, month)
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {quote(Order._meta.db_table)} DETACH PARTITION {quote(live)}')
+        cursor.execute(f'ALTER TABLE {quote(live)} RENAME TO {quote(archived)}')
+        cursor.execute(
+            f'ALTER TABLE {quote(ArchivedOrder._meta.db_table)} ATTACH PARTITION {quote(archived)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [month, add_months(month, 1)],
+        )
+
+
+def archived_until():
+    # Last day with archived orders; the live table holds none up to it.
+    last = ArchivedOrder.objects.order_by('-date').values_list('date', flat=True).first()
+    return timezone.localdate(last) if last else None
@@ -0,0 +1,80 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import invalidate_now_and_on_commit
+from .models import DailyProductRollup, DailyStatusRollup, Order, RollupState, StaleRollupDay
+from .partitions import archived_until
+
+ROLLUP_NAME = 'sales'
+# A change that commits after a refresh started can carry an updated_at older
+# than the watermark it sets, so every refresh looks back this much further.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+DAYS_PER_BATCH = 31
+
+
+def refresh_rollups(full=False):
+    # Rebuilds every day touched by an order changed since the last refresh (or
+    # every day, the first time or with full=True) and returns the number of days.
+    with transaction.atomic():
+        state, _ = RollupState.objects.select_for_update().get_or_create(name=ROLLUP_NAME)
+        started = timezone.now()
+        full = full or state.watermark is None
+        stale = list(StaleRollupDay.objects.values_list('id', 'day'))
+
+        if full:
+            # Archived orders are gone from the order table; their days keep their rollups.
+            archived = archived_until()
+            kept = {'day__lte': archived} if archived else {}
+            DailyStatusRollup.objects.exclude(**kept).delete()
+            DailyProductRollup.objects.exclude(**kept).delete()
+            days = set(Order.objects.dates('date', 'day'))
+        else:
+            changed = Order.objects.filter(updated_at__gte=state.watermark - WATERMARK_OVERLAP)
+            days = set(changed.dates('date', 'day')) | {day for _, day in stale}
+
+        days = sorted(days)
+        for start in range(0, len(days), DAYS_PER_BATCH):
+            rebuild_days(days[start:start + DAYS_PER_BATCH])
+
+        # By id: a day marked stale while this ran is rebuilt by the next refresh.
+        StaleRollupDay.objects.filter(pk__in=[pk for pk, _ in stale]).delete()
+        state.watermark = started
+        state.save(update_fields=['watermark'])
+        invalidate_now_and_on_commit('report')
+    return len(days)
+
+
+def rebuild_days(days):
+    # The date range lets order_date_id_idx narrow the scan before grouping by day.
+    start = timezone.make_aware(datetime.combine(days[0], time.min))
+    end = timezone.make_aware(datetime.combine(days[-1] + timedelta(days=1), time.min))
+    orders = Order.objects.filter(date__gte=start, date__lt=end).annotate(day=TruncDate('date')).filter(day__in=days)
+    lines = (
+        Order.products.through.objects
+        .filter(order__date__gte=start, order__date__lt=end)
+        .annotate(day=TruncDate('order__date'))
+        .filter(day__in=days)
+    )
+    by_status = orders.values('day', 'status').annotate(
+        order_count=Count('id'), item_count=Sum('item_count'), revenue=Sum('total_price'),
+    ).order_by()
+    by_product = lines.values('day', 'product_id').annotate(
+        order_count=Count('order_id'), revenue=Sum('product__price'),
+    ).order_by()
+
+    DailyStatusRollup.objects.filter(day__in=days).delete()
+    DailyProductRollup.objects.filter(day__in=days).delete()
+    DailyStatusRollup.objects.bulk_create([DailyStatusRollup(**row) for row in by_status])
+    DailyProductRollup.objects.bulk_create([DailyProductRollup(**row) for row in by_product])
+
+
+def mark_day_stale(order):
+    StaleRollupDay.objects.create(day=timezone.localdate(order.date))
+
+
+def last_refreshed():
+    return RollupState.objects.filter(name=ROLLUP_NAME).values_list('watermark', flat=True).first()
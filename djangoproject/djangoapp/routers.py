@@ -0,0 +1,128 @@
+import hashlib
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+# Read routing of the request being handled, set up by ReplicaRoutingMiddleware.
+current_routing = ContextVar('current_routing', default=None)
+
+# alias -> (healthy, checked at, lag in seconds); per process, like the connections
+# themselves.
+replica_health = {}
+
+READ_METHODS = ('GET', 'HEAD')
+STICKY_KEY = 'replica-sticky:{}'
+
+
+class ReplicaRouter:
+    # Reads made while a GET or HEAD request is handled go to a healthy replica
+    # (settings.REPLICA_DATABASES); all other queries, and every write, go to the
+    # primary. Commands and the job worker run outside requests and use the primary.
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        return routing.read_alias() if routing is not None else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Explicit, or Django would write objects loaded from a replica back to it.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class RequestRouting:
+    # The database is picked on the first read, so requests answered from the
+    # response cache do not touch a replica or its health check.
+
+    def __init__(self, request):
+        self.reads_from_replica = request.method in READ_METHODS
+        self.client = client_key(request)
+        self.alias = None
+        self.failed = False
+        self.pinned = None
+
+    def read_alias(self):
+        if self.alias is None:
+            self.alias = DEFAULT_DB_ALIAS
+            if self.reads_from_replica and not self.pinned_to_primary():
+                self.alias = pick_replica()
+        return self.alias
+
+    def pinned_to_primary(self):
+        # The client wrote within the last REPLICA_STICKY_SECONDS.
+        if self.pinned is None:
+            self.pinned = bool(cache.get(STICKY_KEY.format(self.client)))
+        return self.pinned
+
+    def on_replica(self):
+        return self.alias not in (None, DEFAULT_DB_ALIAS)
+
+    def current_since(self, moment):
+        # Whether the reads so far see every write committed before `moment` (a
+        # time.time() value). On a replica that takes a lag shorter than the time
+        # since; the lag counts as having grown since it was measured.
+        if not self.on_replica():
+            return True
+        healthy, checked_at, lag = replica_health.get(self.alias, (False, None, None))
+        if not healthy or lag is None:
+            return False
+        return lag + time.monotonic() - checked_at < time.time() - moment
+
+    def fail_over(self):
+        # The replica failed mid-request: it is skipped for a while and the request
+        # runs again on the primary.
+        replica_health[self.alias] = (False, time.monotonic(), None)
+        self.alias, self.failed = DEFAULT_DB_ALIAS, True
+
+    def stick_to_primary(self):
+        # Read-your-writes: the client's next reads see this write even when the
+        # replicas lag. Needs a cache shared by the processes (CACHE_LOCATION).
+        cache.set(STICKY_KEY.format(self.client), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def client_key(request):
+    # The credentials identify the client; without any, its address does.
+    identity = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return hashlib.sha256(identity.encode()).hexdigest()
+
+
+def pick_replica():
+    healthy = [alias for alias in settings.REPLICA_DATABASES if is_healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+def is_healthy(alias):
+    healthy, checked_at, lag = replica_health.get(alias, (None, None, None))
+    if checked_at is None or time.monotonic() - checked_at >= settings.REPLICA_HEALTH_INTERVAL:
+        lag = check_replica(alias)
+        healthy = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        replica_health[alias] = (healthy, time.monotonic(), lag)
+    return healthy
+
+
+def check_replica(alias):
+    # Seconds the replica is behind the primary (0 outside PostgreSQL), or None when
+    # it cannot be reached. A replica that has replayed all it received counts as
+    # current, as the replay timestamp does not advance while the primary is idle.
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        if connection.vendor != 'postgresql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+            )
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        return None
@@ -1,17 +1,175 @@
-from rest_framework import serializers
-from .models import Product, Customer, Order
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import relations, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from .models import Product, Customer, Order, ArchivedOrder
 
-class ProductSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    # ?fields=id,name returns only the listed fields on reads.
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS or not request.query_params.get('fields'):
+            return
+        names = request.query_params['fields'].split(',')
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValidationError({'fields': f"Unknown field(s) {', '.join(unknown)}; expected any of {', '.join(self.fields)}."})
+        for name in list(self.fields):
+            if name not in names:
+                self.fields.pop(name)
+
+
+class ValuesRepresentation:
+    # Produces exactly what a ModelSerializer's to_representation() would, from
+    # values() rows instead of model instances: plain columns are copied, decimals
+    # and dates go through the serializer field, many-to-many ids take one query.
+    # for_serializer() returns None when a field needs the model instance.
+    copied_fields = (serializers.IntegerField, serializers.CharField, serializers.ChoiceField, serializers.BooleanField)
+    converted_fields = (serializers.DecimalField, serializers.DateTimeField, serializers.DateField)
+
+    def __init__(self, model, columns, many_related):
+        self.model = model
+        self.columns = columns
+        self.many_related = many_related
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        model = serializer.Meta.model
+        columns, many_related = [], []
+        for name, field in serializer.fields.items():
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if isinstance(field, relations.ManyRelatedField):
+                if type(field.child_relation) is not relations.PrimaryKeyRelatedField or model_field.auto_created:
+                    return None
+                many_related.append((name, model_field))
+            elif type(field) is relations.PrimaryKeyRelatedField and field.pk_field is None:
+                columns.append((name, model_field.attname, None))
+            elif type(field) in cls.copied_fields:
+                columns.append((name, model_field.attname, None))
+            elif type(field) in cls.converted_fields:
+                columns.append((name, model_field.attname, field.to_representation))
+            else:
+                return None
+        return cls(model, columns, many_related)
+
+    @property
+    def values(self):
+        # The columns to fetch; the pk is always included for many-to-many lookups.
+        return [column for _, column, _ in self.columns] + [self.model._meta.pk.attname]
+
+    def represent(self, rows):
+        pk = self.model._meta.pk.attname
+        related = {name: self.related_ids(model_field, [row[pk] for row in rows]) for name, model_field in self.many_related}
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert in self.columns:
+                value = row[column]
+                item[name] = value if convert is None or value is None else convert(value)
+            for name, ids in related.items():
+                item[name] = ids.get(row[pk], [])
+            data.append(item)
+        return data
+
+    def related_ids(self, model_field, pks):
+        # Ordered by the related id, like the prefetches on the viewsets.
+        through = model_field.remote_field.through
+        source = through._meta.get_field(model_field.m2m_field_name()).attname
+        target = through._meta.get_field(model_field.m2m_reverse_field_name()).attname
+        ids = {}
+        rows = through.objects.filter(**{f'{source}__in': pks}).order_by(target).values_list(source, target)
+        for pk, related_pk in rows:
+            ids.setdefault(pk, []).append(related_pk)
+        return ids
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        extra_kwargs = {'available': {'required': False}}
+
+    def validate(self, attrs):
+        # `available` is set from the stock when it is tracked and required otherwise.
+        stock = attrs['stock'] if 'stock' in attrs else getattr(self.instance, 'stock', None)
+        if stock is not None:
+            attrs['available'] = stock > 0
+        elif self.instance is None and 'available' not in attrs:
+            raise ValidationError({'available': ['This field is required unless stock is given.']})
+        return attrs
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = '__all__'
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # ?expand=customer,products embeds the related objects instead of their ids on reads.
+    expandable_fields = {
+        'customer': lambda: CustomerSerializer(read_only=True),
+        'products': lambda: ProductSerializer(many=True, read_only=True),
+    }
+
     class Meta:
         model = Order
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+        expand = request.query_params.get('expand', '').split(',')
+        for name in expand:
+            if name in self.expandable_fields and name in self.fields:
+                self.fields[name] = self.expandable_fields[name]()
+
+    def validate_products(self, value):
+        # An order holds a product once; a repeated id would reserve a second unit
+        # that the single link never gives back.
+        return list(dict.fromkeys(value))
+
+class ArchivedOrderSerializer(OrderSerializer):
+
+    class Meta:
+        model = ArchivedOrder
+        fields = '__all__'
+
+class BulkOrderSerializer(serializers.Serializer):
+    # Checks the shape of a bulk order item; the view looks up all the ids at once.
+    customer = serializers.IntegerField()
+    products = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+    def validate_products(self, value):
+        return list(dict.fromkeys(value))
+
+class CustomerStatsSerializer(serializers.Serializer):
+    customer = serializers.IntegerField(source='id')
+    order_count = serializers.IntegerField()
+    lifetime_spend = serializers.DecimalField(max_digits=14, decimal_places=2)
+    last_order_date = serializers.DateTimeField(allow_null=True)
+    orders_by_status = serializers.DictField(child=serializers.IntegerField())
+
+class RevenuePerDaySerializer(serializers.Serializer):
+    day = serializers.DateField()
+    order_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+class RevenuePerProductSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
+
+class OrdersPerStatusSerializer(serializers.Serializer):
+    status = serializers.CharField()
+    order_count = serializers.IntegerField()
+    item_count = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=16, decimal_places=2)
@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .cache import invalidate_now_and_on_commit
+from .jobs import enqueue
+from .middleware import count_queries
+from .models import Product, Customer, Order
+from .reports import mark_day_stale
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_now_and_on_commit(sender._meta.model_name)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_cached_orders(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_now_and_on_commit('order')
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def update_order_totals(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == 'pre_clear':
+        # product.order_set.clear(): the affected orders are unknown afterwards.
+        instance._cleared_order_ids = list(instance.order_set.values_list('id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        Order.objects.filter(pk=instance.pk).recompute_totals()
+        instance.refresh_from_db(fields=['total_price', 'item_count'])
+    elif action == 'post_clear':
+        Order.objects.filter(pk__in=instance.__dict__.pop('_cleared_order_ids', [])).recompute_totals()
+    else:
+        Order.objects.filter(pk__in=pk_set).recompute_totals()
+
+
+@receiver(post_save, sender=Product)
+def update_totals_on_price_change(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    if instance.price != getattr(instance, '_loaded_price', None):
+        # A popular product is on millions of orders: a worker updates them in
+        # batches rather than this request in one UPDATE (tasks.py).
+        enqueue('orders.recompute_totals', product_ids=[instance.pk])
+        instance._loaded_price = instance.price
+
+
+@receiver(pre_delete, sender=Product)
+def remember_orders_of_deleted_product(sender, instance, **kwargs):
+    # The join rows are gone by post_delete and their cascade sends no m2m_changed.
+    instance._order_ids = list(instance.order_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def update_totals_on_product_delete(sender, instance, **kwargs):
+    Order.objects.filter(pk__in=instance.__dict__.pop('_order_ids', [])).recompute_totals()
+
+
+@receiver(post_delete, sender=Order)
+def mark_rollup_day_stale(sender, instance, **kwargs):
+    mark_day_stale(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def discard_cached_user(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    # First in the list, so execute_wrapper() blocks entered before the connection
+    # was opened still pop their own wrapper.
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
@@ -0,0 +1,74 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import invalidate_now_and_on_commit
+from .models import Product
+
+
+class OutOfStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Not enough stock.'
+    default_code = 'out_of_stock'
+
+
+class StockBusy(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Another order is reserving the same products; try again.'
+    default_code = 'stock_busy'
+
+
+def reserve_stock(product_ids, nowait=None):
+    # Takes one unit per id from the tracked products; call it inside the
+    # transaction that creates the order so both commit or roll back together.
+    # Only the rows of these products are locked, in pk order so that two orders
+    # cannot deadlock. With nowait (STOCK_RESERVATION_NOWAIT) the rows are read
+    # with SKIP LOCKED and a product held by another order fails the reservation
+    # at once instead of queueing behind it; unlike NOWAIT this raises no database
+    # error, so the transaction stays usable.
+    quantities = Counter(product_ids)
+    tracked = Product.objects.filter(pk__in=quantities, stock__isnull=False).order_by('pk')
+    if nowait is None:
+        nowait = getattr(settings, 'STOCK_RESERVATION_NOWAIT', False)
+
+    if nowait:
+        expected = list(tracked.values_list('pk', flat=True))
+        stock = dict(tracked.select_for_update(skip_locked=True).values_list('pk', 'stock'))
+        if len(stock) < len(expected):
+            raise StockBusy()
+    else:
+        stock = dict(tracked.select_for_update().values_list('pk', 'stock'))
+    if not stock:
+        return
+
+    short = sorted(pk for pk, units in stock.items() if units < quantities[pk])
+    if short:
+        raise out_of_stock(short)
+    for pk in stock:
+        # The stock__gte guard keeps the decrement safe where rows cannot be locked.
+        if not change_stock(Product.objects.filter(pk=pk, stock__gte=quantities[pk]), -quantities[pk]):
+            raise out_of_stock([pk])
+    invalidate_now_and_on_commit('product')
+
+
+def out_of_stock(product_ids):
+    return OutOfStock(f"Not enough stock for product(s) {', '.join(map(str, product_ids))}.")
+
+
+def release_stock(product_ids):
+    # Puts units back, e.g. for products removed from an order.
+    tracked = Product.objects.filter(stock__isnull=False)
+    released = sum(change_stock(tracked.filter(pk=pk), units) for pk, units in Counter(product_ids).items())
+    if released:
+        invalidate_now_and_on_commit('product')
+
+
+def change_stock(queryset, units):
+    # `available` is computed from the stock before the change.
+    return queryset.update(
+        stock=F('stock') + units,
+        available=Case(When(stock__gt=-units, then=Value(True)), default=Value(False)),
+    )
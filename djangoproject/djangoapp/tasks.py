@@ -0,0 +1,49 @@
+import logging
+
+from django.db.models import Max, Min
+
+from .cache import invalidate_now_and_on_commit
+from .jobs import enqueue, task
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+# Order ids covered by one orders.recompute_totals job, and so the most order
+# rows one of its transactions locks.
+TOTALS_BATCH_SIZE = 10000
+
+
+@task('orders.process')
+def process_order(order_id):
+    # Moves a new order on to IN_PROCESS once all of its products can be supplied.
+    order = Order.objects.with_fulfillable().filter(pk=order_id, status='NEW').first()
+    if order is None or not order.fulfillable:
+        return
+    order.status = 'IN_PROCESS'
+    order.save(update_fields=['status', 'updated_at'])
+    enqueue('orders.notify_status', order_id=order.pk, status=order.status)
+
+
+@task('orders.recompute_totals')
+def recompute_totals(product_ids, after=None, last=None):
+    # Brings the totals of the orders holding the products up to date after a price
+    # change, one id range per job; the rest of the range is queued as the next job.
+    # The first job finds the range from the products' order links.
+    if after is None:
+        bounds = Order.products.through.objects.filter(product_id__in=product_ids).aggregate(
+            first=Min('order_id'), last=Max('order_id'),
+        )
+        if bounds['first'] is None:
+            return
+        after, last = bounds['first'] - 1, bounds['last']
+    end = min(after + TOTALS_BATCH_SIZE, last)
+    Order.objects.filter(id__gt=after, id__lte=end, products__in=product_ids).recompute_totals()
+    invalidate_now_and_on_commit('order')
+    if end < last:
+        enqueue('orders.recompute_totals', product_ids=product_ids, after=end, last=last)
+
+
+@task('orders.notify_status')
+def notify_status(order_id, status):
+    # Hook for customer notifications; there is no mail or push channel yet.
+    logger.info('Order %s is now %s.', order_id, status)
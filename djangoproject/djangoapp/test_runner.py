@@ -0,0 +1,16 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class PrimaryOnlyTestRunner(DiscoverRunner):
+    # Every replica alias gets a test database of its own that nothing replicates
+    # into, and most test cases may only query 'default'. So tests read from the
+    # primary; the routing tests turn replicas on with override_settings.
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.primary_only = override_settings(REPLICA_DATABASES=[])
+        self.primary_only.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.primary_only.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,427 @@
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from djangoapp.benchmarks import percentile
+from djangoapp.jobs import claim, enqueue_many, run
+from djangoapp.management.commands.bench_api import Command as BenchApiCommand
+from djangoapp.models import (
+    ArchivedOrder, ArchivedOrderProduct, Customer, DailyProductRollup, DailyStatusRollup, Job, Order, Product,
+    StaleRollupDay,
+)
+from djangoapp.partitions import add_months, create_partitions, is_partitioned, month_start, partition_months
+from djangoapp.reports import refresh_rollups
+
+
+class ImportDataCommandTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = Path(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = self.path / name
+        path.write_text(content)
+        return str(path)
+
+    def test_import_csv_and_ndjson_files(self):
+        products = self.write('products.csv', 'id,name,price,available\n1,Product 1,9.99,true\n2,Product 2,1.50,false\n')
+        customers = self.write('customers.ndjson', json.dumps({'id': 7, 'name': 'Customer', 'address': 'Xxx 123'}) + '\n')
+        orders = self.write('orders.csv', 'id,customer_id,status,date,product_ids\n'
+                                          '3,7,NEW,2024-01-02T10:00:00+00:00,1;2\n')
+
+        out = StringIO()
+        call_command('import_data', products=products, customers=customers, orders=orders, stdout=out)
+
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(Product.objects.get(id=2).price, Decimal('1.50'))
+        self.assertFalse(Product.objects.get(id=2).available)
+        order = Order.objects.get(id=3)
+        self.assertEqual(order.customer.name, 'Customer')
+        self.assertEqual(order.date.isoformat(), '2024-01-02T10:00:00+00:00')
+        self.assertEqual(order.calculate_total_price(), Decimal('11.49'))
+        self.assertEqual((order.total_price, order.item_count), (Decimal('11.49'), 2))
+
+        # Sequences continue after the imported ids.
+        self.assertGreater(Product.objects.create(name='New', price=1, available=True).id, 2)
+
+    def test_import_aborts_on_invalid_rows(self):
+        products = self.write('products.csv', 'id,name,price,available\n1,Product 1,9.99,true\n2,,-1,maybe\n')
+
+        with self.assertRaisesMessage(CommandError, 'row 2: invalid name, price, available'):
+            call_command('import_data', products=products, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 0)
+
+    def test_import_skips_invalid_rows_and_unknown_references(self):
+        customers = self.write('customers.csv', 'id,name,address\n1,Customer,Xxx 123\n')
+        orders = self.write('orders.ndjson', '\n'.join([
+            json.dumps({'id': 1, 'customer': {'id': 1}, 'status': 'NEW', 'products': []}),
+            json.dumps({'id': 2, 'customer': {'id': 99}, 'status': 'NEW', 'products': []}),
+            json.dumps({'id': 3, 'customer': {'id': 1}, 'status': 'LOST', 'products': []}),
+        ]))
+
+        call_command('import_data', customers=customers, orders=orders, skip_invalid=True, stdout=StringIO())
+        self.assertEqual(list(Order.objects.values_list('id', flat=True)), [1])
+
+    def test_import_rejects_existing_and_repeated_ids(self):
+        Product.objects.create(id=1, name='Existing', price=1, available=True)
+        products = self.write('products.csv', 'id,name,price,available\n1,Product 1,9.99,true\n2,Product 2,1.50,true\n'
+                                              '2,Product 2 again,1.50,true\n')
+
+        with self.assertRaisesMessage(CommandError, 'row 1: invalid id (duplicate); row 3: invalid id (duplicate)'):
+            call_command('import_data', products=products, stdout=StringIO())
+        call_command('import_data', products=products, skip_invalid=True, stdout=StringIO())
+        self.assertEqual(list(Product.objects.order_by('id').values_list('name', flat=True)), ['Existing', 'Product 2'])
+
+    def test_import_rejects_order_ids_taken_on_another_date(self):
+        customer = Customer.objects.create(id=1, name='Customer', address='Xxx 123')
+        product = Product.objects.create(id=1, name='Product', price=1, available=True)
+        order = Order.objects.create(id=1, customer=customer, status='NEW')
+        order.products.add(product)
+        orders = self.write('orders.ndjson', '\n'.join([
+            json.dumps({'id': 1, 'customer': 1, 'status': 'NEW', 'date': '2020-01-02T10:00:00+00:00', 'products': [1]}),
+            json.dumps({'id': 2, 'customer': 1, 'status': 'NEW', 'products': [1]}),
+            json.dumps({'id': 2, 'customer': 1, 'status': 'SENT', 'date': '2020-01-02T10:00:00+00:00', 'products': []}),
+        ]))
+
+        with self.assertRaisesMessage(CommandError, 'row 1: invalid id (duplicate); row 3: invalid id (duplicate)'):
+            call_command('import_data', orders=orders, stdout=StringIO())
+        # Batches of one: the repeated id is found in the database, not the batch.
+        call_command('import_data', orders=orders, skip_invalid=True, batch_size=1, stdout=StringIO())
+        self.assertEqual(list(Order.objects.order_by('id').values_list('id', 'status')), [(1, 'NEW'), (2, 'NEW')])
+        self.assertEqual(order.products.count(), 1)
+
+
+class GenerateDataCommandTest(TestCase):
+
+    def generate(self, **kwargs):
+        options = {'products': 20, 'customers': 10, 'orders': 200, 'products_per_order': '2-3',
+                   'end_date': '2024-06-30', 'seed': 1, 'batch_size': 64, 'stdout': StringIO()}
+        options.update(kwargs)
+        call_command('generate_data', **options)
+        return list(Order.objects.order_by('id').values_list('id', 'customer_id', 'status', 'date'))
+
+    def test_generates_requested_sizes(self):
+        self.generate()
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Customer.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 200)
+        for order in Order.objects.with_totals().prefetch_related('products'):
+            self.assertTrue(2 <= len(order.products.all()) <= 3)
+            self.assertEqual((order.total_price, order.item_count), (order.computed_total_price, len(order.products.all())))
+
+    def test_same_seed_generates_same_data(self):
+        first = self.generate()
+        self.assertEqual(self.generate(), first)
+        self.assertNotEqual(self.generate(seed=2), first)
+
+    def test_replaces_existing_data(self):
+        call_command('populate_sample_data', stdout=StringIO())
+        self.generate(orders=5)
+        self.assertEqual(Order.objects.count(), 5)
+        self.assertFalse(Product.objects.filter(name='Test product 1').exists())
+
+    def test_invalid_range(self):
+        with self.assertRaises(CommandError):
+            self.generate(products_per_order='5-1')
+
+
+class RecomputeOrderTotalsCommandTest(TestCase):
+
+    def test_rebuilds_stale_totals_in_batches(self):
+        call_command('generate_data', products=10, customers=5, orders=50, stdout=StringIO())
+        expected = dict(Order.objects.values_list('id', 'total_price'))
+        self.assertGreater(sum(expected.values()), 0)
+        Order.objects.filter(id__lte=20).update(total_price=0, item_count=0)
+
+        out = StringIO()
+        call_command('recompute_order_totals', batch_size=7, stdout=out)
+        self.assertIn('50 orders checked, 20 updated', out.getvalue())
+        self.assertEqual(dict(Order.objects.values_list('id', 'total_price')), expected)
+        for order in Order.objects.with_totals():
+            self.assertEqual(order.total_price, order.computed_total_price)
+            self.assertEqual(order.item_count, order.products.count())
+
+
+class RefreshRollupsCommandTest(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=Decimal('1.00'), available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=Decimal('4.99'), available=True)
+        self.today = timezone.localdate()
+        self.orders = []
+        for days_ago, status_name, products in ((2, 'NEW', [self.product1]), (2, 'SENT', [self.product1, self.product2]),
+                                                (1, 'NEW', [self.product2]), (0, 'COMPLETED', [self.product1])):
+            order = Order.objects.create(customer=customer, status=status_name)
+            order.products.add(*products)
+            Order.objects.filter(pk=order.pk).update(date=timezone.now() - timedelta(days=days_ago))
+            self.orders.append(order)
+        # Older than the overlap a refresh re-reads before its watermark.
+        Order.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        for order in self.orders:
+            order.refresh_from_db()
+
+    def refresh(self, **kwargs):
+        out = StringIO()
+        call_command('refresh_rollups', stdout=out, **kwargs)
+        self.assertIn('Rollups refreshed successfully.', out.getvalue())
+        return out.getvalue()
+
+    def status_rollups(self):
+        return {(row.day, row.status): (row.order_count, row.item_count, row.revenue)
+                for row in DailyStatusRollup.objects.all()}
+
+    def product_rollups(self):
+        return {(row.day, row.product_id): (row.order_count, row.revenue) for row in DailyProductRollup.objects.all()}
+
+    def test_first_refresh_builds_every_day(self):
+        self.assertIn('3 days rebuilt', self.refresh())
+        day = self.today - timedelta(days=2)
+        self.assertEqual(self.status_rollups(), {
+            (day, 'NEW'): (1, 1, Decimal('1.00')),
+            (day, 'SENT'): (1, 2, Decimal('5.99')),
+            (self.today - timedelta(days=1), 'NEW'): (1, 1, Decimal('4.99')),
+            (self.today, 'COMPLETED'): (1, 1, Decimal('1.00')),
+        })
+        self.assertEqual(self.product_rollups(), {
+            (day, self.product1.id): (2, Decimal('2.00')),
+            (day, self.product2.id): (1, Decimal('4.99')),
+            (self.today - timedelta(days=1), self.product2.id): (1, Decimal('4.99')),
+            (self.today, self.product1.id): (1, Decimal('1.00')),
+        })
+
+    def test_refresh_rebuilds_only_changed_days(self):
+        self.refresh()
+        self.assertIn('0 days rebuilt', self.refresh())
+
+        self.orders[2].status = 'SENT'
+        self.orders[2].save()
+        self.assertIn('1 days rebuilt', self.refresh())
+        day = self.today - timedelta(days=1)
+        self.assertEqual(self.status_rollups()[(day, 'SENT')], (1, 1, Decimal('4.99')))
+        self.assertNotIn((day, 'NEW'), self.status_rollups())
+
+    def test_refresh_picks_up_price_changes_and_deleted_orders(self):
+        self.refresh()
+        self.product2.price = Decimal('10.00')
+        self.product2.save()
+        # The worker's update of the order totals is what the refresh picks up.
+        while jobs := claim('worker-1'):
+            run(jobs[0])
+        self.orders[0].delete()
+
+        self.assertIn('2 days rebuilt', self.refresh())
+        day = self.today - timedelta(days=2)
+        self.assertEqual(self.status_rollups()[(day, 'SENT')], (1, 2, Decimal('11.00')))
+        self.assertNotIn((day, 'NEW'), self.status_rollups())
+        self.assertEqual(self.product_rollups()[(day, self.product1.id)], (1, Decimal('1.00')))
+        self.assertFalse(StaleRollupDay.objects.exists())
+
+
+class GenerateDataRollupsCommandTest(TransactionTestCase):
+    # generate_data runs in a transaction of its own here, as it does when run from
+    # the command line, not inside one that already holds writes.
+
+    def test_generate_data_builds_rollups(self):
+        call_command('generate_data', products=10, customers=5, orders=50, days=10, stdout=StringIO())
+        totals = Order.objects.aggregate(orders=Count('id'), revenue=Sum('total_price'))
+        self.assertEqual(DailyStatusRollup.objects.aggregate(orders=Sum('order_count'), revenue=Sum('revenue')), totals)
+        self.assertEqual(DailyProductRollup.objects.aggregate(revenue=Sum('revenue'))['revenue'], totals['revenue'])
+
+
+class BenchApiCommandTest(TransactionTestCase):
+
+    def test_reports_every_endpoint(self):
+        call_command('generate_data', products=5, customers=5, orders=20, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_api', workers=2, requests=4, host='testserver', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['endpoints']), set(BenchApiCommand().scenarios()))
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 4, name)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertIsNotNone(result['queries_max'], name)
+        self.assertEqual(Product.objects.count(), 5)
+
+    def test_asgi_mode_runs_clients_on_one_event_loop(self):
+        call_command('generate_data', products=5, customers=5, orders=20, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_api', workers=3, requests=6, host='testserver', asgi=True,
+                     endpoints='product-list,async-product-list,async-order-detail', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['interface'], 'asgi')
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 6, name)
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreater(result['queries_max'], 0, name)
+
+    def test_requires_seeded_database(self):
+        with self.assertRaises(CommandError):
+            call_command('bench_api', stdout=StringIO())
+
+    def test_compare_flags_regressions(self):
+        before = {'endpoints': {'order-list': {'p95_ms': 10, 'throughput': 100, 'queries_max': 3}}}
+        after = {'endpoints': {'order-list': {'p95_ms': 20, 'throughput': 50, 'queries_max': 4}}}
+        self.assertEqual(len(BenchApiCommand().compare(before, after, 0.2)), 3)
+        self.assertEqual(BenchApiCommand().compare(before, before, 0.2), [])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+
+class StressStockCommandTest(TransactionTestCase):
+
+    def stress(self, **kwargs):
+        out = StringIO()
+        call_command('stress_stock', host='testserver', stdout=out, **kwargs)
+        return json.loads(out.getvalue())
+
+    def test_sells_exactly_the_stock(self):
+        report = self.stress(workers=1, stock=5, orders=8)
+        self.assertEqual((report['placed'], report['remaining_stock'], report['oversold']), (5, 0, 0))
+        self.assertEqual(report['status_codes'], {'201': 5, '409': 3})
+        self.assertFalse(Product.objects.exists())
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_orders_never_oversell(self):
+        report = self.stress(workers=8, stock=20, orders=60)
+        self.assertEqual(report['oversold'], 0)
+        self.assertTrue(report['consistent'])
+        self.assertEqual(report['status_codes'], {'201': 20, '409': 40})
+
+
+class RunWorkerCommandTest(TransactionTestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        product = Product.objects.create(name='Temporary Product', price=Decimal('1.00'), available=True)
+        self.orders = [Order.objects.create(customer=customer, status='NEW') for _ in range(20)]
+        for order in self.orders:
+            order.products.add(product)
+        enqueue_many('orders.process', [{'order_id': order.pk} for order in self.orders])
+
+    def work(self, **kwargs):
+        out = StringIO()
+        call_command('run_worker', burst=True, poll_interval=0.01, stdout=out, **kwargs)
+        self.assertIn('Worker stopped successfully.', out.getvalue())
+        return out.getvalue()
+
+    def assert_processed_once(self):
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'IN_PROCESS'})
+        self.assertEqual(Job.objects.filter(task='orders.notify_status').count(), 20)
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+
+    def test_burst_runs_every_job(self):
+        out = self.work(concurrency=1)
+        self.assertIn('40 jobs done, 0 retried, 0 failed', out)
+        self.assert_processed_once()
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_thread_pool(self):
+        self.work(concurrency=4, batch_size=3)
+        self.assert_processed_once()
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_process_pool(self):
+        self.work(concurrency=3, processes=True)
+        self.assert_processed_once()
+
+
+class ManagePartitionsCommandTest(TestCase):
+
+    def setUp(self):
+        customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=Decimal('1.00'), available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=Decimal('4.99'), available=True)
+        current = month_start(timezone.now())
+        self.old_month, self.open_month = add_months(current, -3), add_months(current, -2)
+        self.orders = {}
+        for name, month, status_name, products in (
+            ('old1', self.old_month, 'COMPLETED', [self.product1]),
+            ('old2', self.old_month, 'COMPLETED', [self.product1, self.product2]),
+            ('open', self.open_month, 'NEW', [self.product2]),
+            ('current', current, 'NEW', [self.product1]),
+        ):
+            order = Order.objects.create(customer=customer, status=status_name)
+            order.products.add(*products)
+            Order.objects.filter(pk=order.pk).update(date=month + timedelta(days=9, hours=12))
+            self.orders[name] = order
+        Order.objects.all().recompute_totals()
+
+    def manage(self, **kwargs):
+        out = StringIO()
+        call_command('manage_partitions', stdout=out, **kwargs)
+        self.assertIn('Partitions managed successfully.', out.getvalue())
+        return out.getvalue()
+
+    def live_ids(self):
+        return set(Order.objects.values_list('id', flat=True))
+
+    def test_nothing_is_archived_without_retain(self):
+        self.manage()
+        self.assertEqual(len(self.live_ids()), 4)
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_completed_months_are_archived(self):
+        out = self.manage(retain=1)
+        self.assertIn(f'Archived {self.old_month:%Y-%m}: 2 orders.', out)
+        self.assertIn(f'Kept {self.open_month:%Y-%m}: it has orders that are not completed.', out)
+
+        old1, old2 = self.orders['old1'], self.orders['old2']
+        self.assertEqual(self.live_ids(), {self.orders['open'].id, self.orders['current'].id})
+        self.assertEqual(set(ArchivedOrder.objects.values_list('id', 'status', 'total_price')),
+                         {(old1.id, 'COMPLETED', Decimal('1.00')), (old2.id, 'COMPLETED', Decimal('5.99'))})
+        self.assertEqual(set(ArchivedOrderProduct.objects.values_list('order_id', 'product_id')),
+                         {(old1.id, self.product1.id), (old2.id, self.product1.id), (old2.id, self.product2.id)})
+        self.assertEqual(set(Order.products.through.objects.values_list('order_id', flat=True)), self.live_ids())
+
+    def test_open_months_are_archived_when_asked(self):
+        out = self.manage(retain=1, include_open=True)
+        self.assertIn(f'Archived {self.open_month:%Y-%m}: 1 orders.', out)
+        self.assertEqual(self.live_ids(), {self.orders['current'].id})
+        self.assertEqual(ArchivedOrder.objects.count(), 3)
+
+    def test_full_rollup_refresh_keeps_archived_days(self):
+        refresh_rollups(full=True)
+        before = set(DailyStatusRollup.objects.values_list('day', 'status', 'order_count', 'revenue'))
+        self.manage(retain=1)
+
+        refresh_rollups(full=True)
+        self.assertEqual(set(DailyStatusRollup.objects.values_list('day', 'status', 'order_count', 'revenue')), before)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The order table is only partitioned on PostgreSQL.')
+    def test_months_are_partitions_on_postgresql(self):
+        self.assertTrue(is_partitioned())
+        # The backdated orders went to the default partition; they move with their month.
+        self.assertEqual(create_partitions(self.open_month, self.open_month),
+                         [f'djangoapp_order_{self.open_month:%Y_%m}'])
+        plan = Order.objects.filter(date__gte=self.open_month, date__lt=add_months(self.open_month, 1)).explain()
+        self.assertIn(f'djangoapp_order_{self.open_month:%Y_%m}', plan)
+        self.assertNotIn('djangoapp_order_default', plan)
+        self.assertEqual(Order.objects.filter(date__lt=add_months(self.open_month, 1)).count(), 3)
+
+        self.manage(retain=1)
+        self.assertEqual(partition_months(ArchivedOrder), [self.old_month])
+        self.assertNotIn(self.old_month, partition_months())
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
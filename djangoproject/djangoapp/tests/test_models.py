@@ -1,8 +1,17 @@
-from django.test import TestCase
-from djangoapp.models import Product, Customer, Order
-from django.core.exceptions import ValidationError
-from django.db.utils import IntegrityError, DataError
+from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.utils import DataError, IntegrityError
+from django.test import TestCase
+from django.utils import timezone
+
+from djangoapp.bulk_load import insert_rows
+from djangoapp.jobs import TASKS, claim, enqueue, run
+from djangoapp.models import Customer, Job, Order, Product
+
 
 class ProductModelTest(TestCase):
 
@@ -12,6 +21,15 @@ class ProductModelTest(TestCase):
         self.assertEqual(temp_product.price, 1.99)
         self.assertTrue(temp_product.available)
 
+    def test_available_follows_tracked_stock(self):
+        temp_product = Product.objects.create(name='Temporary product', price=1.99, available=False, stock=3)
+        self.assertTrue(temp_product.available)
+
+        temp_product.stock = 0
+        temp_product.save(update_fields=['stock'])
+        temp_product.refresh_from_db()
+        self.assertFalse(temp_product.available)
+
     def test_create_product_with_name_missing(self):
         with self.assertRaises(ValidationError):
             temp_product = Product.objects.create(price=1.99, available=True)
@@ -189,4 +207,238 @@ class OrderModelTest(TestCase):
     def test_can_be_fulfilled_false(self):
         temp_order = Order.objects.create(customer=self.customer, status='NEW')
         temp_order.products.add(self.product1, self.product3)
-        self.assertFalse(temp_order.can_be_fulfilled())
\ No newline at end of file
+        self.assertFalse(temp_order.can_be_fulfilled())
+
+    def test_with_totals_annotates_total_price(self):
+        temp_order = Order.objects.create(customer=self.customer, status='NEW')
+        temp_order.products.add(self.product1, self.product2)
+        empty_order = Order.objects.create(customer=self.customer, status='NEW')
+
+        totals = dict(Order.objects.with_totals().values_list('id', 'computed_total_price'))
+        self.assertEqual(totals[temp_order.id], Decimal('5.99'))
+        self.assertEqual(totals[empty_order.id], Decimal('0.00'))
+
+    def test_with_totals_runs_single_query(self):
+        for _ in range(5):
+            temp_order = Order.objects.create(customer=self.customer, status='NEW')
+            temp_order.products.add(self.product1, self.product3)
+
+        with self.assertNumQueries(1):
+            totals = [order.calculate_total_price() for order in Order.objects.with_totals()]
+        self.assertEqual(totals, [Decimal('13.35')] * 5)
+
+    def test_order_id_is_unique_across_dates(self):
+        # On PostgreSQL the primary key is (id, date); djangoapp_order_ids keeps the id unique.
+        order = Order.objects.create(customer=self.customer, status='NEW')
+        columns = ['id', 'customer_id', 'date', 'status']
+        earlier = order.date - timedelta(days=62)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            insert_rows(Order, columns, [(order.id, self.customer.id, earlier, 'NEW')])
+
+        # Moving the order to another month keeps its id taken; deleting it frees the id.
+        Order.objects.filter(id=order.id).update(date=earlier)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            insert_rows(Order, columns, [(order.id, self.customer.id, order.date, 'NEW')])
+        Order.objects.filter(id=order.id).delete()
+        insert_rows(Order, columns, [(order.id, self.customer.id, order.date, 'NEW')])
+        self.assertEqual(Order.objects.filter(id=order.id).count(), 1)
+
+    def test_fulfillable_matches_can_be_fulfilled(self):
+        fulfillable_order = Order.objects.create(customer=self.customer, status='NEW')
+        fulfillable_order.products.add(self.product1, self.product2)
+        blocked_order = Order.objects.create(customer=self.customer, status='NEW')
+        blocked_order.products.add(self.product1, self.product3)
+        empty_order = Order.objects.create(customer=self.customer, status='NEW')
+
+        ids = set(Order.objects.fulfillable().values_list('id', flat=True))
+        self.assertEqual(ids, {fulfillable_order.id, empty_order.id})
+        for order in Order.objects.with_fulfillable():
+            self.assertEqual(order.can_be_fulfilled(), order.id in ids)
+
+    def test_sold_out_tracked_products_do_not_block_orders(self):
+        sold_out = Product.objects.create(name='Sold Out Product', price=2.00, stock=0)
+        self.assertFalse(sold_out.available)
+        order = Order.objects.create(customer=self.customer, status='NEW')
+        order.products.add(self.product1, sold_out)
+
+        self.assertTrue(order.can_be_fulfilled())
+        self.assertIn(order.id, set(Order.objects.fulfillable().values_list('id', flat=True)))
+
+    def test_open_excludes_sent_and_completed_orders(self):
+        new_order = Order.objects.create(customer=self.customer, status='NEW')
+        in_process_order = Order.objects.create(customer=self.customer, status='IN_PROCESS')
+        Order.objects.create(customer=self.customer, status='SENT')
+        Order.objects.create(customer=self.customer, status='COMPLETED')
+
+        ids = set(Order.objects.open().values_list('id', flat=True))
+        self.assertEqual(ids, {new_order.id, in_process_order.id})
+
+    def assertTotals(self, order, total_price, item_count):
+        order.refresh_from_db()
+        self.assertEqual((order.total_price, order.item_count), (Decimal(total_price), item_count))
+
+    def run_jobs(self):
+        ran = 0
+        while jobs := claim('worker-1'):
+            self.assertEqual(run(jobs[0]), Job.DONE)
+            ran += 1
+        return ran
+
+    def test_totals_follow_product_changes(self):
+        temp_order = Order.objects.create(customer=self.customer, status='NEW')
+        self.assertTotals(temp_order, '0.00', 0)
+
+        temp_order.products.add(self.product1, self.product2)
+        self.assertEqual(temp_order.total_price, Decimal('5.99'))
+        self.assertTotals(temp_order, '5.99', 2)
+
+        temp_order.products.remove(self.product1)
+        self.assertTotals(temp_order, '4.99', 1)
+
+        temp_order.products.clear()
+        self.assertTotals(temp_order, '0.00', 0)
+
+    def test_totals_follow_reverse_relation_changes(self):
+        first_order = Order.objects.create(customer=self.customer, status='NEW')
+        second_order = Order.objects.create(customer=self.customer, status='NEW')
+
+        self.product3.order_set.add(first_order, second_order)
+        self.assertTotals(first_order, '12.35', 1)
+        self.assertTotals(second_order, '12.35', 1)
+
+        self.product3.order_set.clear()
+        self.assertTotals(first_order, '0.00', 0)
+        self.assertTotals(second_order, '0.00', 0)
+
+    def test_totals_follow_price_changes_and_deletes(self):
+        temp_order = Order.objects.create(customer=self.customer, status='NEW')
+        temp_order.products.add(self.product1, self.product2)
+
+        product = Product.objects.get(pk=self.product2.pk)
+        product.price = Decimal('10.00')
+        product.save()
+        # Price changes are applied to the orders by a worker.
+        self.assertTotals(temp_order, '5.99', 2)
+        self.assertEqual(self.run_jobs(), 1)
+        self.assertTotals(temp_order, '11.00', 2)
+
+        with self.assertNumQueries(1):
+            product.save()
+
+        product.delete()
+        self.assertTotals(temp_order, '1.00', 1)
+
+    def test_price_change_recomputes_totals_in_id_batches(self):
+        orders = [Order.objects.create(customer=self.customer, status='NEW') for _ in range(5)]
+        for order in orders[::2]:
+            order.products.add(self.product1, self.product2)
+
+        self.product1.price = Decimal('2.00')
+        with mock.patch('djangoapp.tasks.TOTALS_BATCH_SIZE', 2):
+            self.product1.save()
+            # Ids from the first to the last order holding the product, two per job.
+            self.assertEqual(self.run_jobs(), 3)
+        for order in orders[::2]:
+            self.assertTotals(order, '6.99', 2)
+        self.assertTotals(orders[1], '0.00', 0)
+
+        self.product3.price = Decimal('1.00')
+        self.product3.save()
+        self.assertEqual(self.run_jobs(), 1)
+
+    def test_recompute_totals_matches_with_totals(self):
+        for products in ([self.product1], [self.product1, self.product3], []):
+            Order.objects.create(customer=self.customer, status='NEW').products.add(*products)
+        Order.objects.update(total_price=0, item_count=0)
+
+        Order.objects.recompute_totals()
+        for order in Order.objects.with_totals():
+            self.assertEqual(order.total_price, order.computed_total_price)
+            self.assertEqual(order.item_count, order.products.count())
+
+
+class JobQueueTest(TestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.calls = []
+
+    def record(self, **payload):
+        Customer.objects.create(name='Written By Task', address=str(payload))
+        self.calls.append(payload)
+
+    def fail(self, **payload):
+        Customer.objects.create(name='Written By Task', address=str(payload))
+        raise ValueError('boom')
+
+    def test_jobs_are_claimed_oldest_first_and_only_once(self):
+        with mock.patch.dict(TASKS, {'tests.record': self.record}):
+            first = enqueue('tests.record', n=1)
+            second = enqueue('tests.record', n=2)
+            later = enqueue('tests.record', delay=timedelta(hours=1), n=3)
+
+            self.assertEqual([job.pk for job in claim('worker-1')], [first.pk])
+            jobs = claim('worker-2', batch_size=5)
+            self.assertEqual([job.pk for job in jobs], [second.pk])
+            self.assertEqual(claim('worker-3'), [])
+
+            self.assertEqual(run(jobs[0]), Job.DONE)
+        self.assertEqual(self.calls, [{'n': 2}])
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.attempts, second.locked_by), (Job.DONE, 1, 'worker-2'))
+        later.refresh_from_db()
+        self.assertEqual(later.status, Job.QUEUED)
+
+    def test_unknown_tasks_are_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue('tests.missing')
+
+    def test_failed_job_is_retried_with_backoff_then_given_up(self):
+        with mock.patch.dict(TASKS, {'tests.fail': self.fail}):
+            job = enqueue('tests.fail')
+            Job.objects.filter(pk=job.pk).update(max_attempts=2)
+
+            self.assertEqual(run(claim('worker-1')[0]), Job.QUEUED)
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.QUEUED)
+            self.assertGreater(job.run_at, timezone.now())
+            self.assertIn('ValueError: boom', job.last_error)
+            self.assertEqual(claim('worker-1'), [])
+
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            self.assertEqual(run(claim('worker-1')[0]), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(Customer.objects.filter(name='Written By Task').exists())
+
+    def test_expired_claim_is_handed_to_another_worker(self):
+        with mock.patch.dict(TASKS, {'tests.record': self.record}):
+            enqueue('tests.record')
+            stale = claim('worker-1', visibility_timeout=0)[0]
+            fresh = claim('worker-2')[0]
+            self.assertEqual((stale.pk, fresh.attempts), (fresh.pk, 2))
+
+            self.assertIsNone(run(stale))
+            self.assertFalse(Customer.objects.filter(name='Written By Task').exists())
+            self.assertEqual(run(fresh), Job.DONE)
+        self.assertEqual(Customer.objects.filter(name='Written By Task').count(), 1)
+
+    def test_process_order_moves_fulfillable_orders_on(self):
+        available = Product.objects.create(name='Temporary Product 1', price=1.00, available=True)
+        unavailable = Product.objects.create(name='Temporary Product 2', price=1.00, available=False)
+        ready = Order.objects.create(customer=self.customer, status='NEW')
+        ready.products.add(available)
+        blocked = Order.objects.create(customer=self.customer, status='NEW')
+        blocked.products.add(available, unavailable)
+
+        for order in (ready, blocked):
+            enqueue('orders.process', order_id=order.pk)
+        while jobs := claim('worker-1'):
+            self.assertEqual(run(jobs[0]), Job.DONE)
+
+        ready.refresh_from_db()
+        blocked.refresh_from_db()
+        self.assertEqual((ready.status, blocked.status), ('IN_PROCESS', 'NEW'))
+        self.assertEqual(list(Job.objects.filter(task='orders.notify_status').values_list('payload', flat=True)),
+                         [{'order_id': ready.pk, 'status': 'IN_PROCESS'}])
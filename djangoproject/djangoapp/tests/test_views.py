@@ -1,10 +1,46 @@
-from rest_framework.test import APITestCase, APIClient
-from rest_framework import status
-from django.urls import reverse
-from djangoapp.models import Product, Customer, Order
+import csv
+import json
+import os
+import re
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, router
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 from rest_framework_simplejwt.tokens import AccessToken
 
+from djangoapp.authentication import add_user_claims, user_cache
+from djangoapp.cache import CachedResponseMixin
+from djangoapp.jobs import claim, run
+from djangoapp.metrics import registry as metrics_registry
+from djangoapp.middleware import ReplicaRoutingMiddleware
+from djangoapp.models import ArchivedOrder, Customer, Job, Order, Product
+from djangoapp.pagination import EstimatedCountPaginator, IdCursorPagination, estimated_count
+from djangoapp.partitions import add_months, archive_month, month_start
+from djangoapp.routers import replica_health
+from djangoapp.views import OrderViewSet
+
+
 class ProductApiTest(APITestCase):
     def setUp(self):
         self.product = Product.objects.create(name='Temporary Product', price=1.99, available=True)
@@ -23,10 +59,10 @@ class ProductApiTest(APITestCase):
 
         response = self.client.get(self.product_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], 'Temporary Product')
-        self.assertEqual(response.data[0]['price'], '1.99')
-        self.assertTrue(response.data[0]['available'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Temporary Product')
+        self.assertEqual(response.data['results'][0]['price'], '1.99')
+        self.assertTrue(response.data['results'][0]['available'])
 
     def test_get_all_products_as_admin(self):
         self.token = str(AccessToken.for_user(self.admin))
@@ -34,10 +70,10 @@ class ProductApiTest(APITestCase):
 
         response = self.client.get(self.product_list_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['name'], 'Temporary Product')
-        self.assertEqual(response.data[0]['price'], '1.99')
-        self.assertTrue(response.data[0]['available'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['name'], 'Temporary Product')
+        self.assertEqual(response.data['results'][0]['price'], '1.99')
+        self.assertTrue(response.data['results'][0]['available'])
 
     def test_get_single_product_as_regular_user(self):
         self.token = str(AccessToken.for_user(self.regular_user))
@@ -208,4 +244,1470 @@ class ProductApiTest(APITestCase):
 
         invalid_product_detail_url = reverse('product-detail', kwargs={'pk': 13})
         response = self.client.delete(invalid_product_detail_url)
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class OrderApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=1.00, available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=4.99, available=False)
+        self.order = Order.objects.create(customer=self.customer, status='NEW')
+        self.order.products.add(self.product1, self.product2)
+
+        self.order_list_url = reverse('order-list')
+        self.order_detail_url = reverse('order-detail', kwargs={'pk': self.order.id})
+
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        self.token = str(add_user_claims(AccessToken.for_user(user), user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_get_all_orders_includes_total_price(self):
+        self.authenticate(self.regular_user)
+
+        response = self.client.get(self.order_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['total_price'], '5.99')
+
+    def test_get_single_order_includes_total_price(self):
+        self.authenticate(self.regular_user)
+
+        response = self.client.get(self.order_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_price'], '5.99')
+
+    def test_create_new_order_as_admin_includes_total_price(self):
+        self.authenticate(self.admin)
+
+        data = {"customer": self.customer.id, "products": [self.product1.id], "status": "NEW"}
+        response = self.client.post(self.order_list_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['total_price'], '1.00')
+
+    def test_order_changes_enqueue_background_jobs(self):
+        self.authenticate(self.admin)
+
+        data = {"customer": self.customer.id, "products": [self.product1.id], "status": "NEW"}
+        response = self.client.post(self.order_list_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.patch(self.order_detail_url, {"status": "SENT"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(self.order_detail_url, {"status": "SENT"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(list(Job.objects.order_by('id').values_list('task', 'payload')), [
+            ('orders.process', {'order_id': Order.objects.latest('id').id}),
+            ('orders.notify_status', {'order_id': self.order.id, 'status': 'SENT'}),
+        ])
+
+    def test_get_fulfillable_orders(self):
+        self.authenticate(self.regular_user)
+        ready_order = Order.objects.create(customer=self.customer, status='IN_PROCESS')
+        ready_order.products.add(self.product1)
+        sent_order = Order.objects.create(customer=self.customer, status='SENT')
+        sent_order.products.add(self.product1)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-fulfillable'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [ready_order.id])
+
+    def test_get_all_orders_with_expanded_relations(self):
+        self.authenticate(self.regular_user)
+
+        response = self.client.get(self.order_list_url, {'expand': 'customer,products'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['customer']['name'], 'Temporary Customer')
+        self.assertEqual([product['name'] for product in response.data['results'][0]['products']],
+                         ['Temporary Product 1', 'Temporary Product 2'])
+
+    def test_get_all_orders_without_expand_returns_ids(self):
+        self.authenticate(self.regular_user)
+
+        response = self.client.get(self.order_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['customer'], self.customer.id)
+        self.assertEqual(response.data['results'][0]['products'], [self.product1.id, self.product2.id])
+
+    def test_filter_and_order_by_total_price(self):
+        self.authenticate(self.regular_user)
+        cheap_order = Order.objects.create(customer=self.customer, status='NEW')
+        cheap_order.products.add(self.product1)
+        Order.objects.create(customer=self.customer, status='NEW')
+
+        response = self.client.get(self.order_list_url, {'total_min': '0.50', 'ordering': '-total_price'})
+        self.assertEqual([order['id'] for order in response.data['results']], [self.order.id, cheap_order.id])
+        self.assertEqual([order['item_count'] for order in response.data['results']], [2, 1])
+
+        response = self.client.get(self.order_list_url, {'total_max': '1.00', 'ordering': 'total_price', 'page_size': 1})
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [cheap_order.id])
+
+        response = self.client.get(self.order_list_url, {'total_min': 'NaN'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_all_orders_runs_constant_number_of_queries(self):
+        self.authenticate(self.regular_user)
+
+        with self.assertNumQueries(2):
+            self.client.get(self.order_list_url, {'expand': 'customer,products'})
+
+        for i in range(20):
+            customer = Customer.objects.create(name=f'Customer {i}', address='123 Xyz Abc')
+            order = Order.objects.create(customer=customer, status='NEW')
+            order.products.add(self.product1, self.product2)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(self.order_list_url, {'expand': 'customer,products'})
+        self.assertEqual(len(response.data['results']), 21)
+
+    def test_orders_are_paginated_newest_first_with_date_ties(self):
+        self.authenticate(self.regular_user)
+        for _ in range(4):
+            Order.objects.create(customer=self.customer, status='NEW')
+        Order.objects.exclude(id=self.order.id).update(date=self.order.date)
+        expected = list(Order.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+        seen = []
+        url = self.order_list_url + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([order['id'] for order in response.data['results']], expected[2:4])
+
+
+class PaginationApiTest(APITestCase):
+    def setUp(self):
+        for i in range(5):
+            Product.objects.create(name=f'Temporary Product {i}', price=1.99, available=True)
+
+        self.product_list_url = reverse('product-list')
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_products_are_paginated_by_id(self):
+        response = self.client.get(self.product_list_url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([product['name'] for product in response.data['results']],
+                         ['Temporary Product 0', 'Temporary Product 1', 'Temporary Product 2'])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([product['name'] for product in response.data['results']],
+                         ['Temporary Product 3', 'Temporary Product 4'])
+        self.assertIsNone(response.data['next'])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(IdCursorPagination, 'max_page_size', 2):
+            response = self.client.get(self.product_list_url, {'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_invalid_cursor_returns_not_found(self):
+        response = self.client.get(self.product_list_url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_count_is_added_on_request(self):
+        self.assertNotIn('count', self.client.get(self.product_list_url).data)
+
+        response = self.client.get(self.product_list_url, {'count': 'true', 'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+        # The count covers the filtered rows, not the rest of the pages.
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['count'], 5)
+        # A name no other product shares: on PostgreSQL, ?search= is full-text and trigram.
+        Product.objects.create(name='Walnut Chair', price=1.99, available=True)
+        response = self.client.get(self.product_list_url, {'count': '1', 'search': 'Walnut'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_estimated_count_is_exact_below_threshold(self):
+        queryset = Product.objects.filter(name__endswith='3')
+        self.assertEqual(estimated_count(queryset, threshold=100), 1)
+        self.assertEqual(estimated_count(Product.objects.all(), threshold=100), 5)
+
+    @skipUnless(connection.vendor == 'postgresql', 'reltuples and EXPLAIN estimates are PostgreSQL-only.')
+    def test_estimated_count_uses_planner_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Product._meta.db_table}')
+        with self.assertNumQueries(1):
+            self.assertEqual(estimated_count(Product.objects.all(), threshold=0), 5)
+        with self.assertNumQueries(1):
+            self.assertGreater(estimated_count(Product.objects.filter(available=True), threshold=0), 0)
+        self.assertEqual(EstimatedCountPaginator(Product.objects.order_by('id'), 2).num_pages, 3)
+
+
+class ProductSearchApiTest(APITestCase):
+    def setUp(self):
+        Product.objects.create(name='Running shoes', price=59.99, available=True)
+        Product.objects.create(name='Trail running shoes', price=89.99, available=True)
+        Product.objects.create(name='Rain jacket', price=120.00, available=True)
+
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_search_products_by_name(self):
+        response = self.client.get(reverse('product-list'), {'search': 'shoes'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(product['name'] for product in response.data['results']),
+                         ['Running shoes', 'Trail running shoes'])
+
+    def test_search_products_without_match(self):
+        response = self.client.get(reverse('product-list'), {'search': 'umbrella'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+    def test_autocomplete_matches_word_prefixes(self):
+        response = self.client.get(reverse('product-autocomplete'), {'q': 'run'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(product['name'] for product in response.data),
+                         ['Running shoes', 'Trail running shoes'])
+
+    def test_autocomplete_respects_limit(self):
+        response = self.client.get(reverse('product-autocomplete'), {'q': 'r', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+
+    def test_autocomplete_without_query_returns_nothing(self):
+        response = self.client.get(reverse('product-autocomplete'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+
+class BulkApiTest(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Temporary Product', price=1.99, available=True)
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+
+        self.product_bulk_url = reverse('product-bulk')
+        self.customer_bulk_url = reverse('customer-bulk')
+
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        self.token = str(AccessToken.for_user(user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_bulk_create_products_as_regular_user(self):
+        self.authenticate(self.regular_user)
+
+        data = [{"name": "Temporary Product 2", "price": 4.99, "available": True}]
+        response = self.client.post(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_create_products_as_admin(self):
+        self.authenticate(self.admin)
+
+        data = [{"name": f"Bulk Product {i}", "price": 4.99, "available": True} for i in range(50)]
+        with self.assertNumQueries(4):
+            response = self.client.post(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(response.data[0]['price'], '4.99')
+        self.assertEqual(Product.objects.count(), 51)
+
+    def test_bulk_create_products_with_invalid_item_writes_nothing(self):
+        self.authenticate(self.admin)
+
+        data = [{"name": "Valid Product", "price": 4.99, "available": True},
+                {"name": "Invalid Product", "price": -1.99, "available": True}]
+        response = self.client.post(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('price', response.data['errors'][1])
+        self.assertEqual(Product.objects.count(), 1)
+
+    def test_bulk_create_requires_list(self):
+        self.authenticate(self.admin)
+
+        data = {"name": "Temporary Product 2", "price": 4.99, "available": True}
+        response = self.client.post(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_orders_as_admin(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(self.admin), self.admin)}')
+        product2 = Product.objects.create(name='Temporary Product 2', price=4.99, available=True)
+
+        data = [{'customer': self.customer.id, 'products': [self.product.id, product2.id, self.product.id], 'status': 'NEW'}
+                for _ in range(100)]
+        # One insert for the jobs, unless the backend's parameter limit splits it.
+        job_fields = [field for field in Job._meta.concrete_fields if not field.primary_key]
+        job_inserts = -(-100 // connection.ops.bulk_batch_size(job_fields, [Job()] * 100))
+        with self.assertNumQueries(7 + job_inserts):
+            response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['ids']), 100)
+
+        order = Order.objects.get(pk=response.data['ids'][-1])
+        self.assertEqual(sorted(order.products.values_list('id', flat=True)), [self.product.id, product2.id])
+        self.assertEqual((order.total_price, order.item_count), (Decimal('6.98'), 2))
+        self.assertEqual(Order.products.through.objects.count(), 200)
+
+    def test_bulk_create_orders_with_unknown_ids_writes_nothing(self):
+        self.authenticate(self.admin)
+
+        data = [{'customer': self.customer.id, 'products': [self.product.id], 'status': 'NEW'},
+                {'customer': 999, 'products': [self.product.id, 998], 'status': 'SENT'},
+                {'customer': self.customer.id, 'products': [], 'status': 'LOST'}]
+        response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertEqual(set(response.data['errors'][2]), {'products', 'status'})
+
+        response = self.client.post(reverse('order-bulk'), data[:2], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][1], {
+            'customer': ['Invalid pk "999" - object does not exist.'],
+            'products': ['Invalid pk "998" - object does not exist.'],
+        })
+        self.assertFalse(Order.objects.exists())
+
+    def test_bulk_create_orders_as_regular_user(self):
+        self.authenticate(self.regular_user)
+
+        data = [{'customer': self.customer.id, 'products': [self.product.id], 'status': 'NEW'}]
+        response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_update_products_as_admin(self):
+        self.authenticate(self.admin)
+
+        data = [{"id": self.product.id, "price": 2.49}]
+        response = self.client.patch(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['price'], '2.49')
+        self.product.refresh_from_db()
+        self.assertEqual(str(self.product.price), '2.49')
+        self.assertEqual(self.product.name, 'Temporary Product')
+
+    def test_bulk_price_update_refreshes_order_totals(self):
+        self.authenticate(self.admin)
+        order = Order.objects.create(customer=self.customer, status='NEW')
+        order.products.add(self.product)
+
+        response = self.client.patch(self.product_bulk_url, [{"id": self.product.id, "price": 2.49}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job, = Job.objects.filter(task='orders.recompute_totals')
+        self.assertEqual(job.payload, {'product_ids': [self.product.id]})
+        self.assertEqual(run(claim('worker-1')[0]), Job.DONE)
+        order.refresh_from_db()
+        self.assertEqual(str(order.total_price), '2.49')
+
+    def test_bulk_update_with_unknown_id(self):
+        self.authenticate(self.admin)
+
+        data = [{"id": self.product.id, "price": 2.49}, {"id": 13, "price": 2.49}]
+        response = self.client.patch(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', response.data['errors'][1])
+        self.product.refresh_from_db()
+        self.assertEqual(str(self.product.price), '1.99')
+
+    def test_bulk_ids_are_validated_as_integers(self):
+        self.authenticate(self.admin)
+
+        data = [{"id": str(self.product.id), "price": 2.49}]
+        response = self.client.patch(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(str(self.product.price), '2.49')
+
+        data = [{"id": "abc", "price": 2.49}, {"price": 2.49}]
+        response = self.client.patch(self.product_bulk_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0]['id'][0].code, 'invalid')
+        self.assertEqual(response.data['errors'][1]['id'][0].code, 'required')
+
+        response = self.client.delete(self.customer_bulk_url, ['abc', None], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['id'][0].code for error in response.data['errors']], ['invalid', 'null'])
+        response = self.client.delete(self.customer_bulk_url, [str(self.customer.id)], format='json')
+        self.assertEqual(response.data['deleted'], 1)
+
+    def test_bulk_delete_customers_as_admin(self):
+        self.authenticate(self.admin)
+
+        response = self.client.delete(self.customer_bulk_url, [self.customer.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertEqual(Customer.objects.count(), 0)
+
+    def test_bulk_delete_customers_as_regular_user(self):
+        self.authenticate(self.regular_user)
+
+        response = self.client.delete(self.customer_bulk_url, [self.customer.id], format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class OrderExportApiTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=1.00, available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=4.99, available=True)
+        for _ in range(3):
+            order = Order.objects.create(customer=self.customer, status='NEW')
+            order.products.add(self.product1, self.product2)
+
+        self.order_export_url = reverse('order-export')
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+
+        self.client = APIClient()
+        self.token = str(AccessToken.for_user(self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_export_orders_as_ndjson(self):
+        response = self.client.get(self.order_export_url, {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        record = json.loads(lines[0])
+        self.assertEqual(record['customer']['name'], 'Temporary Customer')
+        self.assertEqual([product['id'] for product in record['products']], [self.product1.id, self.product2.id])
+        self.assertEqual(record['total_price'], '5.99')
+
+    def test_export_orders_as_csv(self):
+        response = self.client.get(self.order_export_url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][0], 'id')
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][6], f'{self.product1.id};{self.product2.id}')
+        self.assertEqual(rows[1][7], '5.99')
+
+    def test_export_orders_since(self):
+        response = self.client.get(self.order_export_url, {'format': 'ndjson', 'since': '2999-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_export_orders_with_invalid_since(self):
+        response = self.client.get(self.order_export_url, {'format': 'ndjson', 'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncOrderExportTest(TestCase):
+    # Under ASGI (uvicorn) the export must stay a stream, not be buffered first.
+
+    def setUp(self):
+        customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        product = Product.objects.create(name='Temporary Product', price=1.00, available=True)
+        for _ in range(3):
+            Order.objects.create(customer=customer, status='NEW').products.add(product)
+        user = User.objects.create(username='testuser', password='testpassword')
+        self.headers = {'Authorization': f'Bearer {add_user_claims(AccessToken.for_user(user), user)}'}
+        self.client = AsyncClient()
+
+    async def test_export_streams_chunks_through_the_asgi_handler(self):
+        with mock.patch.object(OrderViewSet, 'export_chunk_size', 2):
+            response = await self.client.get(reverse('order-export'), {'format': 'ndjson'}, headers=self.headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 1])
+        self.assertEqual(json.loads(chunks[0].splitlines()[0])['total_price'], '1.00')
+
+
+class MetricsApiTest(APITestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        Product.objects.create(name='Temporary Product', price=1.99, available=True)
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+
+        self.client = APIClient()
+        self.token = str(add_user_claims(AccessToken.for_user(self.regular_user), self.regular_user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_metrics_report_requests_per_route(self):
+        self.client.get(reverse('order-list'))
+        self.client.get(reverse('order-list'))
+        self.client.get(reverse('product-detail', kwargs={'pk': 13}))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="order-list",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="order-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('http_requests_total{route="product-detail",method="GET",status="404"} 1', body)
+        self.assertIn('db_queries_total{route="order-list",method="GET"} 2', body)
+
+    def test_metrics_aggregate_other_processes(self):
+        self.client.get(reverse('order-list'))
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            other = metrics_registry.snapshot()
+            Path(directory, f'{os.getppid()}.json').write_text(json.dumps(other))
+
+            body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('http_request_duration_seconds_count{route="order-list",method="GET"} 2', body)
+
+    def test_metrics_drop_exited_processes(self):
+        self.client.get(reverse('order-list'))
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            snapshot = Path(directory, f'{exited.pid}.json')
+            snapshot.write_text(json.dumps(metrics_registry.snapshot()))
+
+            body = self.client.get(reverse('metrics')).content.decode()
+            self.assertFalse(snapshot.exists())
+        self.assertIn('http_request_duration_seconds_count{route="order-list",method="GET"} 1', body)
+
+    def test_metrics_are_restricted(self):
+        self.client.credentials()
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CachedReadApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Temporary Product', price=1.99, available=True)
+        self.product_list_url = reverse('product-list')
+        self.product_detail_url = reverse('product-detail', kwargs={'pk': self.product.id})
+
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        self.token = str(add_user_claims(AccessToken.for_user(user), user))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_repeated_list_is_served_from_cache(self):
+        self.authenticate(self.regular_user)
+
+        first = self.client.get(self.product_list_url)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.product_list_url)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_not_modified(self):
+        self.authenticate(self.regular_user)
+
+        etag = self.client.get(self.product_detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.product_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_if_modified_since_returns_not_modified(self):
+        self.authenticate(self.regular_user)
+        cache.set('api-version:product', time.time_ns() - 2 * 10 ** 9)
+
+        last_modified = self.client.get(self.product_list_url)['Last-Modified']
+        response = self.client.get(self.product_list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_last_modified_waits_for_the_second_to_end(self):
+        # A change later in the same second would share the Last-Modified date.
+        self.authenticate(self.regular_user)
+        now = time.time_ns()
+        cache.set('api-version:product', now)
+
+        with mock.patch('djangoapp.cache.time') as clock:
+            clock.time_ns.return_value, clock.time.return_value = now, now / 10 ** 9
+            response = self.client.get(self.product_list_url)
+            self.assertNotIn('Last-Modified', response)
+            response = self.client.get(self.product_list_url, HTTP_IF_MODIFIED_SINCE=http_date(now // 10 ** 9))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_write_invalidates_cached_list(self):
+        self.authenticate(self.regular_user)
+        etag = self.client.get(self.product_list_url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name='Temporary Product 2', price=4.99, available=True)
+
+        response = self.client.get(self.product_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bulk_update_invalidates_cached_detail(self):
+        self.authenticate(self.admin)
+        self.client.get(self.product_detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('product-bulk'), [{"id": self.product.id, "price": 2.49}], format='json')
+
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.data['price'], '2.49')
+
+    def test_different_query_params_are_cached_separately(self):
+        self.authenticate(self.regular_user)
+        Product.objects.create(name='Other Product', price=4.99, available=True)
+
+        self.assertEqual(len(self.client.get(self.product_list_url).data['results']), 2)
+        response = self.client.get(self.product_list_url, {'search': 'Other'})
+        self.assertEqual([product['name'] for product in response.data['results']], ['Other Product'])
+
+    def test_unauthenticated_request_is_not_served_from_cache(self):
+        self.authenticate(self.regular_user)
+        self.client.get(self.product_list_url)
+
+        self.client.credentials()
+        response = self.client.get(self.product_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ClaimsAuthenticationApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.product = Product.objects.create(name='Temporary Product', price=1.99, available=True)
+        self.product_detail_url = reverse('product-detail', kwargs={'pk': self.product.id})
+        self.regular_user = User.objects.create_user(username='testuser', password='testpassword')
+        self.admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+
+        self.client = APIClient()
+
+    def obtain(self, username):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': username, 'password': 'testpassword'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_tokens_carry_user_claims(self):
+        tokens = self.obtain('testadmin')
+        access = AccessToken(tokens['access'])
+        self.assertTrue(access['is_staff'])
+        self.assertTrue(access['is_active'])
+
+    def test_claims_token_skips_user_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain('testadmin')['access']}")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(self.product_detail_url, {'price': '2.99'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_claims_decide_permissions(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain('testuser')['access']}")
+        response = self.client.patch(self.product_detail_url, {'price': '2.99'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_inactive_claim_is_rejected(self):
+        token = AccessToken.for_user(self.admin)
+        token['is_staff'] = True
+        token['is_active'] = False
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_without_claims_uses_cached_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        self.client.get(reverse('order-list'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_token_without_claims_sees_user_changes(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.regular_user)}')
+        self.client.get(reverse('order-list'))
+
+        self.regular_user.is_active = False
+        self.regular_user.save()
+        response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_updates_claims(self):
+        tokens = self.obtain('testuser')
+        self.regular_user.is_staff = True
+        self.regular_user.save()
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(AccessToken(response.data['access'])['is_staff'])
+
+    def test_refresh_rejects_inactive_user(self):
+        tokens = self.obtain('testuser')
+        self.regular_user.is_active = False
+        self.regular_user.save()
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncReadApiTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=1.00, available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=4.99, available=False)
+        self.order = Order.objects.create(customer=self.customer, status='NEW')
+        self.order.products.add(self.product1, self.product2)
+
+        self.regular_user = User.objects.create(username='testuser', password='testpassword')
+        self.client = AsyncClient()
+
+    def headers(self, user):
+        return {'Authorization': f'Bearer {add_user_claims(AccessToken.for_user(user), user)}'}
+
+    async def test_list_matches_sync_endpoint(self):
+        headers = self.headers(self.regular_user)
+        for name in ('product-list', 'customer-list', 'order-list'):
+            response = await self.client.get(reverse(f'async-{name}'), headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            expected = await self.sync_get(reverse(name), headers)
+            self.assertEqual(response.json(), expected)
+
+    async def test_list_count(self):
+        response = await self.client.get(reverse('async-order-list'), {'count': 'true'},
+                                         headers=self.headers(self.regular_user))
+        self.assertEqual(response.json()['count'], 1)
+
+    async def test_retrieve_order(self):
+        response = await self.client.get(
+            reverse('async-order-detail', kwargs={'pk': self.order.id}), {'expand': 'products'},
+            headers=self.headers(self.regular_user),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_price'], '5.99')
+        self.assertEqual([product['id'] for product in response.json()['products']], [self.product1.id, self.product2.id])
+
+    async def test_list_is_paginated_by_cursor(self):
+        headers = self.headers(self.regular_user)
+        response = await self.client.get(reverse('async-product-list'), {'page_size': 1}, headers=headers)
+        self.assertEqual([product['id'] for product in response.json()['results']], [self.product1.id])
+
+        response = await self.client.get(response.json()['next'], headers=headers)
+        self.assertEqual([product['id'] for product in response.json()['results']], [self.product2.id])
+        self.assertIsNone(response.json()['next'])
+
+    async def test_missing_object_returns_not_found(self):
+        response = await self.client.get(reverse('async-product-detail', kwargs={'pk': 999}), headers=self.headers(self.regular_user))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_requires_authentication(self):
+        response = await self.client.get(reverse('async-product-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+
+        response = await self.client.get(reverse('async-product-list'), headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_token_without_claims_is_accepted(self):
+        response = await self.client.get(
+            reverse('async-product-list'), headers={'Authorization': f'Bearer {AccessToken.for_user(self.regular_user)}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def sync_get(self, url, headers):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=headers['Authorization'])
+        response = await sync_to_async(client.get)(url)
+        return json.loads(response.content)
+
+
+class OrderFilterApiTest(APITestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.customers = [Customer.objects.create(name=f'Customer {i}', address='123 Xyz Abc') for i in range(10)]
+        Order.objects.bulk_create(
+            Order(customer=self.customers[i % 10], status=Order.STATUS_CHOICES[i % 4][0]) for i in range(200)
+        )
+        # date is auto_now_add, so spread the orders over the past hours afterwards.
+        for i, order_id in enumerate(Order.objects.order_by('id').values_list('id', flat=True)):
+            Order.objects.filter(id=order_id).update(date=self.now - timedelta(hours=i))
+
+        user = User.objects.create(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(user), user)}')
+        self.order_list_url = reverse('order-list')
+
+    def ids(self, params):
+        response = self.client.get(self.order_list_url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [order['id'] for order in response.data['results']]
+
+    def test_filter_by_status_and_date(self):
+        params = {'status': 'NEW', 'date_after': (self.now - timedelta(hours=10, minutes=30)).isoformat()}
+        expected = Order.objects.filter(status='NEW', date__gte=self.now - timedelta(hours=10, minutes=30))
+        self.assertEqual(self.ids(params), list(expected.order_by('-date', '-id').values_list('id', flat=True)))
+        self.assertEqual(len(self.ids(params)), 3)
+
+    def test_filter_by_several_statuses_and_customer(self):
+        customer = self.customers[3]
+        result = self.ids({'status': 'NEW,SENT', 'customer': customer.id})
+        expected = Order.objects.filter(status__in=['NEW', 'SENT'], customer=customer).order_by('-date', '-id')
+        self.assertEqual(result, list(expected.values_list('id', flat=True)))
+
+    def test_date_before_includes_the_whole_day(self):
+        day = (self.now - timedelta(days=3)).date()
+        result = self.ids({'date_after': day.isoformat(), 'date_before': day.isoformat(), 'page_size': 100})
+        dates = Order.objects.filter(id__in=result).values_list('date', flat=True)
+        self.assertTrue(result)
+        self.assertEqual({timezone.localtime(date).date() for date in dates}, {day})
+
+    def test_ordering_by_date_with_cursor(self):
+        first = self.client.get(self.order_list_url, {'ordering': 'date', 'status': 'COMPLETED', 'page_size': 20})
+        second = self.client.get(first.data['next'])
+        ids = [order['id'] for order in first.data['results'] + second.data['results']]
+        expected = Order.objects.filter(status='COMPLETED').order_by('date', 'id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected[:40]))
+
+    def test_invalid_filters_are_rejected(self):
+        for params in ({'status': 'LOST'}, {'customer': 'abc'}, {'date_after': 'yesterday'}, {'ordering': 'price'}):
+            response = self.client.get(self.order_list_url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def plan(self, params):
+        request = Request(APIRequestFactory().get(self.order_list_url, params))
+        view = OrderViewSet(request=request, format_kwarg=None, action='list')
+        queryset = view.paginator.page_queryset(view.filter_queryset(view.get_queryset()), request, view)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE djangoapp_order')
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            return json.loads(queryset.explain(format='json'))[0]['Plan']
+        return queryset.explain()
+
+    def order_scans(self, params):
+        # (scan type, indexed columns) per scan of the order table or its partitions.
+        # Checked by columns, as the partitions' copies of an index have other names.
+        plan = self.plan(params)
+        if connection.vendor != 'postgresql':
+            scans = re.findall(r'(SCAN|SEARCH) djangoapp_order (?:USING (?:COVERING )?INDEX (\w+))?', plan)
+            return [(scan, self.index_columns(index) if index else ()) for scan, index in scans]
+        scans, nodes = [], [plan]
+        while nodes:
+            node = nodes.pop()
+            nodes += node.get('Plans', [])
+            if node.get('Relation Name', '').startswith(Order._meta.db_table):
+                # A bitmap heap scan takes its rows from the bitmap index scans below it.
+                indexes = [child['Index Name'] for child in node.get('Plans', []) if 'Index Name' in child]
+                for index in [node['Index Name']] if 'Index Name' in node else indexes or [None]:
+                    scans.append((node['Node Type'], self.index_columns(index) if index else ()))
+        return scans
+
+    def index_columns(self, index):
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                cursor.execute(f'PRAGMA index_info({connection.ops.quote_name(index)})')
+                return tuple(name for _, _, name in sorted(cursor.fetchall()))
+            cursor.execute(
+                'SELECT a.attname FROM pg_index i '
+                'CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, position) '
+                'JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum '
+                'WHERE i.indexrelid = to_regclass(%s) AND k.position <= i.indnkeyatts ORDER BY k.position',
+                [index],
+            )
+            return tuple(name for name, in cursor.fetchall())
+
+    def assertIndexScans(self, scans, columns):
+        self.assertTrue(scans)
+        for scan, indexed in scans:
+            self.assertIn(scan, ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan', 'SEARCH'))
+            self.assertEqual(indexed, columns)
+
+    def test_status_and_date_filters_use_index(self):
+        after = (self.now - timedelta(hours=1)).isoformat()
+        scans = self.order_scans({'status': 'NEW', 'date_after': after})
+        self.assertIndexScans(scans, ('status', 'date', 'id'))
+
+    def test_customer_filter_uses_index(self):
+        scans = self.order_scans({'customer': self.customers[0].id})
+        self.assertIndexScans(scans, ('customer_id', 'date', 'id'))
+
+
+class CustomerHistoryApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.other_customer = Customer.objects.create(name='Other Customer', address='456 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=1.00, available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=4.99, available=False)
+
+        self.orders = []
+        for status_name, products in (('NEW', [self.product1]), ('SENT', [self.product1, self.product2]),
+                                      ('COMPLETED', [self.product2]), ('COMPLETED', [])):
+            order = Order.objects.create(customer=self.customer, status=status_name)
+            order.products.add(*products)
+            self.orders.append(order)
+        Order.objects.create(customer=self.other_customer, status='NEW').products.add(self.product2)
+
+        user = User.objects.create(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(user), user)}')
+
+    def test_orders_lists_only_the_customers_orders_newest_first(self):
+        url = reverse('customer-orders', kwargs={'pk': self.customer.id})
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in response.data['results']], [order.id for order in self.orders[::-1][:3]])
+        self.assertEqual(response.data['results'][2]['products'], [self.product1.id, self.product2.id])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([order['id'] for order in response.data['results']], [self.orders[0].id])
+
+    def test_orders_runs_constant_number_of_queries(self):
+        url = reverse('customer-orders', kwargs={'pk': self.customer.id})
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'status': 'COMPLETED'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_orders_of_unknown_customer(self):
+        response = self.client.get(reverse('customer-orders', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_in_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('customer-stats', kwargs={'pk': self.customer.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['customer'], self.customer.id)
+        self.assertEqual(response.data['order_count'], 4)
+        self.assertEqual(response.data['lifetime_spend'], '11.98')
+        self.orders[-1].refresh_from_db()
+        self.assertEqual(response.data['last_order_date'], self.orders[-1].date.isoformat().replace('+00:00', 'Z'))
+        self.assertEqual(response.data['orders_by_status'], {'NEW': 1, 'IN_PROCESS': 0, 'SENT': 1, 'COMPLETED': 2})
+
+    def test_stats_of_customer_without_orders(self):
+        customer = Customer.objects.create(name='New Customer', address='789 Xyz Abc')
+        response = self.client.get(reverse('customer-stats', kwargs={'pk': customer.id}))
+        self.assertEqual(response.data['order_count'], 0)
+        self.assertEqual(response.data['lifetime_spend'], '0.00')
+        self.assertIsNone(response.data['last_order_date'])
+
+        for pk in (999, 'abc'):
+            response = self.client.get(f"{reverse('customer-list')}{pk}/stats/")
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stats_follow_order_changes(self):
+        url = reverse('customer-stats', kwargs={'pk': self.customer.id})
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orders[0].products.add(self.product2)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['lifetime_spend'], '16.97')
+
+    def test_stats_count_archived_orders(self):
+        url = reverse('customer-stats', kwargs={'pk': self.customer.id})
+        before = self.client.get(url).data
+        month = add_months(month_start(timezone.now()), -2)
+        Order.objects.filter(pk__in=[self.orders[2].pk, self.orders[1].pk]).update(date=month + timedelta(days=3))
+        archive_month(month, include_open=True)
+        self.assertEqual(ArchivedOrder.objects.filter(customer=self.customer).count(), 2)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['order_count'], 4)
+        self.assertEqual(response.data['lifetime_spend'], before['lifetime_spend'])
+        self.assertEqual(response.data['orders_by_status'], before['orders_by_status'])
+        self.assertEqual(response.data['last_order_date'], before['last_order_date'])
+
+        response = self.client.get(reverse('customer-orders', kwargs={'pk': self.customer.id}))
+        self.assertEqual([order['id'] for order in response.data['results']], [self.orders[3].id, self.orders[0].id])
+        response = self.client.get(response.data['archived_orders'])
+        self.assertEqual({order['id'] for order in response.data['results']}, {self.orders[1].id, self.orders[2].id})
+
+
+class ReportApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=1.00, available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=4.99, available=True)
+        self.today = timezone.localdate()
+        for days_ago, status_name, products in ((2, 'NEW', [self.product1]), (2, 'SENT', [self.product1, self.product2]),
+                                                (1, 'NEW', [self.product2]), (0, 'COMPLETED', [self.product1])):
+            order = Order.objects.create(customer=customer, status=status_name)
+            order.products.add(*products)
+            Order.objects.filter(pk=order.pk).update(date=timezone.now() - timedelta(days=days_ago))
+        call_command('refresh_rollups', stdout=StringIO())
+
+        user = User.objects.create(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(user), user)}')
+
+    def test_revenue_per_day(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('report-revenue-per-day'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['refreshed_at'])
+        self.assertEqual([(row['day'], row['order_count'], row['item_count'], row['revenue']) for row in response.data['results']], [
+            (str(self.today - timedelta(days=2)), 2, 3, '6.99'),
+            (str(self.today - timedelta(days=1)), 1, 1, '4.99'),
+            (str(self.today), 1, 1, '1.00'),
+        ])
+
+    def test_revenue_per_day_filters(self):
+        day = self.today - timedelta(days=2)
+        response = self.client.get(reverse('report-revenue-per-day'), {'date_before': str(day), 'status': 'SENT'})
+        self.assertEqual([(row['day'], row['revenue']) for row in response.data['results']], [(str(day), '5.99')])
+
+        response = self.client.get(reverse('report-revenue-per-day'), {'date_after': str(self.today)})
+        self.assertEqual([row['day'] for row in response.data['results']], [str(self.today)])
+
+        for params in ({'date_after': 'yesterday'}, {'status': 'LOST'}):
+            response = self.client.get(reverse('report-revenue-per-day'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revenue_per_product(self):
+        response = self.client.get(reverse('report-revenue-per-product'))
+        self.assertEqual([(row['product'], row['order_count'], row['revenue']) for row in response.data['results']], [
+            (self.product2.id, 2, '9.98'),
+            (self.product1.id, 3, '3.00'),
+        ])
+
+        response = self.client.get(reverse('report-revenue-per-product'), {'limit': 1, 'date_after': str(self.today)})
+        self.assertEqual([row['product'] for row in response.data['results']], [self.product1.id])
+
+    def test_orders_per_status(self):
+        response = self.client.get(reverse('report-orders-per-status'))
+        self.assertEqual({row['status']: (row['order_count'], row['revenue']) for row in response.data['results']}, {
+            'COMPLETED': (1, '1.00'), 'NEW': (2, '5.99'), 'SENT': (1, '5.99'),
+        })
+
+    def test_reports_change_only_when_refreshed(self):
+        url = reverse('report-orders-per-status')
+        self.client.get(url)
+        Order.objects.filter(status='NEW').update(status='SENT')
+        self.assertEqual(len(self.client.get(url).data['results']), 3)
+
+        call_command('refresh_rollups', stdout=StringIO())
+        self.assertEqual([row['status'] for row in self.client.get(url).data['results']], ['COMPLETED', 'SENT'])
+
+    def test_reports_require_authentication(self):
+        response = APIClient().get(reverse('report-revenue-per-day'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SparseFieldsApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.products = [
+            Product.objects.create(name=f'Temporary Product {i}', price=f'{i}.5', available=i % 2 == 0)
+            for i in range(1, 6)
+        ]
+        for i in range(5):
+            order = Order.objects.create(customer=customer, status='NEW')
+            order.products.add(*self.products[i:])
+        Order.objects.create(customer=customer, status='SENT')
+
+        user = User.objects.create(username='testuser', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(user), user)}')
+
+    def get_both_ways(self, url, params):
+        cache.clear()
+        fast = self.client.get(url, params)
+        cache.clear()
+        with mock.patch('djangoapp.mixins.ValuesRepresentation.for_serializer', return_value=None):
+            regular = self.client.get(url, params)
+        return fast, regular
+
+    def test_values_path_output_is_byte_identical(self):
+        for name, params in (('product-list', {}), ('product-list', {'page_size': 2}), ('customer-list', {}),
+                             ('order-list', {}), ('order-list', {'page_size': 2, 'ordering': 'total_price'}),
+                             ('order-list', {'fields': 'id,products,date'})):
+            fast, regular = self.get_both_ways(reverse(name), params)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, regular.content, (name, params))
+
+            next_url = fast.data['next']
+            if next_url:
+                fast, regular = self.get_both_ways(next_url, {})
+                self.assertEqual(fast.content, regular.content, (name, params))
+
+    def test_values_path_skips_model_instances(self):
+        with mock.patch.object(Order, 'from_db', side_effect=AssertionError) as from_db:
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data['results']), 6)
+        from_db.assert_not_called()
+
+    def test_sparse_fields(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,price'})
+        self.assertEqual(response.data['results'][0], {'id': self.products[0].id, 'price': '1.50'})
+
+        response = self.client.get(reverse('product-detail', kwargs={'pk': self.products[0].id}), {'fields': 'name'})
+        self.assertEqual(response.data, {'name': 'Temporary Product 1'})
+
+    def test_sparse_fields_with_expand(self):
+        response = self.client.get(reverse('order-list'), {'fields': 'id,customer', 'expand': 'customer,products'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'customer'})
+        self.assertEqual(response.data['results'][0]['customer']['name'], 'Temporary Customer')
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('customer-list'), {'fields': 'id,email'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data['fields'])
+
+
+class StockApiTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        self.tracked = Product.objects.create(name='Tracked Product', price=2.50, stock=2)
+        self.untracked = Product.objects.create(name='Untracked Product', price=1.00, available=True)
+
+        admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(admin), admin)}')
+
+    def place_order(self, *products):
+        data = {'customer': self.customer.id, 'products': [product.id for product in products], 'status': 'NEW'}
+        return self.client.post(reverse('order-list'), data, format='json')
+
+    def test_orders_reserve_stock_until_sold_out(self):
+        for remaining in (1, 0):
+            response = self.place_order(self.tracked, self.untracked)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.tracked.refresh_from_db()
+            self.assertEqual(self.tracked.stock, remaining)
+        self.assertFalse(self.tracked.available)
+
+        response = self.place_order(self.tracked, self.untracked)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['detail'], f'Not enough stock for product(s) {self.tracked.id}.')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_reservation_without_waiting(self):
+        with self.settings(STOCK_RESERVATION_NOWAIT=True):
+            response = self.place_order(self.tracked)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 1)
+
+    def test_changing_order_products_moves_stock(self):
+        order_id = self.place_order(self.tracked).data['id']
+        other = Product.objects.create(name='Other Tracked Product', price=3.00, stock=1)
+
+        response = self.client.patch(reverse('order-detail', kwargs={'pk': order_id}), {'products': [other.id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.tracked.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.tracked.stock, other.stock, other.available), (2, 0, False))
+
+    def test_deleting_an_order_releases_its_stock(self):
+        order_id = self.place_order(self.tracked, self.untracked).data['id']
+        self.tracked.refresh_from_db()
+        self.assertEqual((self.tracked.stock, self.tracked.available), (1, True))
+
+        response = self.client.delete(reverse('order-detail', kwargs={'pk': order_id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 2)
+
+    def test_repeated_product_ids_reserve_one_unit(self):
+        response = self.place_order(self.tracked, self.tracked)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['products'], [self.tracked.id])
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 1)
+
+        data = [{'customer': self.customer.id, 'products': [self.tracked.id, self.tracked.id], 'status': 'NEW'}]
+        response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 0)
+
+        for order in Order.objects.all():
+            self.client.delete(reverse('order-detail', kwargs={'pk': order.id}))
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 2)
+
+    def test_bulk_intake_reserves_stock_for_the_whole_batch(self):
+        data = [{'customer': self.customer.id, 'products': [self.tracked.id], 'status': 'NEW'}] * 3
+        response = self.client.post(reverse('order-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Order.objects.exists())
+
+        response = self.client.post(reverse('order-bulk'), data[:2], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 0)
+
+    def test_product_available_is_derived_from_stock(self):
+        response = self.client.post(reverse('product-list'), {'name': 'New Product', 'price': '1.00', 'stock': 0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.data['available'])
+
+        response = self.client.patch(reverse('product-detail', kwargs={'pk': self.tracked.id}), {'available': False}, format='json')
+        self.assertTrue(response.data['available'])
+
+        response = self.client.post(reverse('product-list'), {'name': 'New Product', 'price': '1.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('available', response.data)
+
+
+class ArchivedOrderApiTest(APITestCase):
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Temporary Customer', address='123 Xyz Abc')
+        other = Customer.objects.create(name='Other Customer', address='456 Xyz Abc')
+        self.product1 = Product.objects.create(name='Temporary Product 1', price=Decimal('1.00'), available=True)
+        self.product2 = Product.objects.create(name='Temporary Product 2', price=Decimal('4.99'), available=True)
+        month = add_months(month_start(timezone.now()), -2)
+        self.orders = []
+        for customer, products in ((self.customer, [self.product2, self.product1]), (other, [self.product1])):
+            order = Order.objects.create(customer=customer, status='COMPLETED')
+            order.products.add(*products)
+            Order.objects.filter(pk=order.pk).update(date=month + timedelta(days=3))
+            self.orders.append(order)
+        Order.objects.all().recompute_totals()
+        archive_month(month)
+
+        user = User.objects.create(username='testuser', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(user), user)}')
+
+    def test_archived_orders_leave_the_order_endpoints(self):
+        self.assertEqual(self.client.get(reverse('order-list')).data['results'], [])
+        response = self.client.get(reverse('order-detail', kwargs={'pk': self.orders[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_get_archived_order(self):
+        response = self.client.get(reverse('archived-order-detail', kwargs={'pk': self.orders[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['customer'], self.customer.id)
+        self.assertEqual(response.data['products'], [self.product1.id, self.product2.id])
+        self.assertEqual(response.data['total_price'], '5.99')
+
+    def test_list_archived_orders_with_filters(self):
+        response = self.client.get(reverse('archived-order-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({order['id'] for order in response.data['results']}, {order.id for order in self.orders})
+
+        response = self.client.get(reverse('archived-order-list'), {'customer': self.customer.id, 'expand': 'customer'})
+        self.assertEqual([order['customer']['name'] for order in response.data['results']], ['Temporary Customer'])
+
+    def test_archived_orders_are_read_only(self):
+        response = self.client.delete(reverse('archived-order-detail', kwargs={'pk': self.orders[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+
+
+class ReplicaRoutingTest(TestCase):
+    # The routing decisions alone; no query runs on the stand-in replica alias.
+
+    def setUp(self):
+        cache.clear()
+        replica_health.clear()
+        self.factory = RequestFactory(HTTP_AUTHORIZATION='Bearer client-1')
+        # Replication lag in seconds; None for an unreachable replica.
+        self.lags = {'replica1': 0, 'replica2': 0}
+        patcher = mock.patch('djangoapp.routers.check_replica', side_effect=lambda alias: self.lags[alias])
+        self.check_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.enterContext(self.settings(REPLICA_DATABASES=['replica1', 'replica2']))
+
+    def route(self, request, view=None):
+        # Returns the database the request read from.
+        def get_response(request):
+            return HttpResponse((view or (lambda request: router.db_for_read(Product)))(request))
+        return ReplicaRoutingMiddleware(get_response)(request).content.decode()
+
+    def test_reads_of_get_requests_go_to_a_replica(self):
+        self.assertIn(self.route(self.factory.get('/api/products/')), {'replica1', 'replica2'})
+        self.assertIn(self.route(self.factory.head('/api/products/')), {'replica1', 'replica2'})
+        self.assertEqual(self.route(self.factory.options('/api/products/')), DEFAULT_DB_ALIAS)
+
+    def test_writes_always_go_to_the_primary(self):
+        product = Product(name='Temporary Product', price=1.00, available=True)
+        product._state.db = 'replica1'
+        view = lambda request: router.db_for_write(Product, instance=product)
+        self.assertEqual(self.route(self.factory.get('/api/products/'), view), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.route(self.factory.post('/api/products/')), DEFAULT_DB_ALIAS)
+
+    def test_outside_requests_everything_uses_the_primary(self):
+        self.assertEqual(router.db_for_read(Product), DEFAULT_DB_ALIAS)
+
+    def test_without_replicas_nothing_is_routed(self):
+        with self.settings(REPLICA_DATABASES=[]):
+            self.assertEqual(self.route(self.factory.get('/api/products/')), DEFAULT_DB_ALIAS)
+            self.route(self.factory.post('/api/products/'))
+        self.assertIn(self.route(self.factory.get('/api/products/')), {'replica1', 'replica2'})
+
+    def test_client_reads_its_writes_from_the_primary(self):
+        self.route(self.factory.patch('/api/products/1/'))
+        self.assertEqual(self.route(self.factory.get('/api/products/1/')), DEFAULT_DB_ALIAS)
+        other = RequestFactory(HTTP_AUTHORIZATION='Bearer client-2').get('/api/products/1/')
+        self.assertIn(self.route(other), {'replica1', 'replica2'})
+
+        with self.settings(REPLICA_STICKY_SECONDS=0):
+            self.route(self.factory.patch('/api/products/1/'))
+        self.assertIn(self.route(self.factory.get('/api/products/1/')), {'replica1', 'replica2'})
+
+    def test_unhealthy_replicas_are_skipped(self):
+        self.lags['replica1'] = None
+        for _ in range(5):
+            self.assertEqual(self.route(self.factory.get('/api/products/')), 'replica2')
+        self.assertEqual(self.check_replica.call_count, 2)
+
+        self.lags['replica2'] = 10
+        with self.settings(REPLICA_HEALTH_INTERVAL=0):
+            self.assertEqual(self.route(self.factory.get('/api/products/')), DEFAULT_DB_ALIAS)
+
+    def test_request_failing_on_a_replica_runs_again_on_the_primary(self):
+        middleware = None
+
+        def view(request):
+            alias = router.db_for_read(Product)
+            if alias != DEFAULT_DB_ALIAS:
+                # What the handler does with an exception raised by the view.
+                middleware.process_exception(request, OperationalError('server closed the connection'))
+                return 'failed'
+            return alias
+
+        middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse(view(request)))
+        with self.settings(REPLICA_DATABASES=['replica1']):
+            self.assertEqual(middleware(self.factory.get('/api/products/')).content.decode(), DEFAULT_DB_ALIAS)
+            self.assertEqual(self.route(self.factory.get('/api/products/')), DEFAULT_DB_ALIAS)
+        self.assertEqual(replica_health['replica1'][0], False)
+
+    def cached_read(self, request):
+        # Reads through the response cache: "<database read from>|<ETag>".
+        def view(request):
+            request = Request(request)
+            request.accepted_media_type = 'application/json'
+            response = CachedResponseMixin().cached_response(
+                request, lambda request: Response(router.db_for_read(Product)), resource='product',
+            )
+            return f"{response.data}|{response.get('ETag', '')}"
+        return self.route(request, view).split('|')
+
+    def test_client_that_wrote_skips_the_cached_copy(self):
+        cache.set('api-version:product', time.time_ns() - 60 * 10 ** 9)
+        other = RequestFactory(HTTP_AUTHORIZATION='Bearer client-2')
+        alias, etag = self.cached_read(other.get('/api/products/'))
+        self.assertIn(alias, {'replica1', 'replica2'})
+        self.assertTrue(etag)
+
+        self.route(self.factory.patch('/api/products/1/'))
+        self.assertEqual(self.cached_read(self.factory.get('/api/products/'))[0], DEFAULT_DB_ALIAS)
+        # The primary read is current, so it replaces the cached copy for everyone.
+        self.assertEqual(self.cached_read(other.get('/api/products/')), [DEFAULT_DB_ALIAS, etag])
+
+    def test_replica_reads_older_than_the_change_are_not_cached(self):
+        cache.set('api-version:product', time.time_ns() - 10 ** 9)
+        self.lags = {'replica1': 3, 'replica2': 3}
+        for _ in range(2):
+            alias, etag = self.cached_read(self.factory.get('/api/products/'))
+            self.assertIn(alias, {'replica1', 'replica2'})
+            self.assertEqual(etag, '')
+
+        replica_health.clear()
+        self.lags = {'replica1': 0, 'replica2': 0}
+        alias, etag = self.cached_read(self.factory.get('/api/products/'))
+        self.assertTrue(etag)
+        self.lags = {'replica1': 3, 'replica2': 3}
+        replica_health.clear()
+        self.assertEqual(self.cached_read(self.factory.get('/api/products/')), [alias, etag])
+
+
+REPLICAS = [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+@skipUnless(REPLICAS, 'Needs a replica database: set DATABASE_REPLICA_HOSTS.')
+class ReplicaRoutingApiTest(APITestCase):
+    # Two separate databases stand in for primary and replica; nothing replicates
+    # between them, so each row shows which one a response was read from.
+    databases = {DEFAULT_DB_ALIAS, *REPLICAS}
+
+    def setUp(self):
+        cache.clear()
+        replica_health.clear()
+        self.replica = REPLICAS[0]
+        admin = User.objects.create_superuser(username='testadmin', password='testpassword')
+        User.objects.db_manager(self.replica).create_superuser(id=admin.id, username='testadmin', password='testpassword')
+        Product.objects.create(name='On Primary', price=1.00, available=True)
+        Product.objects.using(self.replica).create(name='On Replica', price=1.00, available=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_user_claims(AccessToken.for_user(admin), admin)}')
+
+    def names(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [product['name'] for product in response.data['results']]
+
+    def test_reads_come_from_the_replica_until_the_client_writes(self):
+        with self.settings(REPLICA_DATABASES=[self.replica]):
+            self.assertEqual(self.names(), ['On Replica'])
+            response = self.client.post(reverse('product-list'), {'name': 'Written', 'price': 2.00, 'available': True})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(self.names(), ['On Primary', 'Written'])
+        self.assertFalse(Product.objects.using(self.replica).filter(name='Written').exists())
+
+
+class AdminTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='adminpassword')
+        self.client.force_login(self.admin)
+        self.product = Product.objects.create(name='Temporary Product', price=Decimal('1.99'), available=True)
+
+    def create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(
+                customer=Customer.objects.create(name=f'Customer {i}', address='123 Xyz Abc'), status='NEW',
+            )
+            order.products.add(self.product)
+
+    def changelist_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries), response
+
+    def test_order_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:djangoapp_order_changelist')
+        self.create_orders(2)
+        few, response = self.changelist_queries(url)
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertIsInstance(response.context['cl'].paginator, EstimatedCountPaginator)
+        self.create_orders(8)
+        many, response = self.changelist_queries(url)
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertEqual(few, many)
+
+    def test_order_changelist_filters(self):
+        self.create_orders(3)
+        Order.objects.filter(pk=Order.objects.order_by('id')[0].pk).update(status='SENT')
+        url = reverse('admin:djangoapp_order_changelist')
+        _, response = self.changelist_queries(url, {'status__exact': 'SENT'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        # No unfiltered count of the whole table next to it.
+        self.assertIsNone(response.context['cl'].full_result_count)
+        _, response = self.changelist_queries(url, {'date__gte': str(timezone.now() + timedelta(days=1))})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    def test_order_change_form_uses_raw_id_inputs(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        response = self.client.get(reverse('admin:djangoapp_order_change', args=[order.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+        self.assertContains(response, 'vManyToManyRawIdAdminField')
+
+    def test_product_changelist_search(self):
+        Product.objects.create(name='Other Thing', price=Decimal('2.00'), available=True)
+        _, response = self.changelist_queries(reverse('admin:djangoapp_product_changelist'), {'q': 'Temporary'})
+        self.assertEqual([product.id for product in response.context['cl'].result_list], [self.product.id])
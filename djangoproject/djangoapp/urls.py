@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, CustomerViewSet, OrderViewSet
+from .views import ProductViewSet, CustomerViewSet, OrderViewSet, ArchivedOrderViewSet, ReportViewSet, metrics
+from .async_views import AsyncReadView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 # urlpatterns = [
@@ -11,10 +12,19 @@ router = DefaultRouter()
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'customers', CustomerViewSet, basename='customer')
 router.register(r'orders', OrderViewSet, basename='order')
+router.register(r'archived-orders', ArchivedOrderViewSet, basename='archived-order')
+router.register(r'reports', ReportViewSet, basename='report')
 
 
 urlpatterns = [
     path('api/', include(router.urls)),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh')
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/async/products/', AsyncReadView.as_view(viewset=ProductViewSet), name='async-product-list'),
+    path('api/async/products/<int:pk>/', AsyncReadView.as_view(viewset=ProductViewSet), name='async-product-detail'),
+    path('api/async/customers/', AsyncReadView.as_view(viewset=CustomerViewSet), name='async-customer-list'),
+    path('api/async/customers/<int:pk>/', AsyncReadView.as_view(viewset=CustomerViewSet), name='async-customer-detail'),
+    path('api/async/orders/', AsyncReadView.as_view(viewset=OrderViewSet), name='async-order-list'),
+    path('api/async/orders/<int:pk>/', AsyncReadView.as_view(viewset=OrderViewSet), name='async-order-detail'),
+    path('metrics', metrics, name='metrics'),
 ]
\ No newline at end of file
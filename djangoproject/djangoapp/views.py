@@ -1,28 +1,286 @@
-from rest_framework import viewsets
-from .models import Product, Customer, Order
-from .serializers import ProductSerializer, CustomerSerializer, OrderSerializer
+from decimal import Decimal
+from django.db.models import Count, Max, Prefetch, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.http import Http404
+from django.urls import reverse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import IntegrityError, transaction
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from .models import Product, Customer, Order, ArchivedOrder, DailyProductRollup, DailyStatusRollup
+from .serializers import ProductSerializer, CustomerSerializer, OrderSerializer, CustomerStatsSerializer, BulkOrderSerializer
+from .serializers import ArchivedOrderSerializer
+from .serializers import RevenuePerDaySerializer, RevenuePerProductSerializer, OrdersPerStatusSerializer
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsAdminOrReadOnly
+from .pagination import OrderCursorPagination
+from .mixins import BulkItemsMixin, BulkMutationMixin, ValuesListMixin
+from .cache import CachedReadMixin, CachedResponseMixin, invalidate_now_and_on_commit
+from .exports import NDJSONRenderer, CSVRenderer, async_chunks, ndjson_lines, csv_lines
+from .metrics import registry, render_prometheus, scrape_allowed
 from rest_framework import generics
-from rest_framework.filters import SearchFilter
+from .filters import ProductSearchFilter, ProductAutocompleteFilter, OrderFilter, RollupFilter, parse_date_param
+from .reports import last_refreshed
+from .stock import reserve_stock, release_stock
+from .jobs import enqueue, enqueue_many
 
 
 # def hello_world(request):
 #     return HttpResponse("Hello, World!")
 
-class ProductViewSet(viewsets.ModelViewSet):
+def metrics(request):
+    if not scrape_allowed(request):
+        return HttpResponse(status=403)
+    return HttpResponse(render_prometheus(*registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class ProductViewSet(CachedReadMixin, BulkMutationMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
+    cache_resource = 'product'
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
-    filter_backends = (SearchFilter,)
+    filter_backends = (ProductSearchFilter,)
     search_fields = ['name']
 
-class CustomerViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
+        queryset = ProductAutocompleteFilter().filter_queryset(request, self.get_queryset(), self)
+        return Response(list(queryset.values('id', 'name')[:limit]))
+
+    def after_bulk_update(self, objects, fields):
+        super().after_bulk_update(objects, fields)
+        if 'price' in fields:
+            # Queued like a single price change (see signals.py).
+            enqueue('orders.recompute_totals', product_ids=[product.pk for product in objects])
+
+class CustomerViewSet(CachedReadMixin, BulkMutationMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
+    cache_resource = 'customer'
     serializer_class = CustomerSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+    # Both actions read orders, so they are cached under the order version, which
+    # customer changes bump as well.
+    @action(detail=True, methods=['get'])
+    def orders(self, request, pk=None):
+        return self.cached_response(request, self.list_orders, pk=pk, resource='order')
+
+    @action(detail=True, methods=['get'], serializer_class=CustomerStatsSerializer)
+    def stats(self, request, pk=None):
+        return self.cached_response(request, self.get_stats, pk=pk, resource='order')
+
+    def list_orders(self, request, pk=None):
+        # Newest first through order_customer_history_idx; ?status= and the date
+        # filters of the order list apply as well. Live orders only: `archived_orders`
+        # links to the customer's orders in archived months.
+        customer = self.get_object()
+        queryset = OrderFilter().filter_queryset(request, OrderViewSet.queryset.filter(customer=customer), self)
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = OrderSerializer(page, many=True, context=self.get_serializer_context())
+        response = paginator.get_paginated_response(serializer.data)
+        archived = request.build_absolute_uri(f"{reverse('archived-order-list')}?customer={customer.pk}")
+        response.data = {**response.data, 'archived_orders': archived}
+        return response
+
+    def get_stats(self, request, pk=None):
+        # One grouped query each over the live and the archived orders, so archiving
+        # a month leaves the figures unchanged. The LEFT JOIN keeps customers without
+        # orders, and the covering index answers the live one without visiting the
+        # order rows.
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+
+        def figures(relation):
+            return {
+                'order_count': Count(relation),
+                'lifetime_spend': Coalesce(Sum(f'{relation}__total_price'), Value(Decimal('0.00'))),
+                'last_order_date': Max(f'{relation}__date'),
+                **{
+                    f'status_{status}': Count(relation, filter=Q(**{f'{relation}__status': status}))
+                    for status in statuses
+                },
+            }
+
+        try:
+            customer = self.get_queryset().filter(pk=pk).values('id')
+            stats = customer.annotate(**figures('order')).first()
+        except (TypeError, ValueError):
+            stats = None
+        if stats is None:
+            raise Http404
+        archived = customer.annotate(**figures('archived_orders')).first()
+        for name, value in archived.items():
+            if name == 'last_order_date':
+                stats[name] = max(filter(None, [stats[name], value]), default=None)
+            elif name != 'id':
+                stats[name] += value
+        stats['orders_by_status'] = {status: stats.pop(f'status_{status}') for status in statuses}
+        return Response(self.get_serializer(stats).data)
+
+class OrderViewSet(BulkItemsMixin, ValuesListMixin, viewsets.ModelViewSet):
+    queryset = (
+        Order.objects
+        .select_related('customer')
+        .prefetch_related(Prefetch('products', queryset=Product.objects.order_by('id')))
+    )
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
+    pagination_class = OrderCursorPagination
+    filter_backends = (OrderFilter,)
+    export_chunk_size = 2000
+
+    @action(detail=False, methods=['post'], url_path='bulk', serializer_class=BulkOrderSerializer)
+    def bulk(self, request):
+        # Intake for feed batches: the customer and product ids of every item are
+        # checked with one query each, then orders and their product links go in with
+        # one bulk_create each, all in one transaction. Totals are computed from the
+        # prices read for the check, as bulk_create sends no signals.
+        serializer = self.get_serializer(data=self.get_bulk_items(request), many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data
+
+        customers = set(Customer.objects.filter(pk__in={item['customer'] for item in items}).values_list('pk', flat=True))
+        prices = dict(
+            Product.objects.filter(pk__in={pk for item in items for pk in item['products']}).values_list('pk', 'price')
+        )
+        errors = []
+        for item in items:
+            error = {}
+            if item['customer'] not in customers:
+                error['customer'] = [f'Invalid pk "{item["customer"]}" - object does not exist.']
+            missing = [pk for pk in item['products'] if pk not in prices]
+            if missing:
+                error['products'] = [f'Invalid pk "{pk}" - object does not exist.' for pk in missing]
+            errors.append(error)
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with transaction.atomic():
+                reserve_stock([pk for item in items for pk in item['products']])
+                orders = Order.objects.bulk_create([
+                    Order(
+                        customer_id=item['customer'], status=item['status'], item_count=len(item['products']),
+                        total_price=sum((prices[pk] for pk in item['products']), Decimal('0.00')),
+                    )
+                    for item in items
+                ], batch_size=self.bulk_batch_size)
+                Order.products.through.objects.bulk_create([
+                    Order.products.through(order_id=order.pk, product_id=pk)
+                    for order, item in zip(orders, items)
+                    for pk in item['products']
+                ], batch_size=self.bulk_batch_size)
+                enqueue_many('orders.process', [{'order_id': order.pk} for order in orders],
+                             batch_size=self.bulk_batch_size)
+                invalidate_now_and_on_commit('order')
+        except IntegrityError:
+            # A customer or product was deleted after the check.
+            return Response({'detail': 'A referenced customer or product no longer exists.'}, status=status.HTTP_409_CONFLICT)
+        return Response({'ids': [order.pk for order in orders]}, status=status.HTTP_201_CREATED)
+
+    def perform_create(self, serializer):
+        # The order, the reservation of its products and its processing job commit
+        # together; the status moves on in a worker (see tasks.py).
+        with transaction.atomic():
+            reserve_stock([product.pk for product in serializer.validated_data.get('products', [])])
+            order = serializer.save()
+            enqueue('orders.process', order_id=order.pk)
+
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+        with transaction.atomic():
+            if 'products' in serializer.validated_data:
+                current = set(serializer.instance.products.values_list('pk', flat=True))
+                wanted = {product.pk for product in serializer.validated_data['products']}
+                reserve_stock(wanted - current)
+                release_stock(current - wanted)
+            order = serializer.save()
+            if order.status != previous_status:
+                enqueue('orders.notify_status', order_id=order.pk, status=order.status)
+
+    def perform_destroy(self, instance):
+        # The units the order reserved go back in the transaction that deletes it.
+        with transaction.atomic():
+            release_stock(instance.products.values_list('pk', flat=True))
+            instance.delete()
+
+    @action(detail=False, methods=['get'])
+    def fulfillable(self, request):
+        ids = Order.objects.open().fulfillable().order_by('id').values_list('id', flat=True)
+        return Response(list(ids))
+
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request):
+        # Streams every order through a server-side cursor; products are prefetched
+        # per chunk, so memory stays flat regardless of the table size.
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        since = parse_date_param(request, 'since')
+        if since is not None:
+            queryset = queryset.filter(date__gte=since)
+
+        renderer = request.accepted_renderer
+        lines = csv_lines if renderer.format == 'csv' else ndjson_lines
+        content = lines(queryset.iterator(chunk_size=self.export_chunk_size))
+        if isinstance(request._request, ASGIRequest):
+            content = async_chunks(content, self.export_chunk_size)
+        response = StreamingHttpResponse(
+            content,
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="orders.{renderer.format}"'
+        return response
+
+
+class ArchivedOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    # The separate path to orders archived by manage.py manage_partitions. Not cached
+    # and without the values() fast path; the order filters and pagination apply.
+    queryset = (
+        ArchivedOrder.objects
+        .select_related('customer')
+        .prefetch_related(Prefetch('products', queryset=Product.objects.order_by('id')))
+    )
+    serializer_class = ArchivedOrderSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
+    filter_backends = (OrderFilter,)
+
+class ReportViewSet(CachedResponseMixin, viewsets.GenericViewSet):
+    # Sales reports served from the daily rollups, so they cost O(days) rather than
+    # O(orders). The figures are as of `refreshed_at`, the last refresh_rollups run.
+    cache_resource = 'report'
+    permission_classes = [IsAuthenticated]
+    filter_backends = (RollupFilter,)
+
+    @action(detail=False, methods=['get'], url_path='revenue-per-day',
+            queryset=DailyStatusRollup.objects.all(), serializer_class=RevenuePerDaySerializer)
+    def revenue_per_day(self, request):
+        return self.cached_response(request, self.get_report, 'day', ordering=('day',))
+
+    @action(detail=False, methods=['get'], url_path='orders-per-status',
+            queryset=DailyStatusRollup.objects.all(), serializer_class=OrdersPerStatusSerializer)
+    def orders_per_status(self, request):
+        return self.cached_response(request, self.get_report, 'status', ordering=('status',))
+
+    @action(detail=False, methods=['get'], url_path='revenue-per-product',
+            queryset=DailyProductRollup.objects.all(), serializer_class=RevenuePerProductSerializer)
+    def revenue_per_product(self, request):
+        # Best sellers first; ?limit= caps the number of products (default 50).
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), 1000)
+        except ValueError:
+            limit = 50
+        return self.cached_response(request, self.get_report, 'product', ordering=('-revenue', 'product'), limit=limit)
+
+    def get_report(self, request, group_by, ordering, limit=None):
+        queryset = self.filter_queryset(self.get_queryset())
+        totals = {'order_count': Sum('order_count'), 'revenue': Sum('revenue')}
+        if queryset.model is DailyStatusRollup:
+            totals['item_count'] = Sum('item_count')
+        rows = queryset.values(group_by).annotate(**totals).order_by(*ordering)[:limit]
+        return Response({'refreshed_at': last_refreshed(), 'results': self.get_serializer(rows, many=True).data})
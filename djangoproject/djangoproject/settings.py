@@ -38,12 +38,15 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'djangoapp',
     'drf_yasg',
 ]
 
 MIDDLEWARE = [
+    'djangoapp.middleware.MetricsMiddleware',
+    'djangoapp.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,13 +58,58 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'djangoapp.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
     ],
+    'DEFAULT_PAGINATION_CLASS': 'djangoapp.pagination.IdCursorPagination',
+    'PAGE_SIZE': 100,
 }
 
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'djangoapp.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'djangoapp.authentication.ClaimsTokenRefreshSerializer',
+}
+
+# Seconds a user row loaded during authentication is reused within a process.
+AUTH_USER_CACHE_TTL = 30
+
+# Fail an order at once (HTTP 409) instead of waiting when another order is
+# reserving the same products' stock.
+STOCK_RESERVATION_NOWAIT = os.getenv('STOCK_RESERVATION_NOWAIT', '') == '1'
+
+# Upper bound for the ?page_size= query parameter on paginated endpoints.
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+
+# Row counts from this many rows up are PostgreSQL's estimates, not COUNT(*): the
+# admin changelists and the API's ?count=true (djangoapp.pagination.estimated_count).
+ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ESTIMATED_COUNT_THRESHOLD', 10000))
+
+# Directory shared by all worker processes for metrics snapshots; unset means the
+# /metrics endpoint only reports the process that serves it.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 5
+
+# /metrics answers requests from these addresses, and requests carrying
+# METRICS_TOKEN as a bearer token (e.g. a Prometheus scraper on another host).
+METRICS_ALLOWED_IPS = list(filter(None, os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Local memory by default, which is per process: cache invalidation, the replica
+# read-your-writes marker and the rest only reach the process that made them, so
+# the default is only correct with a single server process (the Dockerfile runs one
+# uvicorn worker). With several workers on a host, set CACHE_LOCATION to a directory
+# to share the cache between them via the file backend.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache'
+        if os.getenv('CACHE_LOCATION') else 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'djangoapp'),
+    }
+}
+API_CACHE_TIMEOUT = 300
+
 ROOT_URLCONF = 'djangoproject.urls'
 
 TEMPLATES = [
@@ -99,6 +147,27 @@ DATABASES = {
     }
 }
 
+# Read replicas for GET and HEAD requests (djangoapp/routers.py), e.g.
+# DATABASE_REPLICA_HOSTS=replica1.internal,replica2.internal, reached with the
+# primary's credentials. Each has a test database of its own, so the routing tests
+# can use two databases on one server standing in for primary and replica. The
+# test runner routes nothing to replicas outside of those tests.
+for number, host in enumerate(filter(None, os.getenv('DATABASE_REPLICA_HOSTS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica{number}"},
+    }
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['djangoapp.routers.ReplicaRouter']
+TEST_RUNNER = 'djangoapp.test_runner.PrimaryOnlyTestRunner'
+
+# Seconds a client reads from the primary after a write, to see its own changes.
+REPLICA_STICKY_SECONDS = 5
+# Seconds a replica's health check result is reused; replicas more than
+# REPLICA_MAX_LAG seconds behind the primary are left out until they catch up.
+REPLICA_HEALTH_INTERVAL = 10
+REPLICA_MAX_LAG = 5
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators